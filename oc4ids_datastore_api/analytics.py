@@ -0,0 +1,617 @@
+"""
+In-process columnar snapshot of the attributes behind GET /summary.
+
+Setting DASHBOARD_SNAPSHOT=1 loads, at startup, one row per live project
+(public authority, status, project type) into NumPy arrays. It also loads the
+multi-valued attributes (budget rows, sectors, ministries, classifications,
+periods) as CSR arrays: an offsets array per project slot plus flat value
+columns. Dashboard statistics for any filter set without a title search are
+then computed from these arrays with boolean masks and bincount, with the
+same semantics as ProjectDAO.get_dashboard_stats.
+
+Writes through the API re-read only the written project. Its old slot is
+marked dead and a new one is appended; the whole snapshot is reloaded once
+dead slots outnumber live ones. Each worker process holds its own copy, and
+reloads it when the projects table shows writes made since it was built,
+checked at most once every DASHBOARD_SNAPSHOT_TTL seconds.
+"""
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import date, datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple, cast
+
+import numpy as np
+from sqlmodel import Session, col, func, select
+
+from oc4ids_datastore_api.daos import BIG_PROJECT_LIMIT, DASHBOARD_SCALES, SMALL_PROJECT_LIMIT
+from oc4ids_datastore_api.filters import ProjectFilters
+from oc4ids_datastore_api.models import (
+    Agency,
+    Ministry,
+    PartyAdditionalIdentifier,
+    Project,
+    ProjectAdditionalClassificationLink,
+    ProjectBudget,
+    ProjectParty,
+    ProjectPeriod,
+    ProjectSectorLink,
+    Sector,
+)
+
+logger = logging.getLogger(__name__)
+
+DASHBOARD_SNAPSHOT_TTL = float(os.environ.get("DASHBOARD_SNAPSHOT_TTL", "60"))
+
+
+def dashboard_snapshot_enabled() -> bool:
+    return os.getenv("DASHBOARD_SNAPSHOT", "").lower() in ("1", "true", "yes")
+
+
+def data_version(session: Session) -> Tuple[Any, ...]:
+    """Fingerprint of the projects table: row count and latest update and delete times
+
+    Every write through the API, from any process, changes it: creates and
+    updates insert a project row, deletes set deleted_at or remove the row.
+    """
+    statement = select(func.count(), func.max(col(Project.updated_at)), func.max(col(Project.deleted_at))).select_from(Project)
+    return tuple(session.exec(statement).one())
+
+
+class _Buffer:
+    """Growable 1-d array with amortized O(1) appends"""
+
+    def __init__(self, dtype: Any, fill: Any = 0) -> None:
+        self.dtype = dtype
+        self.fill = fill
+        self.data = np.full(64, fill, dtype=dtype)
+        self.size = 0
+
+    def extend(self, values: Sequence[Any]) -> None:
+        needed = self.size + len(values)
+        if needed > len(self.data):
+            grown = np.full(max(needed, 2 * len(self.data)), self.fill, dtype=self.dtype)
+            grown[:self.size] = self.data[:self.size]
+            self.data = grown
+        self.data[self.size:needed] = np.asarray(values, dtype=self.dtype)
+        self.size = needed
+
+    @property
+    def array(self) -> np.ndarray:
+        return self.data[:self.size]
+
+
+class _Csr:
+    """Rows owned by project slots: offsets[slot]:offsets[slot + 1] index the value columns"""
+
+    def __init__(self, **columns: Tuple[Any, Any]) -> None:
+        self.offsets = _Buffer(np.int64)
+        self.offsets.extend([0])
+        self.columns = {name: _Buffer(dtype, fill) for name, (dtype, fill) in columns.items()}
+        self._owners: Optional[np.ndarray] = None
+        self._by_value: Optional[Tuple[np.ndarray, np.ndarray]] = None
+
+    def append(self, rows_per_slot: List[List[Tuple[Any, ...]]]) -> None:
+        """Append the rows of consecutive new slots (one list of value tuples per slot)"""
+        end = self.offsets.array[-1]
+        ends = []
+        for rows in rows_per_slot:
+            end += len(rows)
+            ends.append(end)
+        self.offsets.extend(ends)
+        flat = [row for rows in rows_per_slot for row in rows]
+        for position, column in enumerate(self.columns.values()):
+            column.extend([row[position] for row in flat])
+        self._owners = None
+        self._by_value = None
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.columns[name].array
+
+    def owners(self) -> np.ndarray:
+        """Slot of every row"""
+        if self._owners is None:
+            offsets = self.offsets.array
+            self._owners = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+        return self._owners
+
+    def slots_with(self, column: str, values: Sequence[Any], slot_count: int) -> np.ndarray:
+        """Mask of slots owning a row whose column is one of values, via a value-sorted index"""
+        if self._by_value is None:
+            order = np.argsort(self[column], kind="stable")
+            self._by_value = (self[column][order], self.owners()[order])
+        ordered, owners = self._by_value
+        matched = np.zeros(slot_count, dtype=bool)
+        for value in values:
+            matched[owners[np.searchsorted(ordered, value, "left"):np.searchsorted(ordered, value, "right")]] = True
+        return matched
+
+    def slots_where(self, rows: np.ndarray, slot_count: int) -> np.ndarray:
+        """Mask of slots owning at least one row where rows is True"""
+        matched = np.zeros(slot_count, dtype=bool)
+        matched[self.owners()[rows]] = True
+        return matched
+
+
+class _Breakdown:
+    """Link rows grouped by a dense code, with the weights each row adds to its group"""
+
+    def __init__(self, codes: np.ndarray, offsets: np.ndarray, weights: np.ndarray, size: int) -> None:
+        self.offsets = offsets
+        self.weights = np.ascontiguousarray(weights)
+        self.size = size
+        # One bincount bin per (group, weight column), so a single call sums every column
+        self.width = weights.shape[1]
+        self.bins = codes[:, None] * self.width + np.arange(self.width)
+
+    def sums(self, slots: np.ndarray) -> np.ndarray:
+        """Per-group sums (size x weight columns) over the link rows of the slots"""
+        rows = _rows_of(self.offsets, slots)
+        return np.bincount(
+            self.bins[rows].ravel(), weights=self.weights[rows].ravel(), minlength=self.size * self.width
+        ).reshape(self.size, self.width)
+
+
+class _Codes:
+    """Dense integer codes for ids or strings, so they can index bincount results"""
+
+    def __init__(self) -> None:
+        self.codes: Dict[Any, int] = {}
+        self.values: List[Any] = []
+
+    def code(self, value: Any) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def lookup(self, values: Sequence[Any]) -> List[int]:
+        """Codes of the known values among values"""
+        return [self.codes[value] for value in values if value in self.codes]
+
+
+def _rows_of(offsets: np.ndarray, slots: np.ndarray) -> np.ndarray:
+    """Row positions owned by the given slots of a CSR offsets array, without scanning other rows"""
+    starts = offsets[slots]
+    lengths = offsets[slots + 1] - starts
+    total = int(lengths.sum())
+    if not total:
+        return np.zeros(0, dtype=np.int64)
+    shifts = np.repeat(starts - np.concatenate(([0], np.cumsum(lengths)[:-1])), lengths)
+    rows: np.ndarray = np.arange(total) + shifts
+    return rows
+
+
+def _total(value: Any, count: Any) -> Any:
+    """A SQL sum as the dashboard reports it: 0 when nothing was summed"""
+    return (float(value) or 0) if count else 0
+
+
+def _date(value: Optional[date]) -> np.datetime64:
+    return np.datetime64("NaT", "D") if value is None else np.datetime64(value, "D")
+
+
+class DashboardSnapshot:
+    """Columnar project attributes answering get_dashboard_stats in memory"""
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.project_ids: List[uuid.UUID] = []
+        self.slots: Dict[uuid.UUID, int] = {}
+        self.dead = 0
+        self.live = _Buffer(bool, False)
+        self.public_authority = _Buffer(np.int64, -1)
+        self.status = _Buffer(np.int64, -1)
+        self.project_type = _Buffer(np.int64, -1)
+        self.budgets = _Csr(amount=(np.float64, np.nan))
+        self.sectors = _Csr(sector=(np.int64, -1))
+        # Ministries a ministry filter matches (public authority's agency or party
+        # legal name), and the party route alone, which the ministry ranking uses,
+        # with the number of party identifiers naming the ministry
+        self.members = _Csr(ministry=(np.int64, -1))
+        self.party_ministries = _Csr(ministry=(np.int64, -1), weight=(np.int64, 0))
+        self.classifications = _Csr(classification=(np.int64, -1))
+        self.periods = _Csr(
+            type=(np.int64, -1),
+            start_year=(np.float64, np.nan),
+            end_year=(np.float64, np.nan),
+            start_date=("datetime64[D]", np.datetime64("NaT", "D")),
+            end_date=("datetime64[D]", np.datetime64("NaT", "D")),
+        )
+        self.ministries = _Codes()
+        self.sector_codes = _Codes()
+        self.statuses = _Codes()
+        self.period_types = _Codes()
+        self.ministry_names: Dict[int, Optional[str]] = {}
+        self.sector_names: Dict[int, Optional[str]] = {}
+        self.contractors = 0
+        self._derived: Optional[Dict[str, Any]] = None
+        self.updated_at = datetime.now(timezone.utc)
+        # data_version() as of the load, and when it was last compared
+        self.data_version: Tuple[Any, ...] = ()
+        self.checked_at = time.monotonic()
+
+    @classmethod
+    def build(cls, session: Session) -> "DashboardSnapshot":
+        snapshot = cls()
+        # Read first, so writes committed during the load show up as a change
+        snapshot.data_version = data_version(session)
+        snapshot._load(session)
+        return snapshot
+
+    def __len__(self) -> int:
+        return len(self.slots)
+
+    def stats(self, filters: ProjectFilters) -> Optional[Dict[str, Any]]:
+        """Same result as ProjectDAO.get_dashboard_stats, or None when SQL has to answer"""
+        if filters.title:
+            return None
+        with self.lock:
+            mask = self._mask(filters)
+            return self._stats(mask)
+
+    def refresh(self, session: Session, project_ids: List[uuid.UUID]) -> None:
+        """Re-read some projects from the database into new slots"""
+        self._load(session, project_ids)
+
+    def fragmented(self) -> bool:
+        """Whether dead slots outnumber live ones enough to warrant a reload"""
+        return self.dead > max(1024, len(self.slots))
+
+    def remove(self, project_id: uuid.UUID) -> None:
+        with self.lock:
+            self._kill(project_id)
+
+    def _kill(self, project_id: uuid.UUID) -> None:
+        slot = self.slots.pop(project_id, None)
+        if slot is not None:
+            self.live.array[slot] = False
+            self.dead += 1
+            self._derived = None
+            self.updated_at = datetime.now(timezone.utc)
+
+    def _mask(self, filters: ProjectFilters) -> np.ndarray:
+        """Live slots matching the filters, following project_conditions"""
+        mask = self.live.array.copy()
+        slot_count = len(mask)
+
+        if filters.sector_id:
+            mask &= self.sectors.slots_with("sector", self.sector_codes.lookup(filters.sector_id), slot_count)
+        if filters.ministry_id:
+            mask &= self.members.slots_with("ministry", self.ministries.lookup(filters.ministry_id), slot_count)
+        if filters.agency_id:
+            mask &= np.isin(self.public_authority.array, filters.agency_id)
+        if filters.status:
+            mask &= np.isin(self.status.array, self.statuses.lookup(filters.status))
+        if filters.project_type_id:
+            mask &= np.isin(self.project_type.array, filters.project_type_id)
+        if filters.budget_min is not None or filters.budget_max is not None:
+            amount = self.budgets["amount"]
+            rows = ~np.isnan(amount)
+            if filters.budget_min is not None:
+                rows &= amount >= filters.budget_min
+            if filters.budget_max is not None:
+                rows &= amount <= filters.budget_max
+            mask &= self.budgets.slots_where(rows, slot_count)
+        for name in ("concession_form_id", "contract_type_id"):
+            if getattr(filters, name):
+                mask &= self.classifications.slots_with("classification", getattr(filters, name), slot_count)
+        if filters.year_from or filters.year_to:
+            rows = self.periods["type"] == self.period_types.codes.get("duration", -1)
+            if filters.year_to:
+                rows &= self.periods["start_year"] <= filters.year_to
+            if filters.year_from:
+                rows &= self.periods["end_year"] >= filters.year_from
+            mask &= self.periods.slots_where(rows, slot_count)
+        if filters.period_type or filters.period_from or filters.period_to:
+            rows = self.periods["type"] == self.period_types.codes.get(filters.period_type or "duration", -1)
+            if filters.period_to:
+                rows &= self.periods["start_date"] <= _date(filters.period_to)
+            if filters.period_from:
+                rows &= self.periods["end_date"] >= _date(filters.period_from)
+            mask &= self.periods.slots_where(rows, slot_count)
+        return mask
+
+    def _derive(self) -> Dict[str, Any]:
+        """Filter-independent aggregates, rebuilt lazily after writes
+
+        Per slot: budget rows and sums per scale.
+        Per breakdown (ministry, sector, year): the link rows of every slot with
+        their group and the weights they add, and the sums over all live slots.
+        """
+        if self._derived is not None:
+            return self._derived
+        slot_count = self.live.size
+        owners = self.budgets.owners()
+        amount = self.budgets["amount"]
+        valid = ~np.isnan(amount)
+        scales = (
+            valid & (amount < SMALL_PROJECT_LIMIT),
+            valid & (amount >= SMALL_PROJECT_LIMIT) & (amount < BIG_PROJECT_LIMIT),
+            valid & (amount >= BIG_PROJECT_LIMIT),
+        )
+        # The scales partition the budgets with an amount, so overall rows and
+        # sums are the sums of the scale columns
+        columns = []
+        for rows in scales:
+            columns.append(np.bincount(owners, weights=rows, minlength=slot_count))
+            columns.append(np.bincount(owners, weights=np.where(rows, amount, 0.0), minlength=slot_count))
+        budgets = np.stack(columns, axis=1)
+        overall = np.stack([budgets[:, 0::2].sum(axis=1), budgets[:, 1::2].sum(axis=1)], axis=1)
+        budget_max = np.full(slot_count, -np.inf)
+        np.maximum.at(budget_max, owners[valid], amount[valid])
+
+        def breakdown(codes: np.ndarray, offsets: np.ndarray, weights: np.ndarray, size: int) -> _Breakdown:
+            # A leading column of ones counts the (distinct) projects per group
+            return _Breakdown(codes, offsets, np.column_stack([np.ones(len(codes)), weights]), size)
+
+        party = self.party_ministries
+        party_weights = party["weight"][:, None] * overall[party.owners()]
+        sector_weights = budgets[self.sectors.owners()]
+
+        # Duration periods with a start year, one row per distinct (slot, year)
+        # weighted by how many periods share it; np.unique keeps them in slot order
+        periods = self.periods
+        rows = (periods["type"] == self.period_types.codes.get("duration", -1)) & ~np.isnan(periods["start_year"])
+        years = periods["start_year"][rows].astype(np.int64)
+        first_year = int(years.min()) if len(years) else 0
+        pairs, counts = np.unique(
+            np.stack([periods.owners()[rows], years - first_year]), axis=1, return_counts=True
+        ) if len(years) else (np.zeros((2, 0), dtype=np.int64), np.zeros(0, dtype=np.int64))
+        year_offsets = np.searchsorted(pairs[0], np.arange(slot_count + 1))
+
+        breakdowns = {
+            "ministry": breakdown(party["ministry"], party.offsets.array, party_weights, len(self.ministries.values)),
+            "sector": breakdown(self.sectors["sector"], self.sectors.offsets.array, sector_weights, len(self.sector_codes.values)),
+            "year": breakdown(pairs[1], year_offsets, counts[:, None] * overall[pairs[0]], int(pairs[1].max()) + 1 if len(years) else 0),
+        }
+        live_slots = np.flatnonzero(self.live.array)
+        self._derived = derived = {
+            "budgets": budgets,
+            "budget_max": budget_max,
+            "breakdowns": breakdowns,
+            "first_year": first_year,
+            "live_budgets": budgets[live_slots].sum(axis=0),
+            "live_breakdowns": {name: group.sums(live_slots) for name, group in breakdowns.items()},
+        }
+        return derived
+
+    def _stats(self, mask: np.ndarray) -> Dict[str, Any]:
+        stats: Dict[str, Any] = {
+            "total_projects": 0,
+            "total_investment": 0,
+            "max_budget": 0,
+            "unique_contractors": 0,
+            "ministry_counts": {},
+            "ministry_investments": {},
+            "project_scales": {scale: {"count": 0, "investment": 0} for scale in DASHBOARD_SCALES},
+            "sector_stats": {},
+            "investment_by_year": {},
+        }
+        slots = np.flatnonzero(mask)
+        if not len(slots):
+            return stats
+        derived = self._derive()
+
+        # When most live projects match, sum the few that do not and subtract
+        if len(slots) > len(self.slots) / 2:
+            rest = np.flatnonzero(self.live.array & ~mask)
+            budgets = derived["live_budgets"] - derived["budgets"][rest].sum(axis=0)
+            sums = {
+                name: derived["live_breakdowns"][name] - group.sums(rest)
+                for name, group in derived["breakdowns"].items()
+            }
+        else:
+            budgets = derived["budgets"][slots].sum(axis=0)
+            sums = {name: group.sums(slots) for name, group in derived["breakdowns"].items()}
+
+        def total(column: int, row: List[float]) -> Any:
+            # Budget columns come in (rows, sum) pairs
+            return _total(row[column + 1], row[column])
+
+        def count(value: float) -> int:
+            return int(value + 0.5)
+
+        def scale_stats(row: List[float]) -> Tuple[float, float, Dict[str, Dict[str, Any]]]:
+            """Overall budget rows and sum, and the per-scale stats, of (rows, sum) per scale"""
+            scales = {
+                scale: {"count": count(row[2 * i]), "investment": total(2 * i, row)}
+                for i, scale in enumerate(DASHBOARD_SCALES)
+            }
+            return sum(row[0::2]), sum(row[1::2]), scales
+
+        rows, investment, scales = scale_stats(budgets.tolist())
+        stats.update(
+            total_projects=int(len(slots)),
+            total_investment=_total(investment, rows),
+            max_budget=_total(derived["budget_max"][slots].max(), rows),
+            unique_contractors=self.contractors,
+            project_scales=scales,
+        )
+        names, codes = self.ministry_names, self.ministries.values
+        for code, row in enumerate(sums["ministry"].tolist()):
+            if row[0] > 0.5:
+                name = names.get(codes[code])
+                stats["ministry_counts"][name] = count(row[0])
+                stats["ministry_investments"][name] = total(1, row)
+        names, codes = self.sector_names, self.sector_codes.values
+        for code, row in enumerate(sums["sector"].tolist()):
+            if row[0] > 0.5:
+                rows, investment, scales = scale_stats(row[1:])
+                stats["sector_stats"][names.get(codes[code])] = {
+                    "total": {"count": count(row[0]), "investment": _total(investment, rows)},
+                    **scales,
+                }
+        for offset, row in enumerate(sums["year"].tolist()):
+            if row[0] > 0.5:
+                stats["investment_by_year"][derived["first_year"] + offset] = {
+                    "count": count(row[0]),
+                    "investment": total(1, row),
+                }
+        return stats
+
+    def _load(self, session: Session, project_ids: Optional[List[uuid.UUID]] = None) -> None:
+        """Read the attributes (of all live projects, or only project_ids) and append them as new slots"""
+        def scoped(statement: Any, column: Any) -> Any:
+            return statement if project_ids is None else statement.where(column.in_(project_ids))
+
+        projects = session.exec(scoped(
+            select(Project.id, Project.public_authority_id, Project.status, Project.project_type_id)
+            .where(col(Project.deleted_at).is_(None)),
+            Project.id
+        )).all()
+        budgets = session.exec(scoped(select(ProjectBudget.project_id, ProjectBudget.total_amount), ProjectBudget.project_id)).all()
+        sectors = session.exec(scoped(
+            select(ProjectSectorLink.project_id, ProjectSectorLink.sector_id), ProjectSectorLink.project_id
+        )).all()
+        agency_ministries = session.exec(scoped(
+            select(Project.id, Agency.ministry_id)
+            .join(Agency, col(Project.public_authority_id) == Agency.id)
+            .where(col(Agency.ministry_id).is_not(None)),
+            Project.id
+        )).all()
+        party_ministries = session.exec(scoped(
+            select(ProjectParty.project_id, Ministry.id)
+            .join(PartyAdditionalIdentifier, col(ProjectParty.id) == PartyAdditionalIdentifier.party_id)
+            .join(Ministry, col(PartyAdditionalIdentifier.legal_name_id) == Ministry.id),
+            ProjectParty.project_id
+        )).all()
+        classifications = session.exec(scoped(
+            select(ProjectAdditionalClassificationLink.project_id, ProjectAdditionalClassificationLink.classification_id),
+            ProjectAdditionalClassificationLink.project_id
+        )).all()
+        periods = session.exec(scoped(
+            select(ProjectPeriod.project_id, ProjectPeriod.period_type, ProjectPeriod.start_year, ProjectPeriod.end_year)
+            .add_columns(col(ProjectPeriod.start_date), col(ProjectPeriod.end_date)),
+            ProjectPeriod.project_id
+        )).all()
+        # Keyed by primary keys, which are never None
+        names = Dict[int, Optional[str]]
+        ministry_names = cast(names, dict(session.exec(select(Ministry.id, Ministry.name_en)).all()))
+        sector_names = cast(names, dict(session.exec(select(Sector.id, Sector.name_en)).all()))
+        contractors = session.exec(select(func.count(col(Agency.id))).where(col(Agency.ministry_id).is_(None))).one()
+
+        def grouped(rows: Sequence[Any]) -> Dict[uuid.UUID, List[Tuple[Any, ...]]]:
+            groups: Dict[uuid.UUID, List[Tuple[Any, ...]]] = {}
+            for project_id, *values in rows:
+                groups.setdefault(project_id, []).append(tuple(values))
+            return groups
+
+        budgets_of, sectors_of, periods_of = grouped(budgets), grouped(sectors), grouped(periods)
+        classifications_of = grouped(classifications)
+        party_counts = Counter(party_ministries)
+
+        with self.lock:
+            if project_ids is not None:
+                for project_id in project_ids:
+                    self._kill(project_id)
+            self.ministry_names, self.sector_names, self.contractors = ministry_names, sector_names, contractors
+            ministry, sector = self.ministries.code, self.sector_codes.code
+            members_of = grouped([(i, ministry(m)) for i, m in set(agency_ministries) | set(party_ministries)])
+
+            for project_id, *_ in projects:
+                self.slots[project_id] = len(self.project_ids)
+                self.project_ids.append(project_id)
+            self.live.extend([True] * len(projects))
+            self.public_authority.extend([-1 if p[1] is None else p[1] for p in projects])
+            self.status.extend([-1 if p[2] is None else self.statuses.code(p[2]) for p in projects])
+            self.project_type.extend([-1 if p[3] is None else p[3] for p in projects])
+
+            ids = [p[0] for p in projects]
+            self.budgets.append([
+                [(np.nan if amount is None else amount,) for (amount,) in budgets_of.get(i, [])] for i in ids
+            ])
+            self.sectors.append([[(sector(s),) for (s,) in sectors_of.get(i, [])] for i in ids])
+            self.members.append([members_of.get(i, []) for i in ids])
+            party_rows = grouped([(i, ministry(m), count) for (i, m), count in party_counts.items()])
+            self.party_ministries.append([party_rows.get(i, []) for i in ids])
+            self.classifications.append([[(c,) for (c,) in classifications_of.get(i, [])] for i in ids])
+            self.periods.append([
+                [
+                    (self.period_types.code(kind), np.nan if start_year is None else start_year,
+                     np.nan if end_year is None else end_year, _date(start_date), _date(end_date))
+                    for kind, start_year, end_year, start_date, end_date in periods_of.get(i, [])
+                ]
+                for i in ids
+            ])
+            self._derived = None
+            self.updated_at = datetime.now(timezone.utc)
+
+
+_snapshot: Optional[DashboardSnapshot] = None
+_rebuild_lock = threading.Lock()
+
+
+def get_dashboard_snapshot() -> Optional[DashboardSnapshot]:
+    return _snapshot
+
+
+def current_dashboard_snapshot(session: Session) -> Optional[DashboardSnapshot]:
+    """The process-wide snapshot, reloaded first if the projects table changed since it was built
+
+    Once DASHBOARD_SNAPSHOT_TTL seconds have passed since the last check,
+    data_version() is compared again on a session of its own. Writes of this
+    process change it too, so they also lead to one reload. Requests arriving
+    while another thread checks or reloads use the snapshot as it is.
+    """
+    global _snapshot
+    snapshot = _snapshot
+    if snapshot is None or time.monotonic() < snapshot.checked_at + DASHBOARD_SNAPSHOT_TTL:
+        return snapshot
+    if not _rebuild_lock.acquire(blocking=False):
+        return snapshot
+    try:
+        with Session(session.get_bind()) as db:
+            if data_version(db) == snapshot.data_version:
+                snapshot.checked_at = time.monotonic()
+                return snapshot
+            _snapshot = DashboardSnapshot.build(db)
+        logger.info(f"Reloaded dashboard snapshot over {len(_snapshot)} projects after writes elsewhere")
+        return _snapshot
+    except Exception as e:
+        _disable(e)
+        return None
+    finally:
+        _rebuild_lock.release()
+
+
+def build_dashboard_snapshot(session: Session) -> Optional[DashboardSnapshot]:
+    """Build the process-wide snapshot if DASHBOARD_SNAPSHOT is enabled"""
+    global _snapshot
+    if dashboard_snapshot_enabled():
+        _snapshot = DashboardSnapshot.build(session)
+        logger.info(f"Built dashboard snapshot over {len(_snapshot)} projects")
+    return _snapshot
+
+
+def _disable(error: Exception) -> None:
+    global _snapshot
+    logger.error(f"Dashboard snapshot update failed, aggregating in SQL from now on: {error}")
+    _snapshot = None
+
+
+def project_written(session: Session, project_id: uuid.UUID) -> None:
+    """Re-read a project after its write has been committed"""
+    global _snapshot
+    if _snapshot is None:
+        return
+    try:
+        if _snapshot.fragmented():
+            _snapshot = DashboardSnapshot.build(session)
+        else:
+            _snapshot.refresh(session, [project_id])
+    except Exception as e:
+        _disable(e)
+
+
+def project_removed(project_id: uuid.UUID) -> None:
+    if _snapshot is None:
+        return
+    try:
+        _snapshot.remove(project_id)
+    except Exception as e:
+        _disable(e)
@@ -1,6 +1,8 @@
-from fastapi import APIRouter, Depends, HTTPException, Request, UploadFile, File, Body, Query
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, UploadFile, File, Body, Query
+from fastapi.responses import StreamingResponse
 from sqlmodel import Session
 from typing import Dict, Any, List, Optional
+from datetime import date
 import json
 import pandas as pd
 from io import BytesIO
@@ -9,62 +11,221 @@ import logging
 logger = logging.getLogger(__name__)
 
 from oc4ids_datastore_api.database import get_session
+from oc4ids_datastore_api.filters import ProjectFilters
 from oc4ids_datastore_api.services import (
     get_all_projects,
+    get_project_facets,
     get_project_by_id,
     create_project_data,
     update_project_data,
     delete_project_data,
     get_reference_info,
     get_dashboard_summary,
-    get_projects_comparison
+    get_projects_comparison,
+    get_project_etag,
+    get_comparison_etag,
+    resolve_fields,
+    stream_projects_export
 )
+from oc4ids_datastore_api.responses import DefaultJSONResponse, json_response
+from oc4ids_datastore_api.utils import etag_matches
 
 router = APIRouter()
 
 
-# Get all projects
-@router.get("/projects")
-def read_projects(
-    page: int = 1, 
-    page_size: int = 20,
+def project_filters(
     title: Optional[str] = None,
     sector_id: Optional[List[int]] = Query(None),
     ministry_id: Optional[List[int]] = Query(None),
+    agency_id: Optional[List[int]] = Query(None, description="Public authority (agency) ids"),
     concession_form_id: Optional[List[int]] = Query(None),
     contract_type_id: Optional[List[int]] = Query(None),
     year_from: Optional[int] = None,
     year_to: Optional[int] = None,
-    session: Session = Depends(get_session)
-) -> Dict[str, Any]:
-    """Get all projects with pagination and filters (supports multiple IDs)"""
-    return get_all_projects(
-        session, 
-        page, 
-        page_size,
+    budget_min: Optional[float] = None,
+    budget_max: Optional[float] = None,
+    status: Optional[List[str]] = Query(None),
+    project_type_id: Optional[List[int]] = Query(None),
+    period_type: Optional[str] = Query(None, description="Period type for period_from/period_to (default duration)"),
+    period_from: Optional[date] = None,
+    period_to: Optional[date] = None
+) -> ProjectFilters:
+    """The /projects filters, shared by the listing, its facets and the export"""
+    return ProjectFilters(
         title=title,
         sector_id=sector_id,
         ministry_id=ministry_id,
+        agency_id=agency_id,
         concession_form_id=concession_form_id,
         contract_type_id=contract_type_id,
         year_from=year_from,
-        year_to=year_to
+        year_to=year_to,
+        budget_min=budget_min,
+        budget_max=budget_max,
+        status=status,
+        project_type_id=project_type_id,
+        period_type=period_type,
+        period_from=period_from,
+        period_to=period_to
+    )
+
+
+def summary_filters(
+    search: Optional[str] = None,
+    sector: Optional[str] = Query(None), 
+    sector_id: Optional[str] = Query(None, alias="sector"), 
+    businessGroup: Optional[str] = Query(None),
+    ministry: Optional[str] = Query(None),
+    agency: Optional[str] = Query(None),
+    concessionForm: Optional[str] = Query(None), 
+    contractType: Optional[str] = Query(None),
+    startDate: Optional[str] = None,
+    endDate: Optional[str] = None,
+    budgetMin: Optional[float] = None,
+    budgetMax: Optional[float] = None,
+    status: Optional[str] = Query(None, description="Comma-separated project statuses"),
+    projectType: Optional[str] = Query(None, description="Comma-separated project type ids"),
+    periodType: Optional[str] = Query(None, description="Period type for periodFrom/periodTo (default duration)"),
+    periodFrom: Optional[date] = None,
+    periodTo: Optional[date] = None
+) -> ProjectFilters:
+    """The dashboard's filters, as sent by the frontend: comma-separated ids and camelCase names"""
+
+    # Helper to parse comma-separated IDs
+    def parse_ids(value: Optional[str]) -> Optional[List[int]]:
+        if not value:
+            return None
+        return [int(x) for x in value.split(',') if x.strip().isdigit()]
+    
+    # Parse dates
+    y_from = None
+    y_to = None
+    if startDate:
+         try:
+             y_from = int(startDate[:4])
+         except: pass
+    if endDate:
+         try:
+             y_to = int(endDate[:4])
+         except: pass
+
+    # Sector mapping: businessGroup or sector param
+    # useSummary sends 'businessGroup' -> maps to sector IDs
+    s_ids = parse_ids(businessGroup) or parse_ids(sector_id) or parse_ids(sector)
+
+    return ProjectFilters(
+        title=search,
+        sector_id=s_ids,
+        ministry_id=parse_ids(ministry),
+        agency_id=parse_ids(agency),
+        concession_form_id=parse_ids(concessionForm),
+        contract_type_id=parse_ids(contractType),
+        year_from=y_from,
+        year_to=y_to,
+        budget_min=budgetMin,
+        budget_max=budgetMax,
+        status=[x.strip() for x in status.split(',') if x.strip()] if status else None,
+        project_type_id=parse_ids(projectType),
+        period_type=periodType,
+        period_from=periodFrom,
+        period_to=periodTo
+    )
+
+
+# Get all projects
+@router.get("/projects", response_class=DefaultJSONResponse)
+def read_projects(
+    page: int = 1, 
+    page_size: int = 20,
+    filters: ProjectFilters = Depends(project_filters),
+    cursor: Optional[str] = Query(None, description="nextCursor of the previous page; takes precedence over page"),
+    sort: Optional[str] = Query(
+        None,
+        pattern="^(relevance|title|start_date|budget|updated_at|created_at)$",
+        description="Sort key (default updated_at); relevance: best title matches first (with title)"
+    ),
+    order: Optional[str] = Query(None, pattern="^(asc|desc)$", description="Sort direction; title defaults to asc, other keys to desc"),
+    session: Session = Depends(get_session)
+) -> Response:
+    """Get all projects with pagination and filters (supports multiple IDs)"""
+    body = get_all_projects(
+        session, 
+        page, 
+        page_size,
+        filters=filters,
+        cursor=cursor,
+        sort=sort,
+        order=order
     )
+    return Response(content=body, media_type="application/json")
+
+
+# Counts for the filter sidebar; declared before /projects/{project_id} so "facets" is not taken as an ID
+@router.get("/projects/facets")
+def read_project_facets(
+    filters: ProjectFilters = Depends(project_filters),
+    session: Session = Depends(get_session)
+) -> Dict[str, Any]:
+    """Number of projects per sector, ministry, concession form, contract type and year under the /projects filters
+
+    Each facet is counted without its own filter, so every option shows what selecting it would add.
+    """
+    return get_project_facets(session, filters)
+
+
+# Stream the full corpus; declared before /projects/{project_id} so "export" is not taken as an ID
+@router.get("/projects/export")
+def export_projects(
+    format: str = Query("ndjson", pattern="^(ndjson|package)$"),
+    filters: ProjectFilters = Depends(project_filters),
+    session: Session = Depends(get_session)
+) -> StreamingResponse:
+    """Stream projects (optionally filtered as in /projects) as NDJSON, one OC4IDS project per line, or as an OC4IDS package"""
+    if format == "package":
+        return StreamingResponse(stream_projects_export(session, filters, package=True), media_type="application/json")
+    return StreamingResponse(stream_projects_export(session, filters), media_type="application/x-ndjson")
 
 
 # Get a single project by ID in frontend format
-@router.get("/projects/{project_id}")
-def read_project(project_id: str, session: Session = Depends(get_session)) -> Dict[str, Any]:
+@router.get("/projects/{project_id}", response_class=DefaultJSONResponse)
+def read_project(
+    project_id: str,
+    request: Request,
+    fields: Optional[str] = Query(None, description="Comma-separated top-level OC4IDS fields to return"),
+    exclude: Optional[str] = Query(None, description="Comma-separated top-level OC4IDS fields to leave out"),
+    session: Session = Depends(get_session)
+) -> Response:
     """Get a single project by ID in frontend format"""
-    project = get_project_by_id(session, project_id)
+    selected = resolve_fields(fields, exclude)
+
+    # Cheap version lookup first, so unchanged projects are never loaded or serialized
+    etag = get_project_etag(session, project_id, selected)
+    if not etag:
+        raise HTTPException(status_code=404, detail="Project not found")
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    project = get_project_by_id(session, project_id, selected)
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
-    return project
+    return json_response(project, headers={"ETag": etag})
     
 
-@router.get("/compare")
-def compare_projects(ids: List[str] = Query(..., alias="ids"), session: Session = Depends(get_session)) -> List[Dict[str, Any]]:
-    return get_projects_comparison(session, ids)
+@router.get("/compare", response_class=DefaultJSONResponse)
+def compare_projects(
+    request: Request,
+    ids: List[str] = Query(..., alias="ids"),
+    fields: Optional[str] = Query(None, description="Comma-separated top-level OC4IDS fields to return"),
+    exclude: Optional[str] = Query(None, description="Comma-separated top-level OC4IDS fields to leave out"),
+    session: Session = Depends(get_session)
+) -> Response:
+    selected = resolve_fields(fields, exclude)
+
+    etag = get_comparison_etag(session, ids, selected)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    return json_response(get_projects_comparison(session, ids, selected), headers={"ETag": etag})
 
 
 # Create a new project
@@ -120,59 +281,17 @@ async def upload_file(file: UploadFile = File(...), session: Session = Depends(g
 
 
 # Get summary data for dashboard
-@router.get("/summary")
+@router.get("/summary", response_class=DefaultJSONResponse)
 def get_summary(
-    search: Optional[str] = None,
-    sector: Optional[str] = Query(None), 
-    sector_id: Optional[str] = Query(None, alias="sector"), 
-    businessGroup: Optional[str] = Query(None),
-    ministry: Optional[str] = Query(None),
-    agency: Optional[str] = Query(None),
-    concessionForm: Optional[str] = Query(None), 
-    contractType: Optional[str] = Query(None),
-    startDate: Optional[str] = None,
-    endDate: Optional[str] = None,
+    filters: ProjectFilters = Depends(summary_filters),
     session: Session = Depends(get_session)
-) -> Dict[str, Any]:
-    
-    # Helper to parse comma-separated IDs
-    def parse_ids(value: Optional[str]) -> Optional[List[int]]:
-        if not value:
-            return None
-        return [int(x) for x in value.split(',') if x.strip().isdigit()]
-    
-    # Parse dates
-    y_from = None
-    y_to = None
-    if startDate:
-         try:
-             y_from = int(startDate[:4])
-         except: pass
-    if endDate:
-         try:
-             y_to = int(endDate[:4])
-         except: pass
-
-    # Sector mapping: businessGroup or sector param
-    # useSummary sends 'businessGroup' -> maps to sector IDs
-    s_ids = parse_ids(businessGroup) or parse_ids(sector_id) or parse_ids(sector)
-    
-    logger.info(f"Dashboard Summary Request: search={search}, sector_ids={s_ids}, ministry={ministry}")
+) -> Response:
+    logger.info(f"Dashboard Summary Request: search={filters.title}, sector_ids={filters.sector_id}, ministry={filters.ministry_id}")
 
-    result = get_dashboard_summary(
-        session,
-        search=search,
-        sector_id=s_ids,
-        ministry_id=parse_ids(ministry),
-        agency_id=parse_ids(agency),
-        concession_form_id=parse_ids(concessionForm),
-        contract_type_id=parse_ids(contractType),
-        year_from=y_from,
-        year_to=y_to
-    )
+    result = get_dashboard_summary(session, filters)
     
     logger.info(f"Dashboard Summary Result: Total Projects = {result.get('summary', {}).get('totalProjects')}")
-    return result
+    return json_response(result)
 
 
 
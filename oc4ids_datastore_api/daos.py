@@ -1,22 +1,151 @@
-from typing import List, Optional
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Set, Tuple
+from datetime import datetime
 import uuid
-from sqlmodel import Session, select, func, or_
-from oc4ids_datastore_api.models import Project, Ministry, Agency, ProjectParty, PartyAdditionalIdentifier, Sector
+from sqlmodel import Session, col, select, func, or_
+from sqlalchemy import Column, ColumnElement, FromClause, Row, Select, Subquery, Text, any_, bindparam, cast, inspect, literal, text, true, tuple_
+from sqlalchemy.dialects import postgresql
+from oc4ids_datastore_api.models import Project, Ministry, Agency, ProjectParty, PartyAdditionalIdentifier, Sector, ProjectDocumentCache, ProjectListing, CONCESSION_FORM_SCHEME, CONTRACT_TYPE_SCHEME
+from oc4ids_datastore_api.facets import current_facet_index
+from oc4ids_datastore_api.filters import ProjectFilters, project_conditions, project_id_query
+from oc4ids_datastore_api.serializers import project_load_options
 from sqlalchemy.dialects.postgresql import array_agg
+# Sort keys of GET /projects. Each has an index on (column, id); start_date and
+# budget come from project_listing, where NULLs sort last in either direction.
+LISTING_SORTS: Dict[str, Column[Any]] = {
+    "title": inspect(Project).columns["title"],
+    "start_date": inspect(ProjectListing).columns["start_date"],
+    "budget": inspect(ProjectListing).columns["budget_amount"],
+    "updated_at": inspect(Project).columns["updated_at"],
+    "created_at": inspect(Project).columns["created_at"],
+}
+DEFAULT_SORT = ("updated_at", True)
+
+# Budget bounds of the dashboard's small / medium / big project scales
+# (also used to fill the rollup cube in rollups.py)
+DASHBOARD_SCALES = ["small", "medium", "big"]
+SMALL_PROJECT_LIMIT = 1_000_000_000
+BIG_PROJECT_LIMIT = 5_000_000_000
+
+# Facets of GET /projects/facets and the filters each one is counted without
+FACET_FILTERS = {
+    "sector": ("sector_id",),
+    "ministry": ("ministry_id",),
+    "concessionForm": ("concession_form_id",),
+    "contractType": ("contract_type_id",),
+    "year": ("year_from", "year_to"),
+}
+
 class ProjectDAO:
     def __init__(self, session: Session):
         self.session = session
 
-    def get_by_id(self, project_id: str) -> Optional[Project]:
-        project = self.session.get(Project, project_id)
+    def get_by_id(self, project_id: str, eager: bool = False, fields: Optional[Set[str]] = None) -> Optional[Project]:
+        """Fetch a project; eager=True also loads the OC4IDS tree (limited to fields) up front"""
+        if not eager:
+            project = self.session.get(Project, project_id)
+        else:
+            statement = select(Project).where(Project.id == project_id).options(*project_load_options(fields))
+            project = self.session.exec(statement).first()
         if project and project.deleted_at:
             return None
         return project
 
-    def get_by_ids(self, project_ids: List[str]) -> List[Project]:
-        statement = select(Project).where(Project.id.in_(project_ids)).where(Project.deleted_at.is_(None))
+    def get_by_ids(self, project_ids: List[str], eager: bool = False, fields: Optional[Set[str]] = None) -> List[Project]:
+        statement = select(Project).where(col(Project.id).in_(project_ids)).where(col(Project.deleted_at).is_(None))
+        if eager:
+            statement = statement.options(*project_load_options(fields))
         return self.session.exec(statement).all()
 
+    def get_version(self, project_id: str) -> Optional[Tuple[datetime, int]]:
+        """(updated_at, version) of a live project, without loading the row itself"""
+        statement = (
+            select(Project.updated_at, Project.version)
+            .where(Project.id == project_id)
+            .where(col(Project.deleted_at).is_(None))
+        )
+        return self.session.exec(statement).first()
+
+    def get_versions(self, project_ids: List[str]) -> Dict[str, Tuple[datetime, int]]:
+        statement = (
+            select(Project.id, Project.updated_at, Project.version)
+            .where(col(Project.id).in_(project_ids))
+            .where(col(Project.deleted_at).is_(None))
+        )
+        return {str(pid): (updated_at, version) for pid, updated_at, version in self.session.exec(statement).all()}
+
+    def get_document(self, project_id: str) -> Optional[Dict[str, Any]]:
+        """Read the cached OC4IDS document of a live project (None on a cache miss)"""
+        statement = (
+            select(col(ProjectDocumentCache.document))
+            .join(Project, col(Project.id) == ProjectDocumentCache.project_id)
+            .where(ProjectDocumentCache.project_id == project_id)
+            .where(col(Project.deleted_at).is_(None))
+        )
+        return self.session.exec(statement).first()
+
+    def get_documents(self, project_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Cached OC4IDS documents keyed by project id; missing ids are left out"""
+        statement = (
+            select(col(ProjectDocumentCache.project_id), col(ProjectDocumentCache.document))
+            .join(Project, col(Project.id) == ProjectDocumentCache.project_id)
+            .where(col(ProjectDocumentCache.project_id).in_(project_ids))
+            .where(col(Project.deleted_at).is_(None))
+        )
+        return {str(pid): document for pid, document in self.session.exec(statement).all() if document is not None}
+
+    def save_document(self, project: Project) -> None:
+        """Serialize an (eager-loaded) project into the document cache. Does not commit."""
+        from datetime import datetime
+
+        self.session.merge(ProjectDocumentCache(
+            project_id=project.id,
+            document=project.to_oc4ids(),
+            built_at=datetime.utcnow()
+        ))
+
+    def refresh_document(self, project_id: uuid.UUID) -> None:
+        """Reload a project from the current transaction and rebuild its cached document"""
+        statement = (
+            select(Project)
+            .where(Project.id == project_id)
+            .options(*project_load_options())
+            .execution_options(populate_existing=True)
+        )
+        project = self.session.exec(statement).one()
+        self.save_document(project)
+
+    def delete_document(self, project_id: str) -> None:
+        """Drop a project's cached document. Does not commit."""
+        document = self.session.get(ProjectDocumentCache, project_id)
+        if document:
+            self.session.delete(document)
+            self.session.flush()
+
+    def iter_documents(self, filters: ProjectFilters = ProjectFilters(), batch_size: int = 100) -> Iterator[Dict[str, Any]]:
+        """Stream the OC4IDS documents of live (and filtered) projects through a server-side cursor
+
+        Cached documents are passed through as-is; projects missing from the cache
+        are eager-loaded and serialized one batch at a time.
+        """
+        statement = (
+            select(col(Project.id), col(ProjectDocumentCache.document))
+            .outerjoin(ProjectDocumentCache, col(ProjectDocumentCache.project_id) == Project.id)
+            .where(*project_conditions(filters))
+            .order_by(col(Project.id))
+            .execution_options(yield_per=batch_size)
+        )
+        for partition in self.session.exec(statement).partitions():
+            documents = {str(pid): document for pid, document in partition}
+            missing = [pid for pid, document in documents.items() if document is None]
+            if missing:
+                for project in self.get_by_ids(missing, eager=True):
+                    documents[str(project.id)] = project.to_oc4ids()
+                # Keep memory flat across batches
+                self.session.expunge_all()
+            for document in documents.values():
+                if document is not None:
+                    yield document
+
     #def get_all(self, skip: int = 0, limit: int = 100) -> List[Project]:
     #    return self.session.exec(select(Project).offset(skip).limit(limit)).all()
 
@@ -24,134 +153,369 @@ class ProjectDAO:
         self, 
         skip: int = 0, 
         limit: int = 20,
-        title: Optional[str] = None,
-        sector_id: Optional[List[int]] = None,
-        ministry_id: Optional[List[int]] = None,
-        agency_id: Optional[List[int]] = None,
-        concession_form_id: Optional[List[int]] = None,
-        contract_type_id: Optional[List[int]] = None,
-        year_from: Optional[int] = None,
-        year_to: Optional[int] = None
+        after: Optional[Tuple[Any, uuid.UUID]] = None,
+        rank_title: Optional[str] = None,
+        sort: Tuple[str, bool] = DEFAULT_SORT,
+        filters: ProjectFilters = ProjectFilters()
     ):
-        from sqlalchemy.orm import aliased
-        from oc4ids_datastore_api.models import ProjectSectorLink, ProjectPeriod, ProjectAdditionalClassificationLink, ProjectBudget, AdditionalClassification
-        
-        # Aliases for filtering
-        FilterLastPeriod = aliased(ProjectPeriod)
-        FilterSectorLink = aliased(ProjectSectorLink)
-        FilterLinkConcession = aliased(ProjectAdditionalClassificationLink)
-        FilterAgency = aliased(Agency)
-        
-        id_query = select(Project.id).where(Project.deleted_at.is_(None))
+        """Listing rows in sort order, (updated_at, id) descending by default
 
-        # Apply Filters
-        if title:
-            id_query = id_query.where(Project.title.ilike(f"%{title}%"))
+        after is the (sort value, id) of the last row already returned; when
+        given the page is read with a keyset condition instead of skip.
+        """
+        id_query = self._page_id_query(self._filtered_id_query(filters, sort), skip, limit, after, rank_title, sort)
+        return self._listing_rows(self.session.execute(id_query).scalars().all())
 
-        if sector_id:
-            id_query = id_query.join(FilterSectorLink, Project.id == FilterSectorLink.project_id)
-            id_query = id_query.where(FilterSectorLink.sector_id.in_(sector_id))
-        
-        if ministry_id:
-            id_query = id_query.join(FilterAgency, Project.public_authority_id == FilterAgency.id, isouter=True)
-            
-            PartyMinistryFilter = aliased(Ministry)
-            PartyAgencyFilter = aliased(Agency)
-            PartyIdentifierFilter = aliased(PartyAdditionalIdentifier)
-            ProjectPartyFilter = aliased(ProjectParty)
-            
-            id_query = id_query.outerjoin(ProjectPartyFilter, Project.id == ProjectPartyFilter.project_id)
-            id_query = id_query.outerjoin(PartyIdentifierFilter, ProjectPartyFilter.id == PartyIdentifierFilter.party_id)
-            id_query = id_query.outerjoin(PartyMinistryFilter, PartyIdentifierFilter.legal_name_id == PartyMinistryFilter.id)
-            
-            id_query = id_query.where(
-                or_(
-                    PartyMinistryFilter.id.in_(ministry_id),
-                    FilterAgency.ministry_id.in_(ministry_id)
-                )
+    def get_page_keys(
+        self,
+        skip: int = 0,
+        limit: int = 20,
+        after: Optional[Tuple[Any, uuid.UUID]] = None,
+        rank_title: Optional[str] = None,
+        sort: Tuple[str, bool] = DEFAULT_SORT,
+        filters: ProjectFilters = ProjectFilters()
+    ) -> Tuple[List[Tuple[uuid.UUID, Any]], int]:
+        """(id, sort value) of the projects on one page, in order, plus the filtered total
+
+        The page and the total come back in one statement: the total is
+        counted over the filtered ids and LEFT JOINed to the page, so it is
+        returned even when the page itself is empty. When the facet index can
+        answer the filters, the total comes from it and SQL only orders the page.
+        """
+        filtered = self._filtered_id_query(filters, sort)
+        facet_index = current_facet_index(self.session)
+        matched_ids = facet_index.match(filters) if facet_index else None
+        if matched_ids is not None:
+            # The facet index already knows the filtered ids and their number
+            if not matched_ids:
+                return [], 0
+            ids = bindparam("matched_ids", matched_ids, type_=postgresql.ARRAY(postgresql.UUID(as_uuid=True)))
+            filtered = self._filtered_id_query(ProjectFilters(), sort).where(col(Project.id) == any_(ids))
+
+        page = (
+            self._page_id_query(filtered, skip, limit, after, rank_title, sort)
+            .add_columns(
+                LISTING_SORTS[sort[0]].label("sort_value"),
+                func.row_number().over(order_by=self._page_order(rank_title, sort)).label("position")
             )
+            .subquery("page")
+        )
+        if matched_ids is not None:
+            page_rows = self.session.exec(select(page.c.id, page.c.sort_value).order_by(page.c.position)).all()
+            return [(project_id, sort_value) for project_id, sort_value in page_rows], len(matched_ids)
 
-       
+        matched = self._filtered_id_query(filters)
+        total = select(func.count().label("total")).select_from(matched.subquery("matched")).subquery("total")
+        statement = (
+            select(total.c.total, page.c.id, page.c.sort_value)
+            .select_from(total.outerjoin(page, true()))
+            .order_by(page.c.position)
+        )
+        rows = self.session.exec(statement).all()
+        keys = [(project_id, sort_value) for _, project_id, sort_value in rows if project_id is not None]
+        return keys, rows[0][0]
+
+    def get_facet_counts(self, filters: ProjectFilters = ProjectFilters()) -> Dict[str, Dict[int, int]]:
+        """Projects per sector, ministry, concession form, contract type and year, in one statement
+
+        Each facet is counted under every filter except its own, so a count says
+        how many projects picking that value (instead of, or as well as, the
+        current ones) would list. A year counts the projects with a duration
+        period running through it, i.e. what year_from=year_to=<year> returns.
+        "total" holds the fully filtered count under key 0.
+        """
+        from sqlalchemy import literal, union, union_all
+        from oc4ids_datastore_api.models import AdditionalClassification, ProjectAdditionalClassificationLink, ProjectPeriod, ProjectSectorLink
+
+        def matched(*own: str) -> Subquery:
+            return self._filtered_id_query(filters.without(*own)).subquery()
+
+        def counted(facet: str, rows: Any, project_id: Any, value: Any) -> Select[Any]:
+            ids = matched(*FACET_FILTERS.get(facet, ()))
+            return (
+                select(literal(facet).label("facet"), value.label("value"), func.count(project_id.distinct()).label("count"))
+                .select_from(rows)
+                .join(ids, ids.c.id == project_id)
+                .group_by(value)
+            )
 
-        if concession_form_id:
-            id_query = id_query.join(FilterLinkConcession, Project.id == FilterLinkConcession.project_id)
-            id_query = id_query.where(FilterLinkConcession.classification_id.in_(concession_form_id))
-        
-        if contract_type_id:
-            FilterLinkContract = aliased(ProjectAdditionalClassificationLink)
-            id_query = id_query.join(FilterLinkContract, Project.id == FilterLinkContract.project_id)
-            id_query = id_query.where(FilterLinkContract.classification_id.in_(contract_type_id))
-        
-        if year_from or year_to:
-             id_query = id_query.join(FilterLastPeriod, (Project.id == FilterLastPeriod.project_id) & (FilterLastPeriod.period_type == 'duration'))
-
-        if year_from and year_to:
-             id_query = id_query.where(func.extract('year', FilterLastPeriod.start_date) <= year_to)
-             id_query = id_query.where(func.extract('year', FilterLastPeriod.end_date) >= year_from)
-        elif year_from:
-             id_query = id_query.where(func.extract('year', FilterLastPeriod.end_date) >= year_from)
-        elif year_to:
-             id_query = id_query.where(func.extract('year', FilterLastPeriod.start_date) <= year_to)
-
-        id_query = id_query.distinct().offset(skip).limit(limit)
-        
-        project_ids = self.session.exec(id_query).all()
+        ministry_routes = union(
+            select(col(Project.id).label("project_id"), col(Agency.ministry_id).label("ministry_id"))
+            .join(Agency, col(Project.public_authority_id) == Agency.id)
+            .where(col(Agency.ministry_id).is_not(None)),
+            select(col(ProjectParty.project_id), col(Ministry.id))
+            .join(PartyAdditionalIdentifier, col(ProjectParty.id) == PartyAdditionalIdentifier.party_id)
+            .join(Ministry, col(PartyAdditionalIdentifier.legal_name_id) == Ministry.id)
+        ).subquery("ministry_routes")
+        period_years = (
+            select(
+                col(ProjectPeriod.project_id),
+                func.generate_series(col(ProjectPeriod.start_year), col(ProjectPeriod.end_year)).label("year")
+            )
+            .where(ProjectPeriod.period_type == "duration")
+            .subquery("period_years")
+        )
+        classified = (
+            inspect(ProjectAdditionalClassificationLink).local_table
+            .join(AdditionalClassification, col(AdditionalClassification.id) == ProjectAdditionalClassificationLink.classification_id)
+        )
+        all_matched = matched()
+        statement = union_all(
+            select(literal("total"), literal(0), func.count()).select_from(all_matched),
+            counted("sector", ProjectSectorLink, col(ProjectSectorLink.project_id), col(ProjectSectorLink.sector_id)),
+            counted("ministry", ministry_routes, ministry_routes.c.project_id, ministry_routes.c.ministry_id),
+            counted("concessionForm", classified, col(ProjectAdditionalClassificationLink.project_id), col(ProjectAdditionalClassificationLink.classification_id))
+            .where(col(AdditionalClassification.scheme) == CONCESSION_FORM_SCHEME),
+            counted("contractType", classified, col(ProjectAdditionalClassificationLink.project_id), col(ProjectAdditionalClassificationLink.classification_id))
+            .where(col(AdditionalClassification.scheme) == CONTRACT_TYPE_SCHEME),
+            counted("year", period_years, period_years.c.project_id, period_years.c.year),
+        )
+        counts: Dict[str, Dict[int, int]] = {facet: {} for facet in ("total", *FACET_FILTERS)}
+        for facet, value, count in self.session.execute(statement).all():
+            counts[facet][value] = count
+        return counts
+
+    def backfill_listings(self, batch_size: int = 500) -> int:
+        """Build the missing project_listing rows of live projects, committing per batch"""
+        missing = (
+            select(Project.id)
+            .where(col(Project.deleted_at).is_(None))
+            .where(~select(ProjectListing.project_id).where(ProjectListing.project_id == Project.id).exists())
+        )
+        project_ids = self.session.exec(missing).all()
+        for start in range(0, len(project_ids), batch_size):
+            self.refresh_listings(project_ids[start:start + batch_size])
+            self.session.commit()
+        return len(project_ids)
+
+    def get_listing_json(self, project_ids: List[uuid.UUID]) -> str:
+        """The "data" array of GET /projects for the given ids, built as JSON text by PostgreSQL"""
+        if not project_ids:
+            return "[]"
+
+        rows = (
+            select(col(Project.id), col(Project.title), col(ProjectListing.agency_name), col(ProjectListing.ministry_names))
+            .add_columns(
+                col(ProjectListing.private_party_names),
+                col(ProjectListing.sector_names),
+                col(ProjectListing.concession_names),
+                col(ProjectListing.start_date),
+            )
+            .join(ProjectListing, col(ProjectListing.project_id) == Project.id)
+            .where(col(Project.id).in_(project_ids))
+            .subquery("listing_rows")
+        )
+
+        page_ids = bindparam("page_ids", project_ids, type_=postgresql.ARRAY(postgresql.UUID(as_uuid=True)))
+        position = func.array_position(page_ids, rows.c.id)
+        item = func.json_build_object(
+            "id", rows.c.id,
+            "title", rows.c.title,
+            "ministry", func.coalesce(func.to_json(rows.c.ministry_names), text("'[]'::json")),
+            "public_authority", rows.c.agency_name,
+            "private_parties", func.coalesce(func.to_json(rows.c.private_party_names), text("'[]'::json")),
+            "sector", rows.c.sector_names,
+            "concession", rows.c.concession_names,
+            "start_date", rows.c.start_date,
+        )
+        ordered = postgresql.aggregate_order_by(item, position)  # type: ignore[no-untyped-call]
+        statement = select(cast(func.json_agg(ordered), Text))
+        return self.session.exec(statement).one()
+
+    def _filtered_id_query(self, filters: ProjectFilters, sort: Optional[Tuple[str, bool]] = None) -> Select[Tuple[uuid.UUID]]:
+        """Ids of live projects matching the listing filters, one row per project
+
+        A sort on a project_listing column outer joins that table so the page
+        can be ordered on it. Projects without a listing row sort as NULL (last),
+        so every page agrees with the total, which is counted without the join.
+        """
+        id_query = project_id_query(filters)
+        if sort is not None and LISTING_SORTS[sort[0]].table is inspect(ProjectListing).local_table:
+            id_query = id_query.outerjoin(ProjectListing, col(ProjectListing.project_id) == Project.id)
+        return id_query
+
+    def _page_id_query(
+        self,
+        id_query: Select[Tuple[uuid.UUID]],
+        skip: int,
+        limit: int,
+        after: Optional[Tuple[Any, uuid.UUID]],
+        rank_title: Optional[str] = None,
+        sort: Tuple[str, bool] = DEFAULT_SORT
+    ) -> Select[Tuple[uuid.UUID]]:
+        """Restrict filtered ids to one page, by keyset when after is given, else by offset
+
+        rank_title orders by trigram similarity to that text first (offset only).
+        """
+        if after and not rank_title:
+            id_query = id_query.where(self._after_condition(sort, *after))
+        else:
+            id_query = id_query.offset(skip)
+        return id_query.order_by(*self._page_order(rank_title, sort)).limit(limit)
+
+    def _after_condition(self, sort: Tuple[str, bool], value: Any, project_id: uuid.UUID) -> ColumnElement[bool]:
+        """Rows that come after (value, project_id) in sort order, NULL sort values last"""
+        key, descending = sort
+        column = LISTING_SORTS[key]
+        id_after = col(Project.id) < project_id if descending else col(Project.id) > project_id
+        if not column.nullable:
+            if descending:
+                return tuple_(column, col(Project.id)) < tuple_(value, literal(project_id))
+            return tuple_(column, col(Project.id)) > tuple_(value, literal(project_id))
+        if value is None:
+            return column.is_(None) & id_after
+        return or_(
+            column < value if descending else column > value,
+            (column == value) & id_after,
+            column.is_(None)
+        )
 
+    def _page_order(self, rank_title: Optional[str] = None, sort: Tuple[str, bool] = DEFAULT_SORT) -> List[Any]:
+        key, descending = sort
+        column = LISTING_SORTS[key]
+        if descending:
+            order = [column.desc().nulls_last() if column.nullable else column.desc(), col(Project.id).desc()]
+        else:
+            order = [column.asc(), col(Project.id).asc()]
+        if rank_title:
+            order.insert(0, func.similarity(col(Project.title), rank_title).desc())
+        return order
+
+    def _listing_rows(self, project_ids: Sequence[uuid.UUID]) -> List[Row[Any]]:
+        """Display columns of the listing for the given ids, in listing order"""
         if not project_ids:
             return []
 
+        statement = (
+            select(col(Project.id), col(Project.title), col(Project.updated_at), col(ProjectListing.agency_name))
+            .add_columns(
+                col(ProjectListing.ministry_names),
+                col(ProjectListing.private_party_names),
+                col(ProjectListing.sector_names),
+                col(ProjectListing.concession_names),
+                col(ProjectListing.contract_type_names),
+                col(ProjectListing.start_date),
+                col(ProjectListing.budget_amount),
+            )
+            .join(ProjectListing, col(ProjectListing.project_id) == Project.id)
+            .where(col(Project.id).in_(project_ids))
+        )
+        rows = self.session.execute(statement).all()
+
+        # Keep the order the page query chose
+        position = {project_id: i for i, project_id in enumerate(project_ids)}
+        return sorted(rows, key=lambda row: position[row.id])
+
+    def refresh_listings(self, project_ids: Sequence[uuid.UUID]) -> None:
+        """Rebuild the project_listing rows of projects from the current transaction. Does not commit."""
+        for row in self.session.execute(self._listing_aggregate_query(project_ids)).all():
+            self.session.merge(ProjectListing(
+                project_id=row.id,
+                agency_name=row.agency_name,
+                ministry_names=row.ministry_names,
+                private_party_names=row.private_party_names,
+                sector_names=row.sector_names,
+                concession_names=row.concession_names,
+                contract_type_names=row.contract_type_names,
+                start_date=row.start_date,
+                budget_amount=row.budget_amount,
+                built_at=datetime.utcnow()
+            ))
+
+    def delete_listing(self, project_id: str) -> None:
+        """Drop a project's project_listing row. Does not commit."""
+        listing = self.session.get(ProjectListing, project_id)
+        if listing:
+            self.session.delete(listing)
+            self.session.flush()
+
+    def _listing_aggregate_query(self, project_ids: Sequence[uuid.UUID]) -> Select[Any]:
+        """Listing display columns aggregated from the normalized tables"""
+        from sqlalchemy.orm import aliased
+        from oc4ids_datastore_api.models import ProjectSectorLink, ProjectPeriod, ProjectAdditionalClassificationLink, ProjectBudget, AdditionalClassification
+
         PartyAgency = aliased(Agency)
         AgencyMinistry = aliased(Ministry)
         
         # Main Query for Details
-        statement = (
+        statement: Select[Any] = (
             select(
                 Project.id,
                 Project.title,
-                Agency.name_en.label("agency_name"),
+                Project.updated_at,
+                col(Agency.name_en).label("agency_name"),
                 # Aggregated columns
-                func.string_agg(Ministry.name_en.distinct(), ', ').label("party_ministry_names"),
-                func.string_agg(PartyAgency.name_en.distinct(), ', ').label("private_party_name"),
+                func.array_agg(col(Ministry.name_en).distinct()).filter(col(Ministry.name_en).is_not(None)).label("ministry_names"),
+                func.array_agg(col(PartyAgency.name_en).distinct()).filter(col(PartyAgency.name_en).is_not(None)).label("private_party_names"),
                 func.array_agg(Sector.name_en.distinct()).label("sector_names"),
                 # Concession Forms Only
                 func.array_agg(
                     AdditionalClassification.description.distinct()
-                ).filter(AdditionalClassification.scheme == 'รูปแบบสัมปทานหรือค่าตอบแทน').label("concession_names"),
+                ).filter(AdditionalClassification.scheme == CONCESSION_FORM_SCHEME).label("concession_names"),
                 func.array_agg(
                     AdditionalClassification.description.distinct()
-                ).filter(AdditionalClassification.scheme == 'รูปแบบการจัดสรรกรรมสิทธิ์').label("contract_type_names"),
+                ).filter(AdditionalClassification.scheme == CONTRACT_TYPE_SCHEME).label("contract_type_names"),
                 func.min(ProjectPeriod.start_date).label("start_date"),
-                func.sum(ProjectBudget.total_amount).label("budget_amount"),
+                # Summed in a subquery: the joins below repeat each budget row
+                select(func.sum(ProjectBudget.total_amount))
+                .where(ProjectBudget.project_id == Project.id)
+                .scalar_subquery()
+                .label("budget_amount"),
             )
-            .filter(Project.id.in_(project_ids)) # Filter by pre-selected IDs
+            .filter(col(Project.id).in_(project_ids)) # Filter by pre-selected IDs
             
-            .join(Agency, Project.public_authority_id == Agency.id, isouter=True) 
-            .join(ProjectBudget, Project.id == ProjectBudget.project_id, isouter=True)           
+            .join(Agency, col(Project.public_authority_id) == Agency.id, isouter=True) 
             # Party connections
-            .join(ProjectParty, Project.id == ProjectParty.project_id, isouter=True)
-            .join(PartyAdditionalIdentifier, ProjectParty.id == PartyAdditionalIdentifier.party_id, isouter=True)
+            .join(ProjectParty, col(Project.id) == ProjectParty.project_id, isouter=True)
+            .join(PartyAdditionalIdentifier, col(ProjectParty.id) == PartyAdditionalIdentifier.party_id, isouter=True)
             #ministry
-            .join(Ministry, PartyAdditionalIdentifier.legal_name_id == Ministry.id, isouter=True)
+            .join(Ministry, col(PartyAdditionalIdentifier.legal_name_id) == Ministry.id, isouter=True)
             #agency
-            .join(PartyAgency, ProjectParty.identifier_legal_name_id == PartyAgency.id, isouter=True)
+            .join(PartyAgency, col(ProjectParty.identifier_legal_name_id) == PartyAgency.id, isouter=True)
             #sector
-            .join(ProjectSectorLink, Project.id == ProjectSectorLink.project_id, isouter=True)
-            .join(Sector, ProjectSectorLink.sector_id == Sector.id, isouter=True)
+            .join(ProjectSectorLink, col(Project.id) == ProjectSectorLink.project_id, isouter=True)
+            .join(Sector, col(ProjectSectorLink.sector_id) == Sector.id, isouter=True)
 
-            .join(ProjectAdditionalClassificationLink, Project.id == ProjectAdditionalClassificationLink.project_id, isouter=True)
-            .join(AdditionalClassification, ProjectAdditionalClassificationLink.classification_id == AdditionalClassification.id, isouter=True)
+            .join(ProjectAdditionalClassificationLink, col(Project.id) == ProjectAdditionalClassificationLink.project_id, isouter=True)
+            .join(AdditionalClassification, col(ProjectAdditionalClassificationLink.classification_id) == AdditionalClassification.id, isouter=True)
             #start_date
-            .join(ProjectPeriod, Project.id == ProjectPeriod.project_id, isouter=True)
+            .join(ProjectPeriod, col(Project.id) == ProjectPeriod.project_id, isouter=True)
         )
         
-        statement = statement.group_by(Project.id, Project.title, Agency.name_en)
-        return self.session.exec(statement).all()
+        return statement.group_by(col(Project.id), col(Project.title), col(Agency.name_en))
+
+    def get_latest_projects(self, filters: ProjectFilters = ProjectFilters(), limit: int = 5) -> Sequence[Row[Any]]:
+        """The most recently updated live projects matching the filters, newest first
+
+        One statement: the ids are a top-N walk of ix_projects_updated_at_id,
+        and only those rows are joined to their listing row and project type.
+        """
+        from oc4ids_datastore_api.models import ProjectType
 
-    def get_summaries(self, *args, **kwargs):
-        return self.get_projects(*args, **kwargs)
+        latest = (
+            select(col(Project.id), col(Project.title), col(Project.status), col(Project.updated_at))
+            .add_columns(col(Project.project_type_id))
+            .where(*project_conditions(filters))
+            .order_by(col(Project.updated_at).desc(), col(Project.id).desc())
+            .limit(limit)
+            .subquery("latest")
+        )
+        statement = (
+            select(latest.c.id, latest.c.title, latest.c.status, latest.c.updated_at)
+            .add_columns(
+                col(ProjectType.code).label("project_type"),
+                col(ProjectListing.agency_name),
+                col(ProjectListing.ministry_names),
+                col(ProjectListing.budget_amount),
+            )
+            .outerjoin(ProjectListing, col(ProjectListing.project_id) == latest.c.id)
+            .outerjoin(ProjectType, col(ProjectType.id) == latest.c.project_type_id)
+            .order_by(latest.c.updated_at.desc(), latest.c.id.desc())
+        )
+        return self.session.execute(statement).all()
 
     def count(self) -> int:
-        return self.session.exec(select(func.count()).select_from(Project).where(Project.deleted_at.is_(None))).one()
+        return self.session.exec(select(func.count()).select_from(Project).where(col(Project.deleted_at).is_(None))).one()
 
     def create(self, project: Project) -> Project:
         self.session.add(project)
@@ -181,285 +545,196 @@ class ProjectDAO:
             
         self.session.commit()
 
-    def get_dashboard_stats(
-        self,
-        title: Optional[str] = None,
-        sector_id: Optional[List[int]] = None,
-        ministry_id: Optional[List[int]] = None,
-        agency_id: Optional[List[int]] = None,
-        concession_form_id: Optional[List[int]] = None,
-        contract_type_id: Optional[List[int]] = None,
-        year_from: Optional[int] = None,
-        year_to: Optional[int] = None
-    ) -> dict:
+    def get_dashboard_stats(self, filters: ProjectFilters = ProjectFilters()) -> Dict[str, Any]:
         """
-        Get aggregated statistics for the dashboard.
-        """
-        from sqlalchemy.orm import aliased
-        from sqlalchemy import func, case, and_, or_
-        from oc4ids_datastore_api.models import ProjectSectorLink, ProjectPeriod, ProjectAdditionalClassificationLink, ProjectBudget, AdditionalClassification
-        
-        # --- 1. Base Query Construction (Similar to get_projects) ---
-        FilterLastPeriod = aliased(ProjectPeriod)
-        FilterSectorLink = aliased(ProjectSectorLink)
-        FilterLinkConcession = aliased(ProjectAdditionalClassificationLink)
-        FilterAgency = aliased(Agency)
-        
-        id_query = select(Project.id).where(Project.deleted_at.is_(None))
-
-        # Apply Filters (Same logic as get_projects)
-        if title:
-            id_query = id_query.where(Project.title.ilike(f"%{title}%"))
+        Get aggregated statistics for the dashboard in one statement.
 
-        if sector_id:
-            id_query = id_query.join(FilterSectorLink, Project.id == FilterSectorLink.project_id)
-            id_query = id_query.where(FilterSectorLink.sector_id.in_(sector_id))
-        
-        if ministry_id:
-            id_query = id_query.join(FilterAgency, Project.public_authority_id == FilterAgency.id, isouter=True)
-            PartyMinistryFilter = aliased(Ministry)
-            PartyAgencyFilter = aliased(Agency)
-            PartyIdentifierFilter = aliased(PartyAdditionalIdentifier)
-            ProjectPartyFilter = aliased(ProjectParty)
-            
-            id_query = id_query.outerjoin(ProjectPartyFilter, Project.id == ProjectPartyFilter.project_id)
-            id_query = id_query.outerjoin(PartyIdentifierFilter, ProjectPartyFilter.id == PartyIdentifierFilter.party_id)
-            id_query = id_query.outerjoin(PartyMinistryFilter, PartyIdentifierFilter.legal_name_id == PartyMinistryFilter.id)
-            
-            id_query = id_query.where(
-                or_(
-                    PartyMinistryFilter.id.in_(ministry_id),
-                    FilterAgency.ministry_id.in_(ministry_id)
+        The filtered ids are materialized once, joined once to the budgets, and
+        every breakdown (totals, scales, ministries, sectors, years) is a branch
+        of a UNION ALL over that CTE, tagged by its "kind" column.
+        """
+        from sqlalchemy import Float, literal, null, union_all
+        from oc4ids_datastore_api.models import ProjectSectorLink, ProjectPeriod, ProjectBudget
+
+        filtered = project_id_query(filters).cte("filtered").prefix_with("MATERIALIZED")
+        budgeted = (
+            select(filtered.c.id.label("project_id"), col(ProjectBudget.id).label("budget_id"), col(ProjectBudget.total_amount).label("amount"))
+            .select_from(filtered)
+            .outerjoin(ProjectBudget, col(ProjectBudget.project_id) == filtered.c.id)
+            .cte("budgeted")
+        )
+        amount = budgeted.c.amount
+
+        # Small < 1,000M, Medium 1,000M - < 5,000M, Big >= 5,000M
+        scales = [
+            amount < SMALL_PROJECT_LIMIT,
+            (amount >= SMALL_PROJECT_LIMIT) & (amount < BIG_PROJECT_LIMIT),
+            amount >= BIG_PROJECT_LIMIT,
+        ]
+        scale_columns: List[ColumnElement[Any]] = []
+        for condition in scales:
+            scale_columns += [func.count(budgeted.c.budget_id).filter(condition), func.sum(amount).filter(condition)]
+        no_scales = [null()] * len(scale_columns)
+
+        def breakdown(
+            kind: str,
+            key: Any,
+            name: Optional[Any],
+            joined: FromClause,
+            project_count: ColumnElement[Any],
+            with_scales: bool = False
+        ) -> Select[Any]:
+            return (
+                select(
+                    literal(kind).label("kind"),
+                    key.label("key"),
+                    (null() if name is None else name).label("name"),
+                    project_count.label("projects"),
                 )
+                .add_columns(
+                    func.sum(amount).label("investment"),
+                    *(scale_columns if with_scales else no_scales),
+                    null().label("max_budget"),
+                    null().label("contractors"),
+                )
+                .select_from(joined)
+                .group_by(*(column for column in (key, name) if column is not None))
             )
 
-        if concession_form_id:
-            id_query = id_query.join(FilterLinkConcession, Project.id == FilterLinkConcession.project_id)
-            id_query = id_query.where(FilterLinkConcession.classification_id.in_(concession_form_id))
-        
-        if contract_type_id:
-            FilterLinkContract = aliased(ProjectAdditionalClassificationLink)
-            id_query = id_query.join(FilterLinkContract, Project.id == FilterLinkContract.project_id)
-            id_query = id_query.where(FilterLinkContract.classification_id.in_(contract_type_id))
-        
-        if year_from or year_to:
-             id_query = id_query.join(FilterLastPeriod, (Project.id == FilterLastPeriod.project_id) & (FilterLastPeriod.period_type == 'duration'))
-
-        if year_from and year_to:
-             id_query = id_query.where(func.extract('year', FilterLastPeriod.start_date) <= year_to)
-             id_query = id_query.where(func.extract('year', FilterLastPeriod.end_date) >= year_from)
-        elif year_from:
-             id_query = id_query.where(func.extract('year', FilterLastPeriod.end_date) >= year_from)
-        elif year_to:
-             id_query = id_query.where(func.extract('year', FilterLastPeriod.start_date) <= year_to)
-
-        # Use CTE or subquery for filtered project IDs
-        filtered_project_ids = id_query.distinct().subquery()
-        
-        # --- 2. Aggregations ---
-        
-        # 2.1 Total Projects
-        total_projects = self.session.exec(select(func.count()).select_from(filtered_project_ids)).one()
-        
-        if total_projects == 0:
-            return {
-                "total_projects": 0,
-                "total_investment": 0,
-                "max_budget": 0,
-                "unique_contractors": 0,
-                "ministry_counts": {},
-                "ministry_investments": {},
-                "project_scales": {
-                    "big": {"count": 0, "investment": 0},
-                    "medium": {"count": 0, "investment": 0},
-                    "small": {"count": 0, "investment": 0},
-                },
-                "sector_stats": {},
-                "investment_by_year": {},
-                "project_ids": []
-            }
-
-        # 2.2 Total Investment & Max Budget (using ProjectBudget or logic used in get_projects?)
-        # Wait, get_projects logic doesn't select budget directly in the main query shown earlier.
-        # But dashboard summary had "total_investment" and "max_budget".
-        # Assuming budget info is in ProjectBudget linked to Project
-        
-        # We need to join ProjectBudget to the filtered IDs
-        # Note: A project might have multiple budgets? Assuming distinct sum logic or specific budget type?
-        # Standard OC4IDS has budget.amount.
-        # Let's check ProjectBudget model implicitly.
-        
-        ProjectBudgetAlias = aliased(ProjectBudget)
-        
-        # Total Investment (Sum of all budgets for filtered projects)
-        investment_query = select(func.sum(ProjectBudgetAlias.total_amount)).where(ProjectBudgetAlias.project_id.in_(select(filtered_project_ids.c.id)))
-        total_investment = self.session.exec(investment_query).one() or 0
-        
-        # Max Budget
-        max_budget_query = select(func.max(ProjectBudgetAlias.total_amount)).where(ProjectBudgetAlias.project_id.in_(select(filtered_project_ids.c.id)))
-        max_budget = self.session.exec(max_budget_query).one() or 0
-        
-        # 2.3 Unique Contractors = Total count of agencies
-        AgencyCountAlias = aliased(Agency)
-        contractor_query = select(func.count(AgencyCountAlias.id)).where(AgencyCountAlias.ministry_id.is_(None))
-        unique_contractors = self.session.exec(contractor_query).one()
+        totals = select(
+            literal("total"),
+            null(),
+            null(),
+            func.count(budgeted.c.project_id.distinct()),
+        ).add_columns(
+            func.sum(amount),
+            *scale_columns,
+            cast(func.max(amount), Float),
+            # Unique contractors = agencies without a ministry (not filtered)
+            select(func.count(col(Agency.id))).where(col(Agency.ministry_id).is_(None)).scalar_subquery(),
+        ).select_from(budgeted)
+        ministries = breakdown(
+            "ministry", col(Ministry.id), col(Ministry.name_en),
+            budgeted
+            .join(ProjectParty, col(ProjectParty.project_id) == budgeted.c.project_id)
+            .join(PartyAdditionalIdentifier, col(ProjectParty.id) == PartyAdditionalIdentifier.party_id)
+            .join(Ministry, col(PartyAdditionalIdentifier.legal_name_id) == Ministry.id),
+            func.count(budgeted.c.project_id.distinct())
+        )
+        sectors = breakdown(
+            "sector", col(Sector.id), col(Sector.name_en),
+            budgeted
+            .join(ProjectSectorLink, col(ProjectSectorLink.project_id) == budgeted.c.project_id)
+            .join(Sector, col(ProjectSectorLink.sector_id) == Sector.id),
+            func.count(budgeted.c.project_id.distinct()),
+            with_scales=True
+        )
+        years = breakdown(
+            "year", col(ProjectPeriod.start_year), None,
+            budgeted.join(ProjectPeriod, col(ProjectPeriod.project_id) == budgeted.c.project_id),
+            func.count(budgeted.c.project_id.distinct())
+        ).where(col(ProjectPeriod.period_type) == 'duration', col(ProjectPeriod.start_year).is_not(None))
 
-        ProjectPartyAlias = aliased(ProjectParty)
+        return _dashboard_stats(self.session.execute(union_all(totals, ministries, sectors, years)).all())
 
-        # 2.4 Ministry Stats (Count and Investment)
-        # Group by Ministry (via Agency -> Ministry OR ProjectParty -> Ministry?)
-        # Based on get_projects logic, it seems we care about the "Public Authority" ministry.
-        
-        MinistryAlias = aliased(Ministry)
-        AgencyAlias = aliased(Agency)
-        IdentifierAlias = aliased(PartyAdditionalIdentifier)
-        
-        # Basic approach: Group by Ministry of the Public Authority (Agency)
-        stats_query = (
-            select(
-                MinistryAlias.name_en, # Use name_en to match get_projects
-                func.count(func.distinct(Project.id)),
-                func.sum(ProjectBudgetAlias.total_amount)
-            )
-            .join(ProjectPartyAlias, Project.id == ProjectPartyAlias.project_id)
-            .join(IdentifierAlias, ProjectPartyAlias.id == IdentifierAlias.party_id)
-            .join(MinistryAlias, IdentifierAlias.legal_name_id == MinistryAlias.id)
-            .outerjoin(ProjectBudgetAlias, Project.id == ProjectBudgetAlias.project_id)
-            .where(Project.id.in_(select(filtered_project_ids.c.id)))
-            .group_by(MinistryAlias.id, MinistryAlias.name_en)
-        )
-        
-        ministry_stats_results = self.session.exec(stats_query).all()
-        
-        ministry_counts = {row[0]: row[1] for row in ministry_stats_results}
-        ministry_investments = {row[0]: (row[2] or 0) for row in ministry_stats_results}
+    def get_dashboard_cube(
+        self,
+        sector_id: int = 0,
+        ministry_id: int = 0,
+        concession_form_id: int = 0,
+        contract_type_id: int = 0
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Dashboard statistics of one scope of the rollup cube (0 = any value).
 
-        # 2.5 Project Scales (Small, Medium, Big)
-        # Small < 1,000M, Medium 1,000M - 5,000M, Big > 5,000M
-        
-        # We can do this with a single query using CASE WHEN
-        scale_query = (
-            select(
-                func.sum(case((ProjectBudgetAlias.total_amount >= 5000000000, 1), else_=0)).label("big_count"),
-                func.sum(case((ProjectBudgetAlias.total_amount >= 5000000000, ProjectBudgetAlias.total_amount), else_=0)).label("big_investment"),
-                
-                func.sum(case((and_(ProjectBudgetAlias.total_amount >= 1000000000, ProjectBudgetAlias.total_amount < 5000000000), 1), else_=0)).label("medium_count"),
-                func.sum(case((and_(ProjectBudgetAlias.total_amount >= 1000000000, ProjectBudgetAlias.total_amount < 5000000000), ProjectBudgetAlias.total_amount), else_=0)).label("medium_investment"),
-                
-                func.sum(case((ProjectBudgetAlias.total_amount < 1000000000, 1), else_=0)).label("small_count"),
-                func.sum(case((ProjectBudgetAlias.total_amount < 1000000000, ProjectBudgetAlias.total_amount), else_=0)).label("small_investment"),
-            )
-            .where(ProjectBudgetAlias.project_id.in_(select(filtered_project_ids.c.id)))
-        )
-        
-        scale_results = self.session.exec(scale_query).first()
-        
-        project_scales = {
-            "big": {"count": scale_results[0] or 0, "investment": scale_results[1] or 0},
-            "medium": {"count": scale_results[2] or 0, "investment": scale_results[3] or 0},
-            "small": {"count": scale_results[4] or 0, "investment": scale_results[5] or 0},
-        }
+        Returns the same statistics as get_dashboard_stats, or None when a
+        classification id is not of the scheme its filter is stored under.
+        """
+        from sqlalchemy import Float, case
+        from oc4ids_datastore_api.models import AdditionalClassification, DashboardCube
+        from oc4ids_datastore_api.rollups import SCALE_COLUMNS
 
-        # 2.6 Sector Stats
-        # Group by Sector Name
-        
-        SectorAlias = aliased(Sector)
-        ProjectSectorLinkAlias = aliased(ProjectSectorLink)
-        
-        sector_stats = {}
-        # Need to join Project -> ProjectSectorLink -> Sector
-        # And also ProjectBudget for investment amounts and scale breakdown per sector?
-        # The original code structure suggested complex nested stats: sector -> total/small/medium/big
-        
-        # Simplified Sector Stats Query (Group by Sector, then maybe post-process or complex query)
-        # Let's do basic sector stats first: Count and Total Investment
-        
-        sector_query = (
-             select(
-                 SectorAlias.name_en,
-                 func.count(func.distinct(Project.id)),
-                 func.sum(ProjectBudgetAlias.total_amount),
-                 # Small < 1,000M
-                 func.sum(case((ProjectBudgetAlias.total_amount < 1000000000, 1), else_=0)),
-                 func.sum(case((ProjectBudgetAlias.total_amount < 1000000000, ProjectBudgetAlias.total_amount), else_=0)),
-                 # Medium 1,000M - < 5,000M
-                 func.sum(case((and_(ProjectBudgetAlias.total_amount >= 1000000000, ProjectBudgetAlias.total_amount < 5000000000), 1), else_=0)),
-                 func.sum(case((and_(ProjectBudgetAlias.total_amount >= 1000000000, ProjectBudgetAlias.total_amount < 5000000000), ProjectBudgetAlias.total_amount), else_=0)),
-                 # Big >= 5,000M
-                 func.sum(case((ProjectBudgetAlias.total_amount >= 5000000000, 1), else_=0)),
-                 func.sum(case((ProjectBudgetAlias.total_amount >= 5000000000, ProjectBudgetAlias.total_amount), else_=0))
-             )
-             .join(ProjectSectorLinkAlias, Project.id == ProjectSectorLinkAlias.project_id)
-             .join(SectorAlias, ProjectSectorLinkAlias.sector_id == SectorAlias.id)
-             .outerjoin(ProjectBudgetAlias, Project.id == ProjectBudgetAlias.project_id)
-             .where(Project.id.in_(select(filtered_project_ids.c.id)))
-             .group_by(SectorAlias.id, SectorAlias.name_en)
-        )
-        
-        sector_results = self.session.exec(sector_query).all()
-        
-        for row in sector_results:
-             name = row[0]
-             total_count = row[1]
-             total_inv = row[2]
-             
-             small_count = row[3] or 0
-             small_inv = row[4] or 0
-             
-             medium_count = row[5] or 0
-             medium_inv = row[6] or 0
-             
-             big_count = row[7] or 0
-             big_inv = row[8] or 0
-
-             sector_stats[name] = {
-                 "total": {"count": total_count, "investment": total_inv or 0},
-                 "small": {"count": small_count, "investment": small_inv},
-                 "medium": {"count": medium_count, "investment": medium_inv},
-                 "big": {"count": big_count, "investment": big_inv}
-             }
-
-        # 2.7 Investment by Year
-        # Group by start_date year
-        ProjectPeriodAlias = aliased(ProjectPeriod)
-        
-        year_query = (
+        for scheme, classification_id in ((CONCESSION_FORM_SCHEME, concession_form_id), (CONTRACT_TYPE_SCHEME, contract_type_id)):
+            if classification_id:
+                classification = self.session.get(AdditionalClassification, classification_id)
+                if classification is None or classification.scheme != scheme:
+                    return None
+
+        statement = (
             select(
-                func.extract('year', ProjectPeriodAlias.start_date).label("year"),
-                func.count(func.distinct(Project.id)),
-                func.sum(ProjectBudgetAlias.total_amount)
+                col(DashboardCube.kind),
+                col(DashboardCube.key),
+                case((col(DashboardCube.kind) == "ministry", col(Ministry.name_en)), else_=col(Sector.name_en)),
+                col(DashboardCube.projects),
             )
-            .join(ProjectPeriodAlias, Project.id == ProjectPeriodAlias.project_id)
-            .outerjoin(ProjectBudgetAlias, Project.id == ProjectBudgetAlias.project_id)
+            .add_columns(
+                cast(DashboardCube.investment, Float),
+                *(
+                    getattr(DashboardCube, name) if name.endswith("_count") else cast(getattr(DashboardCube, name), Float)
+                    for name in SCALE_COLUMNS
+                ),
+                col(DashboardCube.max_budget),
+                # Unique contractors = agencies without a ministry (not filtered)
+                select(func.count(col(Agency.id))).where(col(Agency.ministry_id).is_(None)).scalar_subquery(),
+            )
+            .outerjoin(Ministry, (col(DashboardCube.kind) == "ministry") & (col(Ministry.id) == DashboardCube.key))
+            .outerjoin(Sector, (col(DashboardCube.kind) == "sector") & (col(Sector.id) == DashboardCube.key))
             .where(
-                Project.id.in_(select(filtered_project_ids.c.id)),
-                ProjectPeriodAlias.period_type == 'duration', # Assuming main project duration
-                ProjectPeriodAlias.start_date.is_not(None)
+                col(DashboardCube.sector_id) == sector_id,
+                col(DashboardCube.ministry_id) == ministry_id,
+                col(DashboardCube.concession_form_id) == concession_form_id,
+                col(DashboardCube.contract_type_id) == contract_type_id,
+                col(DashboardCube.projects) > 0,
             )
-            .group_by("year")
-            .order_by("year")
         )
-        
-        year_results = self.session.exec(year_query).all()
-        # Format: {year: {count: x, investment: y}}
-        investment_by_year = {}
-        for y, c, i in year_results:
-            if y:
-                investment_by_year[int(y)] = {"count": c, "investment": i or 0}
-
+        return _dashboard_stats(self.session.execute(statement).all())
+
+def _dashboard_stats(rows: Sequence[Any]) -> Dict[str, Any]:
+    """
+    Dashboard statistics from rows of (kind, key, name, projects, investment,
+    small/medium/big count and investment, max_budget, contractors).
+    """
+    stats: Dict[str, Any] = {
+        "total_projects": 0,
+        "total_investment": 0,
+        "max_budget": 0,
+        "unique_contractors": 0,
+        "ministry_counts": {},
+        "ministry_investments": {},
+        "project_scales": {scale: {"count": 0, "investment": 0} for scale in DASHBOARD_SCALES},
+        "sector_stats": {},
+        "investment_by_year": {},
+    }
+
+    def scale_stats(row: Sequence[Any]) -> Dict[str, Dict[str, Any]]:
+        values = row[5:11]
         return {
-            "total_projects": total_projects,
-            "total_investment": total_investment,
-            "max_budget": max_budget,
-            "unique_contractors": unique_contractors,
-            "ministry_counts": ministry_counts,
-            "ministry_investments": ministry_investments,
-            "project_scales": project_scales,
-            "sector_stats": sector_stats,
-            "investment_by_year": investment_by_year,
-            "project_ids": [row for row in self.session.exec(select(filtered_project_ids)).all()] 
+            scale: {"count": values[2 * i] or 0, "investment": values[2 * i + 1] or 0}
+            for i, scale in enumerate(DASHBOARD_SCALES)
         }
 
+    for row in rows:
+        kind, key, name, projects, investment = row[:5]
+        if kind == "total":
+            if not projects:
+                return stats
+            stats.update(
+                total_projects=projects,
+                total_investment=investment or 0,
+                max_budget=row[11] or 0,
+                unique_contractors=row[12],
+                project_scales=scale_stats(row)
+            )
+        elif kind == "ministry":
+            stats["ministry_counts"][name] = projects
+            stats["ministry_investments"][name] = investment or 0
+        elif kind == "sector":
+            stats["sector_stats"][name] = {"total": {"count": projects, "investment": investment or 0}, **scale_stats(row)}
+        elif kind == "year":
+            stats["investment_by_year"][int(key)] = {"count": projects, "investment": investment or 0}
+    return stats
+
+
 class ReferenceDataDAO:
     def __init__(self, session: Session):
         self.session = session
@@ -484,7 +759,7 @@ class ReferenceDataDAO:
         from oc4ids_datastore_api.models import AdditionalClassification
         return self.session.exec(
             select(AdditionalClassification)
-            .where(AdditionalClassification.scheme == "รูปแบบสัมปทานหรือค่าตอบแทน")
+            .where(AdditionalClassification.scheme == CONCESSION_FORM_SCHEME)
             .distinct()
         ).all()
 
@@ -493,7 +768,7 @@ class ReferenceDataDAO:
         from oc4ids_datastore_api.models import AdditionalClassification
         return self.session.exec(
             select(AdditionalClassification)
-            .where(AdditionalClassification.scheme == "รูปแบบการจัดสรรกรรมสิทธิ์")
+            .where(AdditionalClassification.scheme == CONTRACT_TYPE_SCHEME)
             .distinct()
         ).all()
     
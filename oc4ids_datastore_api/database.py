@@ -1,3 +1,4 @@
+import logging
 import os
 from typing import Sequence
 
@@ -6,12 +7,44 @@ from sqlmodel import Session, create_engine, select
 from sqlmodel import SQLModel, Field
 
 from oc4ids_datastore_api.models import Project
+from oc4ids_datastore_api.migrations import run_migrations
+from oc4ids_datastore_api.daos import ProjectDAO
+from oc4ids_datastore_api.analytics import build_dashboard_snapshot
+from oc4ids_datastore_api.facets import build_facet_index
+from oc4ids_datastore_api.rollups import rebuild_cube
+
+logger = logging.getLogger(__name__)
 
 
 engine = create_engine(os.environ["DATABASE_URL"], echo=False)
 SQLModel.metadata.create_all(engine)
 
 
+def prepare_database(engine: Engine) -> None:
+    """Bring the database up to date: migrations, missing listing rows and, if stale, the rollup cube"""
+    run_migrations(engine)
+
+    # GET /projects sorts projects without a project_listing row as if they had no
+    # start date or budget, so rows of projects written before the table existed
+    # are built up front
+    if engine.dialect.name == "postgresql":
+        with Session(engine) as session:
+            built = ProjectDAO(session).backfill_listings()
+        if built:
+            logger.info(f"Built {built} missing project_listing rows")
+
+    # The dashboard rollup cube only follows writes made through the API, so
+    # data loaded while it was down is picked up here
+    rebuild_cube(engine)
+
+
+def build_memory_indexes(engine: Engine) -> None:
+    """Load this process's facet index and dashboard snapshot, when enabled"""
+    with Session(engine) as session:
+        build_facet_index(session)
+        build_dashboard_snapshot(session)
+
+
 def get_engine() -> Engine:
     global _engine
     if _engine is None:
@@ -0,0 +1,415 @@
+"""
+In-process bitmap index over the GET /projects filter facets.
+
+Setting FACET_INDEX=1 (with pyroaring installed, see the facet-index extra)
+builds one compressed bitmap of project ordinals per sector, ministry,
+classification (concession form / contract type) and duration-period year
+at startup. Filter sets made only of those facets are then answered, with
+their count, from memory before any SQL runs; the other filters (title
+search, agency, budget, status, ...) and any failure fall back to SQL.
+Writes through the API update the index after they commit. Each worker
+process holds its own copy, and rebuilds it when the projects table shows
+writes made since it was built, checked at most once every FACET_INDEX_TTL
+seconds on the request path.
+"""
+import importlib
+import logging
+import os
+import threading
+import time
+import uuid
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from sqlmodel import Session, col, select
+
+from oc4ids_datastore_api.filters import ProjectFilters
+from oc4ids_datastore_api.models import (
+    CONCESSION_FORM_SCHEME,
+    CONTRACT_TYPE_SCHEME,
+    AdditionalClassification,
+    Agency,
+    Ministry,
+    PartyAdditionalIdentifier,
+    Project,
+    ProjectAdditionalClassificationLink,
+    ProjectParty,
+    ProjectPeriod,
+    ProjectSectorLink,
+)
+
+logger = logging.getLogger(__name__)
+
+# Imported by name so type checking does not need the facet-index extra
+BitMap: Any
+try:
+    BitMap = importlib.import_module("pyroaring").BitMap
+except ImportError:
+    BitMap = None
+
+FACET_INDEX_TTL = float(os.environ.get("FACET_INDEX_TTL", "60"))
+
+# Filters the index can answer; anything else set in a request goes to SQL
+INDEXED_FILTERS = ("sector_id", "ministry_id", "concession_form_id", "contract_type_id", "year_from", "year_to")
+
+
+def facet_index_enabled() -> bool:
+    if os.getenv("FACET_INDEX", "").lower() not in ("1", "true", "yes"):
+        return False
+    if BitMap is None:
+        logger.warning("FACET_INDEX is set but pyroaring is not installed; filtering in SQL")
+        return False
+    return True
+
+
+def _union(bitmaps: Dict[int, Any], keys: Iterable[int]) -> Any:
+    return BitMap.union(BitMap(), *(bitmaps[key] for key in keys if key in bitmaps))
+
+
+class FacetIndex:
+    """Bitmaps of project ordinals per facet value
+
+    Year filters match on duration periods, so years are indexed per period
+    (start year and end year bitmaps of period ordinals) and mapped back to
+    projects; a start and an end year from two different periods of one
+    project must not match together, as in SQL.
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.project_ids: List[uuid.UUID] = []
+        self.ordinals: Dict[uuid.UUID, int] = {}
+        self.live = BitMap()
+        self.sectors: Dict[int, Any] = {}
+        self.ministries: Dict[int, Any] = {}
+        self.classifications: Dict[int, Any] = {}
+        self.classification_schemes: Dict[int, str] = {}
+        self.period_owners: List[int] = []
+        self.period_years: List[Tuple[Optional[int], Optional[int]]] = []
+        self.project_periods: Dict[int, List[int]] = {}
+        # Period ordinals of refreshed or removed projects, reused by new periods
+        self.free_periods: List[int] = []
+        self.start_years: Dict[int, Any] = {}
+        self.end_years: Dict[int, Any] = {}
+        # data_version() as of the load, and when it was last compared
+        self.data_version: Tuple[Any, ...] = ()
+        self.checked_at = time.monotonic()
+
+    @classmethod
+    def build(cls, session: Session) -> "FacetIndex":
+        # analytics imports daos, which imports this module
+        from oc4ids_datastore_api.analytics import data_version
+
+        index = cls()
+        # Read first, so writes committed during the load show up as a change
+        index.data_version = data_version(session)
+        index._load(session)
+        return index
+
+    def match(self, filters: ProjectFilters) -> Optional[List[uuid.UUID]]:
+        """Ids of live projects matching the filters, or None when SQL has to answer"""
+        matched = self._matched(filters)
+        if matched is None:
+            return None
+        return [self.project_ids[ordinal] for ordinal in matched]
+
+    def count(self, filters: ProjectFilters) -> Optional[int]:
+        """Size of match(filters) without materializing the ids"""
+        matched = self._matched(filters)
+        return None if matched is None else len(matched)
+
+    def counts(self, filters: ProjectFilters) -> Optional[Dict[str, Dict[int, int]]]:
+        """Projects per facet value, each facet counted under the other facets' filters
+
+        Same shape as ProjectDAO.get_facet_counts; None when SQL has to answer.
+        """
+        if not self._answerable(filters):
+            return None
+
+        def without(*own: str) -> Any:
+            return self._filter_bitmap(filters.without(*own))
+
+        def per_value(bitmaps: Dict[int, Any], base: Any, keys: Optional[Iterable[int]] = None) -> Dict[int, int]:
+            counts = {key: bitmaps[key].intersection_cardinality(base) for key in (bitmaps if keys is None else keys)}
+            return {key: count for key, count in counts.items() if count}
+
+        with self.lock:
+            schemes = self.classification_schemes
+            return {
+                "total": {0: len(without())},
+                "sector": per_value(self.sectors, without("sector_id")),
+                "ministry": per_value(self.ministries, without("ministry_id")),
+                "concessionForm": per_value(
+                    self.classifications, without("concession_form_id"),
+                    [key for key in self.classifications if schemes.get(key) == CONCESSION_FORM_SCHEME]
+                ),
+                "contractType": per_value(
+                    self.classifications, without("contract_type_id"),
+                    [key for key in self.classifications if schemes.get(key) == CONTRACT_TYPE_SCHEME]
+                ),
+                "year": self._year_counts(without("year_from", "year_to")),
+            }
+
+    def _answerable(self, filters: ProjectFilters) -> bool:
+        # budget_min=0 is a filter, so only None and empty values count as unset
+        return all(value is None or value == [] or value == "" for name, value in filters.items() if name not in INDEXED_FILTERS)
+
+    def _matched(self, filters: ProjectFilters) -> Any:
+        if not any(getattr(filters, name) for name in INDEXED_FILTERS) or not self._answerable(filters):
+            return None
+        with self.lock:
+            return self._filter_bitmap(filters)
+
+    def _filter_bitmap(self, filters: ProjectFilters) -> Any:
+        """Live project ordinals matching the indexed filters; call with the lock held"""
+        matched = BitMap(self.live)
+        if filters.sector_id:
+            matched &= _union(self.sectors, filters.sector_id)
+        if filters.ministry_id:
+            matched &= _union(self.ministries, filters.ministry_id)
+        if filters.concession_form_id:
+            matched &= _union(self.classifications, filters.concession_form_id)
+        if filters.contract_type_id:
+            matched &= _union(self.classifications, filters.contract_type_id)
+        if filters.year_from or filters.year_to:
+            matched &= self._year_match(filters.year_from, filters.year_to)
+        return matched
+
+    def refresh(self, session: Session, project_ids: List[uuid.UUID]) -> None:
+        """Re-read the facets of some projects from the database"""
+        self._load(session, project_ids)
+
+    def remove(self, project_id: uuid.UUID) -> None:
+        with self.lock:
+            ordinal = self.ordinals.get(project_id)
+            if ordinal is not None:
+                self._clear(ordinal)
+
+    def snapshot(self) -> Dict[str, Dict[int, FrozenSet[Any]]]:
+        """Project ids per facet value, plus live ids and (id, years) of periods under key 0"""
+        with self.lock:
+            def ids(bitmap: Any) -> FrozenSet[Any]:
+                return frozenset(self.project_ids[ordinal] for ordinal in bitmap & self.live)
+
+            periods = frozenset(
+                (self.project_ids[ordinal], self.period_years[period])
+                for ordinal, owned in self.project_periods.items() if ordinal in self.live
+                for period in owned
+            )
+            return {
+                "live": {0: ids(self.live)},
+                "sector": {key: ids(bitmap) for key, bitmap in self.sectors.items() if bitmap & self.live},
+                "ministry": {key: ids(bitmap) for key, bitmap in self.ministries.items() if bitmap & self.live},
+                "classification": {key: ids(bitmap) for key, bitmap in self.classifications.items() if bitmap & self.live},
+                "period": {0: periods},
+            }
+
+    def _year_match(self, year_from: Optional[int], year_to: Optional[int]) -> Any:
+        periods: Any = None
+        if year_to:
+            periods = _union(self.start_years, [y for y in self.start_years if y <= year_to])
+        if year_from:
+            ending = _union(self.end_years, [y for y in self.end_years if y >= year_from])
+            periods = ending if periods is None else periods & ending
+        return BitMap(self.period_owners[p] for p in periods)
+
+    def _year_counts(self, base: Any) -> Dict[int, int]:
+        """Projects in base with a duration period running through each year"""
+        if not self.start_years or not self.end_years:
+            return {}
+        # Only periods with both years can cover a year_from=year_to=Y filter
+        complete = _union(self.start_years, self.start_years) & _union(self.end_years, self.end_years)
+        started, ended = BitMap(), BitMap()
+        counts = {}
+        for year in range(min(self.start_years), max(self.end_years) + 1):
+            started |= self.start_years.get(year, BitMap())
+            active = (started - ended) & complete
+            if active:
+                count = BitMap(self.period_owners[p] for p in active).intersection_cardinality(base)
+                if count:
+                    counts[year] = count
+            ended |= self.end_years.get(year, BitMap())
+        return counts
+
+    def _ordinal(self, project_id: uuid.UUID) -> int:
+        ordinal = self.ordinals.get(project_id)
+        if ordinal is None:
+            ordinal = len(self.project_ids)
+            self.project_ids.append(project_id)
+            self.ordinals[project_id] = ordinal
+        return ordinal
+
+    def _clear(self, ordinal: int) -> None:
+        self.live.discard(ordinal)
+        for bitmaps in (self.sectors, self.ministries, self.classifications):
+            for bitmap in bitmaps.values():
+                bitmap.discard(ordinal)
+        for period in self.project_periods.pop(ordinal, []):
+            for bitmaps, year in zip((self.start_years, self.end_years), self.period_years[period]):
+                if year is not None:
+                    bitmaps[year].discard(period)
+                    if not bitmaps[year]:
+                        del bitmaps[year]
+            self.free_periods.append(period)
+
+    def _load(self, session: Session, project_ids: Optional[List[uuid.UUID]] = None) -> None:
+        """Read facet memberships (of all projects, or only project_ids) and apply them"""
+        def scoped(statement: Any, column: Any) -> Any:
+            return statement if project_ids is None else statement.where(column.in_(project_ids))
+
+        live = session.exec(scoped(select(Project.id).where(col(Project.deleted_at).is_(None)), Project.id)).all()
+        sectors = session.exec(scoped(
+            select(ProjectSectorLink.project_id, ProjectSectorLink.sector_id), ProjectSectorLink.project_id
+        )).all()
+        # Same two routes to a ministry as the SQL filter: the public authority's
+        # agency, or a party whose legal name is the ministry
+        ministries = list(session.exec(scoped(
+            select(Project.id, Agency.ministry_id)
+            .join(Agency, col(Project.public_authority_id) == Agency.id)
+            .where(col(Agency.ministry_id).is_not(None)),
+            Project.id
+        )).all())
+        ministries += session.exec(scoped(
+            select(ProjectParty.project_id, Ministry.id)
+            .join(PartyAdditionalIdentifier, col(ProjectParty.id) == PartyAdditionalIdentifier.party_id)
+            .join(Ministry, col(PartyAdditionalIdentifier.legal_name_id) == Ministry.id),
+            ProjectParty.project_id
+        )).all()
+        classifications = session.exec(scoped(
+            select(ProjectAdditionalClassificationLink.project_id, ProjectAdditionalClassificationLink.classification_id),
+            ProjectAdditionalClassificationLink.project_id
+        )).all()
+        schemes = session.exec(select(AdditionalClassification.id, AdditionalClassification.scheme)).all()
+        periods = session.exec(scoped(
+            select(
+                ProjectPeriod.project_id,
+                ProjectPeriod.start_year,
+                ProjectPeriod.end_year
+            ).where(col(ProjectPeriod.period_type) == "duration"),
+            ProjectPeriod.project_id
+        )).all()
+
+        with self.lock:
+            if project_ids is not None:
+                for project_id in project_ids:
+                    if project_id in self.ordinals:
+                        self._clear(self.ordinals[project_id])
+            for project_id in live:
+                self.live.add(self._ordinal(project_id))
+            for bitmaps, rows in ((self.sectors, sectors), (self.ministries, ministries), (self.classifications, classifications)):
+                for project_id, key in rows:
+                    bitmaps.setdefault(key, BitMap()).add(self._ordinal(project_id))
+            self.classification_schemes = {key: scheme for key, scheme in schemes if key is not None}
+            for project_id, start_year, end_year in periods:
+                self._add_period(self._ordinal(project_id), start_year, end_year)
+
+    def _add_period(self, ordinal: int, start_year: Any, end_year: Any) -> None:
+        years = (None if start_year is None else int(start_year), None if end_year is None else int(end_year))
+        if self.free_periods:
+            period = self.free_periods.pop()
+            self.period_owners[period] = ordinal
+            self.period_years[period] = years
+        else:
+            period = len(self.period_owners)
+            self.period_owners.append(ordinal)
+            self.period_years.append(years)
+        self.project_periods.setdefault(ordinal, []).append(period)
+        if years[0] is not None:
+            self.start_years.setdefault(years[0], BitMap()).add(period)
+        if years[1] is not None:
+            self.end_years.setdefault(years[1], BitMap()).add(period)
+
+
+_facet_index: Optional[FacetIndex] = None
+_rebuild_lock = threading.Lock()
+
+
+def get_facet_index() -> Optional[FacetIndex]:
+    return _facet_index
+
+
+def current_facet_index(session: Session) -> Optional[FacetIndex]:
+    """The process-wide index, rebuilt first if the projects table changed since it was built
+
+    Once FACET_INDEX_TTL seconds have passed since the last check,
+    data_version() is compared again on a session of its own. Writes of this
+    process change it too, so they also lead to one rebuild. Requests arriving
+    while another thread checks or rebuilds use the index as it is.
+    """
+    from oc4ids_datastore_api.analytics import data_version
+
+    global _facet_index
+    index = _facet_index
+    if index is None or time.monotonic() < index.checked_at + FACET_INDEX_TTL:
+        return index
+    if not _rebuild_lock.acquire(blocking=False):
+        return index
+    try:
+        with Session(session.get_bind()) as db:
+            if data_version(db) == index.data_version:
+                index.checked_at = time.monotonic()
+                return index
+            _facet_index = FacetIndex.build(db)
+        logger.info(f"Rebuilt facet index over {len(_facet_index.live)} projects after writes elsewhere")
+        return _facet_index
+    except Exception as e:
+        _disable(e)
+        return None
+    finally:
+        _rebuild_lock.release()
+
+
+def build_facet_index(session: Session) -> Optional[FacetIndex]:
+    """Build the process-wide index if FACET_INDEX is enabled"""
+    global _facet_index
+    if facet_index_enabled():
+        _facet_index = FacetIndex.build(session)
+        logger.info(f"Built facet index over {len(_facet_index.live)} projects")
+    return _facet_index
+
+
+def _disable(error: Exception) -> None:
+    global _facet_index
+    logger.error(f"Facet index update failed, filtering in SQL from now on: {error}")
+    _facet_index = None
+
+
+def project_written(session: Session, project_id: uuid.UUID) -> None:
+    """Re-index a project after its write has been committed"""
+    if _facet_index is None:
+        return
+    try:
+        _facet_index.refresh(session, [project_id])
+    except Exception as e:
+        _disable(e)
+
+
+def project_removed(project_id: uuid.UUID) -> None:
+    if _facet_index is None:
+        return
+    try:
+        _facet_index.remove(project_id)
+    except Exception as e:
+        _disable(e)
+
+
+def verify_facet_index(session: Session) -> Tuple[bool, List[str]]:
+    """Compare the live index with one freshly built from the database
+
+    On a mismatch the fresh index replaces the live one. Returns whether they
+    agreed and which facet values differed.
+    """
+    global _facet_index
+    if _facet_index is None:
+        return True, []
+    fresh = FacetIndex.build(session)
+    current, expected = _facet_index.snapshot(), fresh.snapshot()
+    mismatches = [
+        f"{facet}={key}"
+        for facet in expected
+        for key in sorted(set(expected[facet]) | set(current[facet]))
+        if expected[facet].get(key) != current[facet].get(key)
+    ]
+    if mismatches:
+        logger.warning(f"Facet index out of date ({len(mismatches)} facet values differ); replaced")
+        _facet_index = fresh
+    return not mismatches, mismatches
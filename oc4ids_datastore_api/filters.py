@@ -0,0 +1,160 @@
+"""
+Project filters shared by the listing, the dashboard and the export.
+
+Each filter compiles to a condition on the projects row. Link tables are
+probed with EXISTS instead of being joined, so combining filters never
+repeats a project and no DISTINCT or GROUP BY is needed afterwards.
+"""
+import uuid
+from dataclasses import dataclass, fields, replace
+from datetime import date
+from typing import Any, Iterator, List, Optional, Tuple
+
+from sqlalchemy import ColumnElement, Exists, Select
+from sqlmodel import col, or_, select
+
+from oc4ids_datastore_api.models import (
+    Agency,
+    PartyAdditionalIdentifier,
+    Project,
+    ProjectAdditionalClassificationLink,
+    ProjectBudget,
+    ProjectParty,
+    ProjectPeriod,
+    ProjectSectorLink,
+)
+
+
+@dataclass(frozen=True)
+class ProjectFilters:
+    """A project filter set; unset filters are None
+
+    Multi-valued filters match any of their ids. year_from/year_to and
+    period_from/period_to select projects with a period overlapping the range,
+    the latter of period_type (duration by default).
+    """
+    title: Optional[str] = None
+    sector_id: Optional[List[int]] = None
+    ministry_id: Optional[List[int]] = None
+    agency_id: Optional[List[int]] = None
+    concession_form_id: Optional[List[int]] = None
+    contract_type_id: Optional[List[int]] = None
+    year_from: Optional[int] = None
+    year_to: Optional[int] = None
+    budget_min: Optional[float] = None
+    budget_max: Optional[float] = None
+    status: Optional[List[str]] = None
+    project_type_id: Optional[List[int]] = None
+    period_type: Optional[str] = None
+    period_from: Optional[date] = None
+    period_to: Optional[date] = None
+
+    def items(self) -> Iterator[Tuple[str, Any]]:
+        """(name, value) of every filter, set or not"""
+        for field in fields(self):
+            yield field.name, getattr(self, field.name)
+
+    def without(self, *names: str) -> "ProjectFilters":
+        """The same filters with the named ones unset"""
+        return replace(self, **{name: None for name in names})
+
+
+def title_matches(title: str) -> ColumnElement[bool]:
+    """Case-insensitive substring match on the project title
+
+    Served by the ix_projects_title_trgm trigram index on PostgreSQL.
+    """
+    escaped = title.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return col(Project.title).ilike(f"%{escaped}%", escape="\\")
+
+
+def _classified(classification_ids: List[int]) -> Exists:
+    return (
+        select(ProjectAdditionalClassificationLink.project_id)
+        .where(ProjectAdditionalClassificationLink.project_id == Project.id)
+        .where(col(ProjectAdditionalClassificationLink.classification_id).in_(classification_ids))
+        .exists()
+    )
+
+
+def project_conditions(filters: ProjectFilters) -> List[Any]:
+    """WHERE conditions on Project for a filter set; live projects only"""
+    conditions: List[Any] = [col(Project.deleted_at).is_(None)]
+
+    if filters.title:
+        conditions.append(title_matches(filters.title))
+
+    if filters.sector_id:
+        conditions.append(
+            select(ProjectSectorLink.project_id)
+            .where(ProjectSectorLink.project_id == Project.id)
+            .where(col(ProjectSectorLink.sector_id).in_(filters.sector_id))
+            .exists()
+        )
+
+    # A project belongs to a ministry through its public authority's agency,
+    # or through a party whose legal name is the ministry
+    if filters.ministry_id:
+        conditions.append(or_(
+            col(Project.public_authority_id).in_(select(Agency.id).where(col(Agency.ministry_id).in_(filters.ministry_id))),
+            select(ProjectParty.id)
+            .join(PartyAdditionalIdentifier, col(ProjectParty.id) == PartyAdditionalIdentifier.party_id)
+            .where(ProjectParty.project_id == Project.id)
+            .where(col(PartyAdditionalIdentifier.legal_name_id).in_(filters.ministry_id))
+            .exists()
+        ))
+
+    if filters.agency_id:
+        conditions.append(col(Project.public_authority_id).in_(filters.agency_id))
+
+    if filters.status:
+        conditions.append(col(Project.status).in_(filters.status))
+
+    if filters.project_type_id:
+        conditions.append(col(Project.project_type_id).in_(filters.project_type_id))
+
+    if filters.budget_min is not None or filters.budget_max is not None:
+        budget = select(ProjectBudget.project_id).where(ProjectBudget.project_id == Project.id)
+        if filters.budget_min is not None:
+            budget = budget.where(col(ProjectBudget.total_amount) >= filters.budget_min)
+        if filters.budget_max is not None:
+            budget = budget.where(col(ProjectBudget.total_amount) <= filters.budget_max)
+        conditions.append(budget.exists())
+
+    if filters.concession_form_id:
+        conditions.append(_classified(filters.concession_form_id))
+
+    if filters.contract_type_id:
+        conditions.append(_classified(filters.contract_type_id))
+
+    # Both bounds must hold on the same duration period
+    if filters.year_from or filters.year_to:
+        period = (
+            select(ProjectPeriod.project_id)
+            .where(ProjectPeriod.project_id == Project.id)
+            .where(ProjectPeriod.period_type == "duration")
+        )
+        if filters.year_to:
+            period = period.where(col(ProjectPeriod.start_year) <= filters.year_to)
+        if filters.year_from:
+            period = period.where(col(ProjectPeriod.end_year) >= filters.year_from)
+        conditions.append(period.exists())
+
+    if filters.period_type or filters.period_from or filters.period_to:
+        period = (
+            select(ProjectPeriod.project_id)
+            .where(ProjectPeriod.project_id == Project.id)
+            .where(ProjectPeriod.period_type == (filters.period_type or "duration"))
+        )
+        if filters.period_to:
+            period = period.where(col(ProjectPeriod.start_date) <= filters.period_to)
+        if filters.period_from:
+            period = period.where(col(ProjectPeriod.end_date) >= filters.period_from)
+        conditions.append(period.exists())
+
+    return conditions
+
+
+def project_id_query(filters: ProjectFilters) -> Select[Tuple[uuid.UUID]]:
+    """SELECT of the ids of live projects matching the filters, one row per project"""
+    return select(Project.id).where(*project_conditions(filters))
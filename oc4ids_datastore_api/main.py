@@ -1,3 +1,5 @@
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.exceptions import RequestValidationError
@@ -12,13 +14,25 @@ except ImportError:
     pass
 
 from oc4ids_datastore_api.controllers import router
+from oc4ids_datastore_api.database import build_memory_indexes, engine, prepare_database
 from oc4ids_datastore_api.exceptions import validation_exception_handler, global_exception_handler
 from oc4ids_datastore_api.middleware import PerformanceMiddleware
+from oc4ids_datastore_api.responses import DefaultJSONResponse
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    # Runs in every worker process, before it serves requests
+    prepare_database(engine)
+    build_memory_indexes(engine)
+    yield
+
 
 app = FastAPI(
     title="OC4IDS Datastore API",
     version="1.0.0",
-    description="Professional grade API for OC4IDS project management."
+    description="Professional grade API for OC4IDS project management.",
+    default_response_class=DefaultJSONResponse,
+    lifespan=lifespan
 )
 
 # Register Exception Handlers
@@ -55,15 +69,39 @@ app.add_middleware(
 # Include Router with Versioning
 app.include_router(router, prefix="/api/v1", tags=["Projects"])
 
-from oc4ids_datastore_api.database import engine
-from sqlmodel import SQLModel
+from sqlmodel import Session, SQLModel
 
 @app.get("/api/debug/reset-db")
 def debug_reset_db():
     try:
+        from oc4ids_datastore_api.migrations import run_migrations
+        from oc4ids_datastore_api.summary_cache import data_changed
+
         SQLModel.metadata.drop_all(engine)
         SQLModel.metadata.create_all(engine)
+        run_migrations(engine)
+        data_changed()
         return {"status": "success", "message": "Database reset successfully."}
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
+
+
+@app.get("/api/debug/facet-index")
+def debug_facet_index() -> Dict[str, Any]:
+    """Compare the in-process facet index with the database, replacing it if it drifted"""
+    from oc4ids_datastore_api.facets import get_facet_index, verify_facet_index
+
+    if get_facet_index() is None:
+        return {"status": "disabled"}
+    with Session(engine) as session:
+        consistent, mismatches = verify_facet_index(session)
+    return {"status": "consistent" if consistent else "rebuilt", "mismatches": mismatches}
+
+
+@app.get("/api/debug/summary-cache")
+def debug_summary_cache() -> Dict[str, Any]:
+    """Hit/miss statistics of the GET /summary result cache"""
+    from oc4ids_datastore_api.summary_cache import get_summary_cache
+
+    return get_summary_cache().stats()
@@ -0,0 +1,96 @@
+"""
+Schema changes for databases created before a column or index existed.
+
+SQLModel.metadata.create_all only creates missing tables, so anything added to
+an existing table is listed here as an idempotent statement and applied at
+startup. The schema itself is PostgreSQL only (JSONB and array columns, the
+generated project_periods years), and so is the test database.
+"""
+import logging
+from typing import Dict, List
+
+from sqlalchemy import Connection, Engine, text
+from sqlalchemy.exc import DBAPIError
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS: List[str] = [
+    # Per-project version counter used for ETags
+    "ALTER TABLE projects ADD COLUMN IF NOT EXISTS version integer NOT NULL DEFAULT 1",
+    # Keyset pagination of GET /projects on (updated_at, id)
+    "CREATE INDEX IF NOT EXISTS ix_projects_updated_at_id ON projects (updated_at, id)",
+    # Sort orders of GET /projects; NULL start dates and budgets sort last both ways,
+    # so those two get one index per direction
+    "CREATE INDEX IF NOT EXISTS ix_projects_title_id ON projects (title, id)",
+    "CREATE INDEX IF NOT EXISTS ix_projects_created_at_id ON projects (created_at, id)",
+    "CREATE INDEX IF NOT EXISTS ix_project_listing_start_date ON project_listing (start_date, project_id)",
+    "CREATE INDEX IF NOT EXISTS ix_project_listing_start_date_desc ON project_listing (start_date DESC NULLS LAST, project_id DESC)",
+    "CREATE INDEX IF NOT EXISTS ix_project_listing_budget ON project_listing (budget_amount, project_id)",
+    "CREATE INDEX IF NOT EXISTS ix_project_listing_budget_desc ON project_listing (budget_amount DESC NULLS LAST, project_id DESC)",
+    # Budget range, status, project type, agency and period date filters
+    "CREATE INDEX IF NOT EXISTS ix_project_budgets_total_amount ON project_budgets (total_amount, project_id)",
+    "CREATE INDEX IF NOT EXISTS ix_projects_status ON projects (status)",
+    "CREATE INDEX IF NOT EXISTS ix_projects_project_type_id ON projects (project_type_id)",
+    "CREATE INDEX IF NOT EXISTS ix_projects_public_authority_id ON projects (public_authority_id)",
+    "CREATE INDEX IF NOT EXISTS ix_project_periods_type_dates ON project_periods (period_type, start_date, end_date, project_id)",
+    # Year filters and per-year aggregates read stored years of duration periods
+    "ALTER TABLE project_periods ADD COLUMN IF NOT EXISTS start_year integer GENERATED ALWAYS AS (CAST(EXTRACT(year FROM start_date) AS integer)) STORED",
+    "ALTER TABLE project_periods ADD COLUMN IF NOT EXISTS end_year integer GENERATED ALWAYS AS (CAST(EXTRACT(year FROM end_date) AS integer)) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_project_periods_duration_years ON project_periods (start_year, end_year, project_id) WHERE period_type = 'duration'",
+    "CREATE INDEX IF NOT EXISTS ix_project_periods_duration_project ON project_periods (project_id, start_year, end_year) WHERE period_type = 'duration'",
+]
+
+# Applied only once pg_trgm is installed (see install_trigram)
+TRIGRAM_MIGRATIONS: List[str] = [
+    # Trigram index behind the title ILIKE '%...%' search and similarity() ranking
+    "CREATE INDEX IF NOT EXISTS ix_projects_title_trgm ON projects USING gin (title gin_trgm_ops)",
+]
+
+# Whether pg_trgm is installed, per database URL
+_trigram_installed: Dict[str, bool] = {}
+
+
+def run_migrations(engine: Engine) -> None:
+    """Apply every migration statement (each one is safe to re-run)"""
+    if engine.dialect.name != "postgresql":
+        return
+    with engine.begin() as conn:
+        statements = MIGRATIONS + (TRIGRAM_MIGRATIONS if install_trigram(conn) else [])
+        for statement in statements:
+            conn.execute(text(statement))
+    logger.info(f"Applied {len(statements)} schema migrations")
+
+
+def install_trigram(conn: Connection) -> bool:
+    """Install pg_trgm unless it already is; False when the role may not create it
+
+    Startup goes on without it: the title search then scans, and sort=relevance
+    falls back to the default order. A superuser can run CREATE EXTENSION
+    pg_trgm at any time; workers started afterwards pick it up.
+    """
+    if not conn.execute(text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")).first():
+        try:
+            with conn.begin_nested():
+                conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        except DBAPIError as e:
+            # SQLSTATE 42501 is insufficient_privilege
+            if getattr(e.orig, "pgcode", None) != "42501":
+                raise
+            logger.warning("Not allowed to create the pg_trgm extension; title search and sort=relevance run without it")
+            _trigram_installed[str(conn.engine.url)] = False
+            return False
+    _trigram_installed[str(conn.engine.url)] = True
+    return True
+
+
+def trigram_installed(engine: Engine) -> bool:
+    """Whether pg_trgm (and so similarity()) is available, checked once per database"""
+    if engine.dialect.name != "postgresql":
+        return False
+    key = str(engine.url)
+    if key not in _trigram_installed:
+        with engine.connect() as conn:
+            _trigram_installed[key] = conn.execute(
+                text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+            ).first() is not None
+    return _trigram_installed[key]
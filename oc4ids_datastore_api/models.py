@@ -1,9 +1,9 @@
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Set
 import uuid
 from datetime import datetime, date
 from sqlmodel import SQLModel, Field, Relationship
-from sqlalchemy import Column, JSON, Date, String, Float, Integer
-from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy import Column, Computed, JSON, Date, String, Float, Integer, Numeric
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB
 
 # ===================================
 # REFERENCE TABLES
@@ -72,6 +72,10 @@ class AdditionalClassification(SQLModel, table=True):
     description: Optional[str] = None
     uri: Optional[str] = None
 
+# Schemes of the two classification lists behind the concession form and contract type filters
+CONCESSION_FORM_SCHEME = "รูปแบบสัมปทานหรือค่าตอบแทน"
+CONTRACT_TYPE_SCHEME = "รูปแบบการจัดสรรกรรมสิทธิ์"
+
 # ===================================
 # LINK TABLES
 # ===================================
@@ -107,6 +111,10 @@ class ProjectPeriod(SQLModel, table=True):
     end_date: Optional[datetime] = Field(default=None, sa_column=Column(Date))
     max_extent_date: Optional[datetime] = Field(default=None, sa_column=Column(Date))
     duration_days: Optional[int] = None
+    # Generated and stored by PostgreSQL (also for tables made by create_all) for the
+    # year filters and per-year aggregates; never written
+    start_year: Optional[int] = Field(default=None, sa_column=Column(Integer, Computed("CAST(EXTRACT(year FROM start_date) AS integer)", persisted=True)))
+    end_year: Optional[int] = Field(default=None, sa_column=Column(Integer, Computed("CAST(EXTRACT(year FROM end_date) AS integer)", persisted=True)))
     project: "Project" = Relationship(back_populates="periods")
 
 class ProjectLocation(SQLModel, table=True):
@@ -816,6 +824,7 @@ class Project(SQLModel, table=True):
     updated_at: datetime = Field(default_factory=datetime.utcnow)
     updated_by: Optional[uuid.UUID] = None
     deleted_at: Optional[datetime] = None
+    version: int = Field(default=1) # Bumped on every update, part of the ETag
     
     # Relationships
     project_type: Optional["ProjectType"] = Relationship()
@@ -853,7 +862,61 @@ class Project(SQLModel, table=True):
         from oc4ids_datastore_api.utils import format_thai_amount
         return format_thai_amount(amount)
 
-    def to_oc4ids(self) -> Dict[str, Any]:
+    def to_oc4ids(self, fields: Optional[Set[str]] = None) -> Dict[str, Any]:
         """Convert the project and its children to OC4IDS JSON format"""
         from oc4ids_datastore_api.serializers import project_to_oc4ids
-        return project_to_oc4ids(self)
+        return project_to_oc4ids(self, fields)
+
+
+# ===================================
+# READ MODELS
+# ===================================
+
+class ProjectDocumentCache(SQLModel, table=True):
+    """Pre-serialized project_to_oc4ids output, rebuilt on every project write"""
+    __tablename__ = "project_documents_cache"
+    project_id: uuid.UUID = Field(foreign_key="projects.id", primary_key=True)
+    document: Optional[Dict[str, Any]] = Field(default=None, sa_column=Column(JSONB))
+    built_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class ProjectListing(SQLModel, table=True):
+    """Pre-joined display columns of GET /projects, one row per project, rebuilt on every project write"""
+    __tablename__ = "project_listing"
+    project_id: uuid.UUID = Field(foreign_key="projects.id", primary_key=True)
+    agency_name: Optional[str] = None
+    ministry_names: Optional[List[str]] = Field(default=None, sa_column=Column(ARRAY(String)))
+    private_party_names: Optional[List[str]] = Field(default=None, sa_column=Column(ARRAY(String)))
+    sector_names: Optional[List[str]] = Field(default=None, sa_column=Column(ARRAY(String)))
+    concession_names: Optional[List[str]] = Field(default=None, sa_column=Column(ARRAY(String)))
+    contract_type_names: Optional[List[str]] = Field(default=None, sa_column=Column(ARRAY(String)))
+    start_date: Optional[date] = Field(default=None, sa_column=Column(Date))
+    budget_amount: Optional[float] = None
+    built_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class DashboardCube(SQLModel, table=True):
+    """
+    GET /summary aggregates per filter scope, updated by +/- deltas on every project write.
+
+    A scope is one value (or 0 for any) of each of sector, ministry, concession
+    form and contract type. Its rows are the dashboard breakdowns: kind "total"
+    (key 0), "ministry", "sector" and "year" (key = start year).
+    """
+    __tablename__ = "dashboard_cube"
+    sector_id: int = Field(default=0, primary_key=True)
+    ministry_id: int = Field(default=0, primary_key=True)
+    concession_form_id: int = Field(default=0, primary_key=True)
+    contract_type_id: int = Field(default=0, primary_key=True)
+    kind: str = Field(primary_key=True)
+    key: int = Field(default=0, primary_key=True)
+    projects: int = 0
+    investment: float = Field(default=0, sa_column=Column(Numeric, nullable=False, server_default="0"))
+    small_count: int = 0
+    small_investment: float = Field(default=0, sa_column=Column(Numeric, nullable=False, server_default="0"))
+    medium_count: int = 0
+    medium_investment: float = Field(default=0, sa_column=Column(Numeric, nullable=False, server_default="0"))
+    big_count: int = 0
+    big_investment: float = Field(default=0, sa_column=Column(Numeric, nullable=False, server_default="0"))
+    # Largest budget of the scope, on "total" rows only
+    max_budget: Optional[float] = None
@@ -0,0 +1,85 @@
+"""
+Concurrent read-only queries under one snapshot (PostgreSQL only).
+
+Setting DASHBOARD_PARALLEL=1 lets a request run independent queries at the
+same time. The request's own connection opens a REPEATABLE READ transaction
+and exports its snapshot. Each worker connection imports it, so every query
+sees the same data as if they had run one after another in a single
+transaction.
+
+Worker connections come from a pool of their own, one connection per worker
+thread, so a request holding a connection of the application pool never
+waits on that pool for its workers. Calls no worker has started after
+DASHBOARD_PARALLEL_TIMEOUT seconds run on the request's connection instead;
+calls already running are waited for.
+"""
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List
+
+from sqlalchemy import Engine, create_engine, text
+from sqlmodel import Session
+
+logger = logging.getLogger(__name__)
+
+PARALLEL_WORKERS = int(os.environ.get("DASHBOARD_PARALLEL_WORKERS", "8"))
+PARALLEL_TIMEOUT = float(os.environ.get("DASHBOARD_PARALLEL_TIMEOUT", "30"))
+
+_executor = ThreadPoolExecutor(max_workers=PARALLEL_WORKERS, thread_name_prefix="snapshot-query")
+_worker_engines: Dict[str, Engine] = {}
+_worker_engines_lock = threading.Lock()
+
+
+def parallel_enabled(session: Session) -> bool:
+    if os.getenv("DASHBOARD_PARALLEL", "").lower() not in ("1", "true", "yes"):
+        return False
+    return session.get_bind().dialect.name == "postgresql"
+
+
+def worker_engine(engine: Engine) -> Engine:
+    """Engine of the worker connections to engine's database, with one pooled connection per worker thread"""
+    url = engine.url.render_as_string(hide_password=False)
+    with _worker_engines_lock:
+        if url not in _worker_engines:
+            _worker_engines[url] = create_engine(engine.url, pool_size=PARALLEL_WORKERS, max_overflow=0, pool_pre_ping=True)
+        return _worker_engines[url]
+
+
+def run_in_snapshot(session: Session, *calls: Callable[[Session], Any]) -> List[Any]:
+    """Results of call(session) for each call, all reading one snapshot
+
+    The first call runs on session in this thread and the others on worker
+    connections. When disabled, or when session has already begun its
+    transaction (its isolation level can no longer change), the calls run one
+    after another on session. So do calls no worker has started within
+    PARALLEL_TIMEOUT seconds; started ones are waited for, so none runs twice.
+    """
+    if len(calls) < 2 or not parallel_enabled(session) or session.in_transaction():
+        return [call(session) for call in calls]
+    session.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+    snapshot_id = session.execute(text("SELECT pg_export_snapshot()")).scalar_one()
+    engine = worker_engine(session.get_bind().engine)
+    futures = [_executor.submit(_run_imported, engine, snapshot_id, call) for call in calls[1:]]
+    # The exported snapshot stays importable while this transaction is open,
+    # which it is until every worker that started has returned
+    try:
+        first = calls[0](session)
+    finally:
+        _, pending = wait(futures, timeout=PARALLEL_TIMEOUT)
+        # cancel() fails on calls a worker has started, possibly just now
+        cancelled = {future for future in pending if future.cancel()}
+        # A cancelled future only counts as done once a worker dequeues it
+        wait([future for future in futures if future not in cancelled])
+    if cancelled:
+        logger.warning(f"{len(cancelled)} snapshot queries not started after {PARALLEL_TIMEOUT}s; running them on the request connection")
+    # session is still in the exported snapshot, so late calls see the same data
+    return [first, *(call(session) if future in cancelled else future.result() for call, future in zip(calls[1:], futures))]
+
+
+def _run_imported(engine: Engine, snapshot_id: str, call: Callable[[Session], Any]) -> Any:
+    with Session(engine) as session:
+        session.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+        session.execute(text("SET TRANSACTION SNAPSHOT :snapshot_id"), {"snapshot_id": snapshot_id})
+        return call(session)
@@ -0,0 +1,79 @@
+"""
+Response classes for large JSON payloads.
+
+Setting FAST_JSON_RESPONSES=1 switches the heavy endpoints (project detail,
+compare, summary) to orjson, which encodes datetime, date, UUID and Decimal
+natively. Those endpoints hand their dicts straight to the response class,
+so FastAPI's jsonable_encoder pass over the nested OC4IDS documents is
+skipped. Without the flag, or without orjson installed, the stdlib encoder
+is used and the output is unchanged.
+"""
+import importlib
+import json
+import logging
+import os
+from decimal import Decimal
+from types import ModuleType
+from typing import Any, Dict, Optional
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+logger = logging.getLogger(__name__)
+
+# Imported by name so type checking does not need the fast-json extra
+orjson: Optional[ModuleType]
+try:
+    orjson = importlib.import_module("orjson")
+except ImportError:
+    orjson = None
+
+
+def _default(value: Any) -> Any:
+    # Same Decimal handling as fastapi.encoders.decimal_encoder
+    if isinstance(value, Decimal):
+        exponent = value.as_tuple().exponent
+        return int(value) if isinstance(exponent, int) and exponent >= 0 else float(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _orjson_dumps(content: Any) -> bytes:
+    if orjson is None:
+        raise RuntimeError("orjson is not installed")
+    encoded: bytes = orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return encoded
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson; content does not need jsonable_encoder first"""
+
+    def render(self, content: Any) -> bytes:
+        return _orjson_dumps(content)
+
+
+def fast_json_enabled() -> bool:
+    if os.getenv("FAST_JSON_RESPONSES", "").lower() not in ("1", "true", "yes"):
+        return False
+    if orjson is None:
+        logger.warning("FAST_JSON_RESPONSES is set but orjson is not installed; using the stdlib encoder")
+        return False
+    return True
+
+
+FAST_JSON = fast_json_enabled()
+
+DefaultJSONResponse = FastJSONResponse if FAST_JSON else JSONResponse
+
+
+def json_response(content: Any, headers: Optional[Dict[str, str]] = None) -> JSONResponse:
+    """Build the configured JSON response for an already serialized payload"""
+    if FAST_JSON:
+        return FastJSONResponse(content, headers=headers)
+    return JSONResponse(jsonable_encoder(content), headers=headers)
+
+
+def encode_json(content: Any) -> bytes:
+    """Encode a JSON-native payload the way the configured response class would"""
+    if FAST_JSON:
+        return _orjson_dumps(content)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
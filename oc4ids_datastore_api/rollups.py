@@ -0,0 +1,300 @@
+"""
+Dashboard rollup cube (PostgreSQL only).
+
+dashboard_cube holds the GET /summary aggregates of every scope made of at
+most one sector, ministry, concession form and contract type (0 standing for
+any), broken down like ProjectDAO.get_dashboard_stats. /summary counts
+distinct projects, so a project adds one to every scope it belongs to rather
+than to a single cell that would then be summed.
+
+Project writes apply their contributions as +/- deltas in the same
+transaction, so the cube is always current for writes made through the API.
+At startup it is rebuilt only when its grand total no longer matches the base
+tables; rebuild_cache.py rebuilds it unconditionally after data is loaded in
+other ways.
+"""
+import logging
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import (
+    ColumnElement,
+    Engine,
+    Numeric,
+    Select,
+    Subquery,
+    Table,
+    case,
+    cast,
+    delete,
+    literal,
+    select,
+    text,
+    tuple_,
+    union,
+    union_all,
+    update,
+)
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import Session, col, func
+
+from oc4ids_datastore_api.daos import BIG_PROJECT_LIMIT, DASHBOARD_SCALES, SMALL_PROJECT_LIMIT
+from oc4ids_datastore_api.filters import ProjectFilters, project_id_query
+from oc4ids_datastore_api.models import (
+    CONCESSION_FORM_SCHEME,
+    CONTRACT_TYPE_SCHEME,
+    AdditionalClassification,
+    Agency,
+    DashboardCube,
+    PartyAdditionalIdentifier,
+    Project,
+    ProjectAdditionalClassificationLink,
+    ProjectBudget,
+    ProjectParty,
+    ProjectPeriod,
+    ProjectSectorLink,
+)
+
+logger = logging.getLogger(__name__)
+
+# Filters a scope is made of, which are also the leading cube key columns
+CUBE_FILTERS = ["sector_id", "ministry_id", "concession_form_id", "contract_type_id"]
+CUBE_KEYS = [*CUBE_FILTERS, "kind", "key"]
+
+SCALE_COLUMNS = [
+    "small_count", "small_investment",
+    "medium_count", "medium_investment",
+    "big_count", "big_investment",
+]
+# Additive columns, which deltas are applied to
+CUBE_SUMS = ["projects", "investment", *SCALE_COLUMNS]
+
+# The cube is only read and written with Core statements
+CUBE_TABLE: Table = DashboardCube.__table__  # type: ignore[attr-defined]
+
+
+def rollup_scope(filters: ProjectFilters) -> Optional[Dict[str, int]]:
+    """The cube scope answering a filter set, or None
+
+    Only the cube filters may be set, with a single id each.
+    """
+    scope = {name: 0 for name in CUBE_FILTERS}
+    for name, value in filters.items():
+        if value in (None, [], ""):
+            continue
+        if name in CUBE_FILTERS and len(value) == 1:
+            scope[name] = value[0]
+        else:
+            return None
+    return scope
+
+
+def rollups_enabled(session: Session) -> bool:
+    return session.get_bind().dialect.name == "postgresql"
+
+
+def cube_contributions(project_ids: Optional[List[uuid.UUID]] = None) -> Select[Any]:
+    """Cube rows of live projects (all of them by default), summed per cube key"""
+    live: Select[Any] = select(col(Project.id).label("project_id"), col(Project.public_authority_id)).where(col(Project.deleted_at).is_(None))
+    if project_ids is not None:
+        live = live.where(col(Project.id).in_(project_ids))
+    projects = live.cte("cube_projects")
+    project_id = projects.c.project_id
+
+    # Budget totals per project: all rows, each scale, and the largest one
+    amount = col(ProjectBudget.total_amount)
+    scales = [
+        amount < SMALL_PROJECT_LIMIT,
+        (amount >= SMALL_PROJECT_LIMIT) & (amount < BIG_PROJECT_LIMIT),
+        amount >= BIG_PROJECT_LIMIT,
+    ]
+    scale_sums: List[ColumnElement[Any]] = []
+    for scale, condition in zip(DASHBOARD_SCALES, scales):
+        scale_sums += [
+            func.count(col(ProjectBudget.id)).filter(condition).label(f"{scale}_count"),
+            cast(func.sum(amount).filter(condition), Numeric).label(f"{scale}_investment"),
+        ]
+    budgets = (
+        select(
+            col(ProjectBudget.project_id),
+            cast(func.sum(amount), Numeric).label("investment"),
+            *scale_sums,
+            func.max(amount).label("max_budget"),
+        )
+        .join(projects, project_id == col(ProjectBudget.project_id))
+        .group_by(col(ProjectBudget.project_id))
+        .subquery("cube_budgets")
+    )
+
+    # The values a project takes in each scope filter, plus 0 for any
+    def scope_values(name: str, *values: Select[Any]) -> Subquery:
+        return union(select(project_id, literal(0).label("value")), *values).subquery(f"cube_{name}")
+
+    sectors = scope_values("sectors", select(col(ProjectSectorLink.project_id), col(ProjectSectorLink.sector_id)).join(
+        projects, project_id == col(ProjectSectorLink.project_id)
+    ))
+    ministries = scope_values(
+        "ministries",
+        select(project_id, col(Agency.ministry_id))
+        .join(Agency, col(Agency.id) == projects.c.public_authority_id)
+        .where(col(Agency.ministry_id).is_not(None)),
+        select(col(ProjectParty.project_id), col(PartyAdditionalIdentifier.legal_name_id))
+        .join(PartyAdditionalIdentifier, col(ProjectParty.id) == col(PartyAdditionalIdentifier.party_id))
+        .join(projects, project_id == col(ProjectParty.project_id))
+        .where(col(PartyAdditionalIdentifier.legal_name_id).is_not(None)),
+    )
+
+    def classified(scheme: str) -> Select[Any]:
+        return (
+            select(col(ProjectAdditionalClassificationLink.project_id), col(ProjectAdditionalClassificationLink.classification_id))
+            .join(AdditionalClassification, col(AdditionalClassification.id) == col(ProjectAdditionalClassificationLink.classification_id))
+            .join(projects, project_id == col(ProjectAdditionalClassificationLink.project_id))
+            .where(col(AdditionalClassification.scheme) == scheme)
+        )
+
+    concession_forms = scope_values("concession_forms", classified(CONCESSION_FORM_SCHEME))
+    contract_types = scope_values("contract_types", classified(CONTRACT_TYPE_SCHEME))
+
+    # One row per project and breakdown it appears in; weight is how many
+    # times the budgets are repeated by the join get_dashboard_stats makes
+    breakdowns = union_all(
+        select(project_id, literal("total").label("kind"), literal(0).label("key"), literal(1).label("weight")),
+        select(col(ProjectParty.project_id), literal("ministry"), col(PartyAdditionalIdentifier.legal_name_id), func.count())
+        .join(PartyAdditionalIdentifier, col(ProjectParty.id) == col(PartyAdditionalIdentifier.party_id))
+        .join(projects, project_id == col(ProjectParty.project_id))
+        .where(col(PartyAdditionalIdentifier.legal_name_id).is_not(None))
+        .group_by(col(ProjectParty.project_id), col(PartyAdditionalIdentifier.legal_name_id)),
+        select(col(ProjectSectorLink.project_id), literal("sector"), col(ProjectSectorLink.sector_id), literal(1))
+        .join(projects, project_id == col(ProjectSectorLink.project_id)),
+        select(col(ProjectPeriod.project_id), literal("year"), col(ProjectPeriod.start_year), func.count())
+        .join(projects, project_id == col(ProjectPeriod.project_id))
+        .where(col(ProjectPeriod.period_type) == "duration", col(ProjectPeriod.start_year).is_not(None))
+        .group_by(col(ProjectPeriod.project_id), col(ProjectPeriod.start_year)),
+    ).subquery("cube_breakdowns")
+
+    scope = [sectors.c.value, ministries.c.value, concession_forms.c.value, contract_types.c.value]
+    scaled = breakdowns.c.kind.in_(["total", "sector"])
+    return (
+        select(
+            *(value.label(name) for value, name in zip(scope, CUBE_FILTERS)),
+            breakdowns.c.kind,
+            breakdowns.c.key,
+            func.count().label("projects"),
+            func.coalesce(func.sum(breakdowns.c.weight * budgets.c.investment), 0).label("investment"),
+            *(
+                func.coalesce(func.sum(case((scaled, budgets.c[name]), else_=0)), 0).label(name)
+                for name in SCALE_COLUMNS
+            ),
+            func.max(case((breakdowns.c.kind == "total", budgets.c.max_budget))).label("max_budget"),
+        )
+        .select_from(breakdowns)
+        .outerjoin(budgets, budgets.c.project_id == breakdowns.c.project_id)
+        .join(sectors, sectors.c.project_id == breakdowns.c.project_id)
+        .join(ministries, ministries.c.project_id == breakdowns.c.project_id)
+        .join(concession_forms, concession_forms.c.project_id == breakdowns.c.project_id)
+        .join(contract_types, contract_types.c.project_id == breakdowns.c.project_id)
+        .group_by(*scope, breakdowns.c.kind, breakdowns.c.key)
+    )
+
+
+def apply_delta(session: Session, project_ids: List[uuid.UUID], sign: int) -> None:
+    """Add (sign 1) or subtract (sign -1) the cube rows of live projects. Does not commit."""
+    cube = CUBE_TABLE
+    contributions = cube_contributions(project_ids).subquery("contributions")
+    statement = insert(cube).from_select(
+        [*CUBE_KEYS, *CUBE_SUMS, "max_budget"],
+        select(
+            *(contributions.c[name] for name in CUBE_KEYS),
+            *(contributions.c[name] * sign for name in CUBE_SUMS),
+            contributions.c.max_budget,
+        ),
+    )
+    excluded = statement.excluded
+    max_budget: ColumnElement[Any]
+    if sign > 0:
+        max_budget = func.greatest(cube.c.max_budget, excluded.max_budget)
+    else:
+        # Cleared when the largest budget leaves the scope, and recomputed below
+        max_budget = case((excluded.max_budget >= cube.c.max_budget, None), else_=cube.c.max_budget)
+    upsert = statement.on_conflict_do_update(
+        index_elements=CUBE_KEYS,
+        set_={**{name: cube.c[name] + excluded[name] for name in CUBE_SUMS}, "max_budget": max_budget},
+    ).returning(*(cube.c[name] for name in CUBE_KEYS), cube.c.projects, cube.c.max_budget)
+    changed = session.execute(upsert).all()
+
+    emptied = [tuple(row[:len(CUBE_KEYS)]) for row in changed if row.projects == 0]
+    if emptied:
+        session.execute(delete(cube).where(tuple_(*(cube.c[name] for name in CUBE_KEYS)).in_(emptied)))
+    for row in changed:
+        if sign < 0 and row.kind == "total" and row.projects > 0 and row.max_budget is None:
+            scope: Dict[str, Any] = {name: [getattr(row, name)] if getattr(row, name) else None for name in CUBE_FILTERS}
+            largest = (
+                select(func.max(col(ProjectBudget.total_amount)))
+                .where(col(ProjectBudget.project_id).in_(project_id_query(ProjectFilters(**scope))))
+                .where(col(ProjectBudget.project_id).not_in(project_ids))
+                .scalar_subquery()
+            )
+            session.execute(
+                update(cube)
+                .where(*(cube.c[name] == getattr(row, name) for name in CUBE_KEYS))
+                .values(max_budget=largest)
+            )
+
+
+def project_written(session: Session, project_id: uuid.UUID) -> None:
+    """Hook for project writes, before the commit: add the project to the cube"""
+    if rollups_enabled(session):
+        apply_delta(session, [project_id], 1)
+
+
+def project_removed(session: Session, project_id: uuid.UUID) -> None:
+    """Hook for project deletes, before the delete: take the project out of the cube"""
+    if rollups_enabled(session):
+        apply_delta(session, [project_id], -1)
+
+
+def cube_is_current(session: Session) -> bool:
+    """Whether the cube's grand total (any scope) has the live project count and investment
+
+    A cheap check that misses out-of-band changes leaving both unchanged, such
+    as a project moved to another sector; rebuild_cube(force=True) covers those.
+    """
+    cube = CUBE_TABLE
+    total = session.execute(
+        select(cube.c.projects, cube.c.investment)
+        .where(*(cube.c[name] == 0 for name in CUBE_FILTERS), cube.c.kind == "total", cube.c.key == 0)
+    ).first()
+    live = select(col(Project.id)).where(col(Project.deleted_at).is_(None))
+    expected = session.execute(
+        select(
+            select(func.count()).select_from(live.subquery()).scalar_subquery(),
+            select(cast(func.sum(col(ProjectBudget.total_amount)), Numeric))
+            .where(col(ProjectBudget.project_id).in_(live))
+            .scalar_subquery(),
+        )
+    ).one()
+    projects, investment = total if total is not None else (0, 0)
+    # Delta sums may differ from a fresh sum in the last float digits
+    return projects == expected[0] and round(float(investment), 2) == round(float(expected[1] or 0), 2)
+
+
+def rebuild_cube(engine: Engine, force: bool = False) -> None:
+    """Recompute the whole cube from the base tables in one transaction, unless it is current"""
+    if engine.dialect.name != "postgresql":
+        return
+    started = time.perf_counter()
+    cube = CUBE_TABLE
+    with Session(engine) as session:
+        if not force and cube_is_current(session):
+            return
+        # Workers starting together rebuild one after the other, and writes wait;
+        # a worker that waited finds the cube current and leaves it
+        session.execute(text("LOCK TABLE dashboard_cube IN EXCLUSIVE MODE"))
+        if not force and cube_is_current(session):
+            session.commit()
+            return
+        session.execute(delete(cube))
+        session.execute(insert(cube).from_select([*CUBE_KEYS, *CUBE_SUMS, "max_budget"], cube_contributions()))
+        session.commit()
+    logger.info(f"Rebuilt dashboard cube in {(time.perf_counter() - started) * 1000:.0f} ms")
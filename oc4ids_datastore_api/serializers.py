@@ -1,226 +1,303 @@
 """
 OC4IDS Serializers - Convert database models to OC4IDS JSON format
 """
-from typing import Dict, Any
+from typing import Dict, Any, Callable, List, Optional, Set, cast
 
+from sqlalchemy.orm import QueryableAttribute, joinedload, selectinload
 
-def project_to_oc4ids(project) -> Dict[str, Any]:
-    """Convert Project model to OC4IDS JSON format"""
-    
+from oc4ids_datastore_api.models import (
+    Project, ProjectLocation, LocationGazetteer, ProjectParty, PartyAdditionalIdentifier,
+    PartyBeneficialOwner, ProjectContractingProcess, ContractingTender, ProjectBudget,
+    BudgetBreakdown, ProjectCostMeasurement, CostGroup, ProjectForecast, ProjectMetric,
+    ProjectSocial, ProjectEnvironment, ProjectBenefit, ProjectPolicyAlignment,
+    ProjectDocument, ProjectRelatedProject, ProjectCompletion, ProjectLobbyingMeeting, ProjectAssetLifetime
+)
+
+
+# Period rows are stored one per period_type and surface as these OC4IDS fields
+PERIOD_FIELDS = {
+    "duration": "period",
+    "identification": "identificationPeriod",
+    "preparation": "preparationPeriod",
+    "implementation": "implementationPeriod",
+    "completion": "completionPeriod",
+    "maintenance": "maintenancePeriod",
+    "decommissioning": "decommissioningPeriod",
+    "assetLifetime": "assetLifetime"
+}
+
+
+def _relation(attribute: Any) -> QueryableAttribute[Any]:
+    """A relationship attribute as the loader options expect it (SQLModel types it as the related model)"""
+    return cast(QueryableAttribute[Any], attribute)
+
+
+# Loader plan for project_to_oc4ids, keyed by the OC4IDS field each group feeds.
+# Collections use selectinload (one IN query per level, whatever the fan-out),
+# many-to-one and one-to-one rows use joinedload. Keep this in step with the
+# serializer below: any relationship read there must be listed here, otherwise
+# it silently falls back to a lazy load per row.
+OC4IDS_LOADER_PLAN: Dict[str, List[Any]] = {
+    "type": [joinedload(_relation(Project.project_type))],
+    "publicAuthority": [joinedload(_relation(Project.public_authority))],
+    "sector": [selectinload(_relation(Project.sectors))],
+    "additionalClassifications": [selectinload(_relation(Project.additional_classifications))],
+    "locations": [
+        selectinload(_relation(Project.locations_list))
+        .joinedload(_relation(ProjectLocation.gazetteer))
+        .selectinload(_relation(LocationGazetteer.identifiers))
+    ],
+    "parties": [
+        selectinload(_relation(Project.parties_list)).options(
+            joinedload(_relation(ProjectParty.agency)),
+            selectinload(_relation(ProjectParty.roles)),
+            selectinload(_relation(ProjectParty.additional_identifiers)).joinedload(_relation(PartyAdditionalIdentifier.ministry)),
+            selectinload(_relation(ProjectParty.people)),
+            selectinload(_relation(ProjectParty.beneficial_owners)).selectinload(_relation(PartyBeneficialOwner.nationalities)),
+            selectinload(_relation(ProjectParty.classifications)),
+        )
+    ],
+    "contractingProcesses": [
+        selectinload(_relation(Project.contracting_processes)).options(
+            joinedload(_relation(ProjectContractingProcess.tender)).options(
+                selectinload(_relation(ContractingTender.tenderers)),
+                selectinload(_relation(ContractingTender.tender_entities)),
+                selectinload(_relation(ContractingTender.sustainability)),
+            ),
+            joinedload(_relation(ProjectContractingProcess.social)),
+            selectinload(_relation(ProjectContractingProcess.suppliers)),
+            selectinload(_relation(ProjectContractingProcess.releases)),
+            selectinload(_relation(ProjectContractingProcess.milestones)),
+            selectinload(_relation(ProjectContractingProcess.transactions)),
+            selectinload(_relation(ProjectContractingProcess.modifications)),
+            selectinload(_relation(ProjectContractingProcess.documents)),
+        )
+    ],
+    "documents": [selectinload(_relation(Project.documents_list))],
+    "budget": [
+        joinedload(_relation(Project.budget)).options(
+            selectinload(_relation(ProjectBudget.breakdowns)).selectinload(_relation(BudgetBreakdown.items)),
+            selectinload(_relation(ProjectBudget.finances)),
+        )
+    ],
+    "identifiers": [selectinload(_relation(Project.identifiers_list))],
+    "relatedProjects": [selectinload(_relation(Project.related_projects))],
+    "costMeasurements": [
+        selectinload(_relation(Project.cost_measurements))
+        .selectinload(_relation(ProjectCostMeasurement.cost_groups))
+        .selectinload(_relation(CostGroup.cost_items))
+    ],
+    "forecasts": [selectinload(_relation(Project.forecasts)).selectinload(_relation(ProjectForecast.observations))],
+    "metrics": [selectinload(_relation(Project.metrics)).selectinload(_relation(ProjectMetric.observations))],
+    "social": [
+        joinedload(_relation(Project.social)).options(
+            selectinload(_relation(ProjectSocial.consultation_meetings)),
+            selectinload(_relation(ProjectSocial.health_safety_tests)),
+        )
+    ],
+    "environment": [
+        joinedload(_relation(Project.environment)).options(
+            selectinload(_relation(ProjectEnvironment.goals)),
+            selectinload(_relation(ProjectEnvironment.climate_oversight_types)),
+            selectinload(_relation(ProjectEnvironment.conservation_measures)),
+            selectinload(_relation(ProjectEnvironment.environmental_measures)),
+            selectinload(_relation(ProjectEnvironment.climate_measures)),
+            selectinload(_relation(ProjectEnvironment.impact_categories)),
+        )
+    ],
+    "benefits": [selectinload(_relation(Project.benefits)).selectinload(_relation(ProjectBenefit.beneficiaries))],
+    "completion": [joinedload(_relation(Project.completion))],
+    "lobbyingMeetings": [selectinload(_relation(Project.lobbying_meetings))],
+    "policyAlignment": [joinedload(_relation(Project.policy_alignment)).selectinload(_relation(ProjectPolicyAlignment.policies))],
+    "assetLifetime": [joinedload(_relation(Project.asset_lifetime))],
+    # Feeds every field in PERIOD_FIELDS
+    "period": [selectinload(_relation(Project.periods))],
+}
+
+
+def project_load_options(fields: Optional[Set[str]] = None) -> List[Any]:
+    """Loader options that fetch everything project_to_oc4ids reads for the given fields"""
+    if fields is None:
+        keys = list(OC4IDS_LOADER_PLAN)
+    else:
+        keys = [key for key in OC4IDS_LOADER_PLAN if key in fields]
+        if "period" not in keys and not fields.isdisjoint(PERIOD_FIELDS.values()):
+            keys.append("period")
+    return [option for key in keys for option in OC4IDS_LOADER_PLAN[key]]
+
+
+def project_to_oc4ids(project: Project, fields: Optional[Set[str]] = None) -> Dict[str, Any]:
+    """Convert Project model to OC4IDS JSON format
+
+    When fields is given only those top-level fields are built, and only the
+    relationships behind them are touched.
+    """
     result = {
-        "id": str(project.id),
-        "title": project.title,
-        "description": project.description,
-        "status": project.status,
-        "purpose": project.purpose,
-        "updated": project.updated_at.isoformat() if project.updated_at else None,
-        "type": project.project_type.code if project.project_type else None,
-        
-        # Public Authority
-        "publicAuthority": {
-            "id": str(project.public_authority.id),
-            "name": project.public_authority.name_en or project.public_authority.name_th
-        } if project.public_authority else None,
-
-        # Sectors
-        "sector": [s.code for s in project.sectors],
-        
-        # Additional Classifications
-        "additionalClassifications": [
-            {
-                "scheme": ac.scheme,
-                "id": ac.code,
-                "description": ac.description,
-                "uri": ac.uri
-            }
-            for ac in project.additional_classifications
-        ],
-        
-        # Locations
-        "locations": [
-            {
-                "geometry": loc.geometry_coordinates, 
-                "description": loc.description,
-                "address": {
-                    "streetAddress": loc.street_address,
-                    "locality": loc.locality,
-                    "region": loc.region,
-                    "postalCode": loc.postal_code,
-                    "countryName": loc.country_name
-                },
-                "gazetteers": [
-                    {
-                        "scheme": loc.gazetteer.scheme,
-                        "identifiers": [
-                            i.identifier for i in loc.gazetteer.identifiers
-                        ]
-                    }
-                ] if loc.gazetteer else []
-            } 
-            for loc in project.locations_list
-        ],
+        name: serialize(project)
+        for name, serialize in OC4IDS_FIELD_SERIALIZERS.items()
+        if fields is None or name in fields
+    }
 
-        # Parties
-        "parties": [
-            _serialize_party(p) for p in project.parties_list
-        ],
+    # Process Periods - Map from DB rows back to OC4IDS fields
+    if fields is None or not fields.isdisjoint(PERIOD_FIELDS.values()):
+        for per in project.periods:
+            field_name = PERIOD_FIELDS.get(per.period_type)
+            if field_name and (fields is None or field_name in fields):
+                period_data = {
+                    "startDate": per.start_date.isoformat() if per.start_date else None,
+                    "endDate": per.end_date.isoformat() if per.end_date else None,
+                    "durationInDays": per.duration_days,
+                }
+                if per.max_extent_date:
+                    period_data["maxExtentDate"] = per.max_extent_date.isoformat()
 
-        # Contracting Processes
-        "contractingProcesses": [
-            _serialize_contracting_process(cp) for cp in project.contracting_processes
-        ],
+                result[field_name] = period_data
 
-        # Documents
-        "documents": [
-            {
-                "id": d.local_id,
-                "documentType": d.document_type,
-                "title": d.title,
-                "description": d.description,
-                "url": d.url,
-                "datePublished": d.date_published.isoformat() if d.date_published else None,
-                "format": d.format,
-                "author": d.author
-            }
-            for d in project.documents_list
-        ],
+    return result
 
-        # Budget
-        "budget": _serialize_budget(project.budget) if project.budget else None,
-        
-        # Identifiers
-        "identifiers": [
-            {
-                "scheme": pid.scheme,
-                "id": pid.identifier_value
-            }
-            for pid in project.identifiers_list
-        ],
 
-        # Related Projects
-        "relatedProjects": [
-            {
-                "id": rp.identifier,
-                "relationship": [rp.relationship],
-                "title": rp.title,
-                "scheme": rp.scheme,
-                "uri": rp.uri
-            }
-            for rp in project.related_projects
-        ],
-        
-        # Cost Measurements
-        "costMeasurements": [
-            _serialize_cost_measurement(cm) for cm in project.cost_measurements
-        ],
-        
-        # Forecasts
-        "forecasts": [
-            _serialize_forecast(f) for f in project.forecasts
-        ],
-        
-        # Metrics
-        "metrics": [
-            _serialize_metric(m) for m in project.metrics
-        ],
-        
-        # Social
-        "social": _serialize_social(project.social) if project.social else None,
-        
-        # Environment
-        "environment": _serialize_environment(project.environment) if project.environment else None,
-        
-        # Benefits
-        "benefits": [
+def prune_document(document: Dict[str, Any], fields: Optional[Set[str]]) -> Dict[str, Any]:
+    """Apply a field selection to an already serialized OC4IDS document"""
+    if fields is None:
+        return document
+    return {name: value for name, value in document.items() if name in fields}
+
+
+def select_fields(fields: Optional[str] = None, exclude: Optional[str] = None) -> Optional[Set[str]]:
+    """Resolve comma-separated ?fields= / ?exclude= values into a field set (None means everything)
+
+    Raises ValueError on unknown field names. "id" is always kept.
+    """
+    if not fields and not exclude:
+        return None
+
+    known = set(OC4IDS_FIELD_SERIALIZERS) | set(PERIOD_FIELDS.values())
+    selected = set(known)
+    if fields:
+        selected = {f.strip() for f in fields.split(",") if f.strip()}
+    excluded = {f.strip() for f in exclude.split(",") if f.strip()} if exclude else set()
+
+    unknown = (selected | excluded) - known
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+
+    return (selected - excluded) | {"id"}
+
+
+def _serialize_public_authority(project: Project) -> Optional[Dict[str, Any]]:
+    return {
+        "id": str(project.public_authority.id),
+        "name": project.public_authority.name_en or project.public_authority.name_th
+    } if project.public_authority else None
+
+
+def _serialize_location(loc: ProjectLocation) -> Dict[str, Any]:
+    return {
+        "geometry": loc.geometry_coordinates, 
+        "description": loc.description,
+        "address": {
+            "streetAddress": loc.street_address,
+            "locality": loc.locality,
+            "region": loc.region,
+            "postalCode": loc.postal_code,
+            "countryName": loc.country_name
+        },
+        "gazetteers": [
             {
-                "id": str(b.id),
-                "title": b.title,
-                "description": b.description,
-                "beneficiaries": [
-                    {
-                        "description": ben.description,
-                        "numberOfPeople": ben.number_of_people
-                    } for ben in b.beneficiaries
+                "scheme": loc.gazetteer.scheme,
+                "identifiers": [
+                    i.identifier for i in loc.gazetteer.identifiers
                 ]
-            } for b in project.benefits
-        ],
-        
-        # Completion
-        "completion": {
-            "endDate": project.completion.end_date.isoformat() if project.completion and project.completion.end_date else None,
-            "finalScope": project.completion.final_scope,
-            "finalValue": {
-                "amount": project.completion.final_value_amount,
-                "currency": project.completion.final_value_currency
-            } if project.completion and project.completion.final_value_amount is not None else None
-        } if project.completion else None,
-
-        # Lobbying
-        "lobbyingMeetings": [
-            {
-                "id": lb.local_id,
-                "date": lb.meeting_date.isoformat() if lb.meeting_date else None,
-                "numberOfParticipants": lb.number_of_participants,
-                "address": {
-                    "streetAddress": lb.street_address,
-                    "locality": lb.locality,
-                    "region": lb.region,
-                    "postalCode": lb.postal_code,
-                    "countryName": lb.country_name
-                },
-                "publicOffice": {
-                    "name": lb.public_office_person_name,
-                    "jobTitle": lb.public_office_job_title,
-                    "organization": {
-                        "name": lb.public_office_org_name,
-                        "id": lb.public_office_org_id,
-                    }
-                }
-            } for lb in project.lobbying_meetings
-        ],
+            }
+        ] if loc.gazetteer else []
+    }
 
-        # Policy Alignment
-        "policyAlignment": {
-            "policies": [p.policy for p in project.policy_alignment.policies],
-            "description": project.policy_alignment.description 
-        } if project.policy_alignment else None,
 
-        # Asset Lifetime
-        "assetLifetime": {
-            "startDate": project.asset_lifetime.period_start_date.isoformat() if project.asset_lifetime.period_start_date else None,
-            "endDate": project.asset_lifetime.period_end_date.isoformat() if project.asset_lifetime.period_end_date else None,
-            "maxExtentDate": project.asset_lifetime.period_max_extent_date.isoformat() if project.asset_lifetime.period_max_extent_date else None,
-            "durationInDays": project.asset_lifetime.period_duration_days
-        } if project.asset_lifetime else None
+def _serialize_document(d: ProjectDocument) -> Dict[str, Any]:
+    return {
+        "id": d.local_id,
+        "documentType": d.document_type,
+        "title": d.title,
+        "description": d.description,
+        "url": d.url,
+        "datePublished": d.date_published.isoformat() if d.date_published else None,
+        "format": d.format,
+        "author": d.author
+    }
+
 
+def _serialize_related_project(rp: ProjectRelatedProject) -> Dict[str, Any]:
+    return {
+        "id": rp.identifier,
+        "relationship": [rp.relationship],
+        "title": rp.title,
+        "scheme": rp.scheme,
+        "uri": rp.uri
     }
-    
-    # Process Periods - Map from DB rows back to OC4IDS fields
-    period_map = {
-        "duration": "period",
-        "identification": "identificationPeriod",
-        "preparation": "preparationPeriod",
-        "implementation": "implementationPeriod",
-        "completion": "completionPeriod",
-        "maintenance": "maintenancePeriod",
-        "decommissioning": "decommissioningPeriod",
-        "assetLifetime": "assetLifetime"
+
+
+def _serialize_benefit(b: ProjectBenefit) -> Dict[str, Any]:
+    return {
+        "id": str(b.id),
+        "title": b.title,
+        "description": b.description,
+        "beneficiaries": [
+            {
+                "description": ben.description,
+                "numberOfPeople": ben.number_of_people
+            } for ben in b.beneficiaries
+        ]
     }
-    
-    for per in project.periods:
-        field_name = period_map.get(per.period_type)
-        if field_name:
-            period_data = {
-                "startDate": per.start_date.isoformat() if per.start_date else None,
-                "endDate": per.end_date.isoformat() if per.end_date else None,
-                "durationInDays": per.duration_days,
+
+
+def _serialize_completion(completion: Optional[ProjectCompletion]) -> Optional[Dict[str, Any]]:
+    return {
+        "endDate": completion.end_date.isoformat() if completion.end_date else None,
+        "finalScope": completion.final_scope,
+        "finalValue": {
+            "amount": completion.final_value_amount,
+            "currency": completion.final_value_currency
+        } if completion.final_value_amount is not None else None
+    } if completion else None
+
+
+def _serialize_lobbying_meeting(lb: ProjectLobbyingMeeting) -> Dict[str, Any]:
+    return {
+        "id": lb.local_id,
+        "date": lb.meeting_date.isoformat() if lb.meeting_date else None,
+        "numberOfParticipants": lb.number_of_participants,
+        "address": {
+            "streetAddress": lb.street_address,
+            "locality": lb.locality,
+            "region": lb.region,
+            "postalCode": lb.postal_code,
+            "countryName": lb.country_name
+        },
+        "publicOffice": {
+            "name": lb.public_office_person_name,
+            "jobTitle": lb.public_office_job_title,
+            "organization": {
+                "name": lb.public_office_org_name,
+                "id": lb.public_office_org_id,
             }
-            if per.max_extent_date:
-                period_data["maxExtentDate"] = per.max_extent_date.isoformat()
-            
-            result[field_name] = period_data
-            
-    return result
+        }
+    }
+
+
+def _serialize_policy_alignment(policy_alignment: Optional[ProjectPolicyAlignment]) -> Optional[Dict[str, Any]]:
+    return {
+        "policies": [p.policy for p in policy_alignment.policies],
+        "description": policy_alignment.description 
+    } if policy_alignment else None
+
+
+def _serialize_asset_lifetime(asset_lifetime: Optional[ProjectAssetLifetime]) -> Optional[Dict[str, Any]]:
+    return {
+        "startDate": asset_lifetime.period_start_date.isoformat() if asset_lifetime.period_start_date else None,
+        "endDate": asset_lifetime.period_end_date.isoformat() if asset_lifetime.period_end_date else None,
+        "maxExtentDate": asset_lifetime.period_max_extent_date.isoformat() if asset_lifetime.period_max_extent_date else None,
+        "durationInDays": asset_lifetime.period_duration_days
+    } if asset_lifetime else None
 
 
 def _serialize_party(p) -> Dict[str, Any]:
@@ -643,3 +720,50 @@ def _serialize_environment(env) -> Dict[str, Any]:
             } for ic in env.impact_categories
         ]
     }
+
+
+# Top-level OC4IDS fields in output order. Each entry only reads the
+# relationships listed under the same key in OC4IDS_LOADER_PLAN.
+OC4IDS_FIELD_SERIALIZERS: Dict[str, Callable[[Any], Any]] = {
+    "id": lambda p: str(p.id),
+    "title": lambda p: p.title,
+    "description": lambda p: p.description,
+    "status": lambda p: p.status,
+    "purpose": lambda p: p.purpose,
+    "updated": lambda p: p.updated_at.isoformat() if p.updated_at else None,
+    "type": lambda p: p.project_type.code if p.project_type else None,
+    "publicAuthority": _serialize_public_authority,
+    "sector": lambda p: [s.code for s in p.sectors],
+    "additionalClassifications": lambda p: [
+        {
+            "scheme": ac.scheme,
+            "id": ac.code,
+            "description": ac.description,
+            "uri": ac.uri
+        }
+        for ac in p.additional_classifications
+    ],
+    "locations": lambda p: [_serialize_location(loc) for loc in p.locations_list],
+    "parties": lambda p: [_serialize_party(party) for party in p.parties_list],
+    "contractingProcesses": lambda p: [_serialize_contracting_process(cp) for cp in p.contracting_processes],
+    "documents": lambda p: [_serialize_document(d) for d in p.documents_list],
+    "budget": lambda p: _serialize_budget(p.budget) if p.budget else None,
+    "identifiers": lambda p: [
+        {
+            "scheme": pid.scheme,
+            "id": pid.identifier_value
+        }
+        for pid in p.identifiers_list
+    ],
+    "relatedProjects": lambda p: [_serialize_related_project(rp) for rp in p.related_projects],
+    "costMeasurements": lambda p: [_serialize_cost_measurement(cm) for cm in p.cost_measurements],
+    "forecasts": lambda p: [_serialize_forecast(f) for f in p.forecasts],
+    "metrics": lambda p: [_serialize_metric(m) for m in p.metrics],
+    "social": lambda p: _serialize_social(p.social) if p.social else None,
+    "environment": lambda p: _serialize_environment(p.environment) if p.environment else None,
+    "benefits": lambda p: [_serialize_benefit(b) for b in p.benefits],
+    "completion": lambda p: _serialize_completion(p.completion),
+    "lobbyingMeetings": lambda p: [_serialize_lobbying_meeting(lb) for lb in p.lobbying_meetings],
+    "policyAlignment": lambda p: _serialize_policy_alignment(p.policy_alignment),
+    "assetLifetime": lambda p: _serialize_asset_lifetime(p.asset_lifetime),
+}
@@ -20,11 +20,17 @@ from oc4ids_datastore_api.models import (
     ContractingSupplier, ContractingSocial, ContractingRelease, LocationGazetteer, LocationGazetteerIdentifier,
     ProjectPolicyAlignment, ProjectPolicyAlignmentPolicy, ProjectAssetLifetime
 )
+from oc4ids_datastore_api import analytics, facets, parallel, rollups, summary_cache
 from oc4ids_datastore_api.daos import ProjectDAO, ReferenceDataDAO
-from oc4ids_datastore_api.utils import format_thai_amount
+from oc4ids_datastore_api.filters import ProjectFilters
+from oc4ids_datastore_api.migrations import trigram_installed
+from oc4ids_datastore_api.responses import encode_json
+from oc4ids_datastore_api.serializers import prune_document, select_fields
+from oc4ids_datastore_api.utils import decode_cursor, encode_cursor, format_thai_amount, make_etag
 from sqlmodel import Session, select
-from typing import List, Dict, Any, Optional
-from datetime import datetime
+from typing import Callable, List, Dict, Any, Iterator, Optional, Sequence, Set, Tuple
+from dataclasses import replace
+from datetime import date, datetime, timezone
 import json
 import uuid
 import logging
@@ -75,6 +81,16 @@ def _create_breakdown_item(session: Session, breakdown_id: int, item_data: Dict[
     )
     session.add(item)
 
+def _canonical_ids(project_ids: List[str]) -> List[str]:
+    """Normalize requested project ids to canonical UUID strings, dropping invalid and duplicate ones"""
+    ids = []
+    for pid in project_ids:
+        try:
+            ids.append(str(uuid.UUID(pid)))
+        except (ValueError, TypeError):
+            logger.warning(f"Ignoring invalid project ID '{pid}'")
+    return list(dict.fromkeys(ids))
+
 def _get_or_create_ref(session: Session, model: Any, code_field: str, code_value: str, defaults: Dict[str, Any] = None) -> Any:
     stmt = select(model).where(getattr(model, code_field) == code_value)
     obj = session.exec(stmt).first()
@@ -539,81 +555,169 @@ def _create_asset_lifetime(session: Session, project_id: uuid.UUID, lifetime_dat
     ))
 
 
+# Cursor values of each GET /projects sort key, parsed back from their str() form
+SORT_VALUE_PARSERS: Dict[str, Callable[[str], Any]] = {
+    "title": str,
+    "start_date": date.fromisoformat,
+    "budget": float,
+    "updated_at": datetime.fromisoformat,
+    "created_at": datetime.fromisoformat,
+}
+
 def get_all_projects(
     session: Session, 
     page: int = 1, 
     page_size: int = 20,
-    title: Optional[str] = None,
-    sector_id: Optional[List[int]] = None,
-    ministry_id: Optional[List[int]] = None,
-    concession_form_id: Optional[List[int]] = None,
-    contract_type_id: Optional[List[int]] = None,
-    year_from: Optional[int] = None,
-    year_to: Optional[int] = None
-) -> Dict[str, Any]:
+    filters: ProjectFilters = ProjectFilters(),
+    cursor: Optional[str] = None,
+    sort: Optional[str] = None,
+    order: Optional[str] = None
+) -> bytes:
+    """One page of the project list as a ready-to-send JSON body"""
     dao = ProjectDAO(session)
     skip = (page - 1) * page_size
-    
-    results = dao.get_projects(
+
+    # Relevance ranking only applies to a title search, and pages by offset;
+    # without pg_trgm there is no similarity() and the default order is used
+    rank_title = filters.title if sort == "relevance" and filters.title and trigram_installed(session.get_bind().engine) else None
+
+    # Titles read A-Z by default, every other key newest/largest first
+    sort_key = sort if sort in SORT_VALUE_PARSERS else "updated_at"
+    descending = order == "desc" if order else sort_key != "title"
+
+    # A cursor continues after the last row of the previous page; page is then ignored.
+    # It carries its sort, so a cursor from a differently sorted listing is rejected.
+    after = None
+    if cursor and not rank_title:
+        try:
+            cursor_key, cursor_order, value, project_id = decode_cursor(cursor)
+            if (cursor_key, cursor_order) != (sort_key, "desc" if descending else "asc"):
+                raise ValueError("Cursor belongs to another sort")
+            after = (None if value is None else SORT_VALUE_PARSERS[sort_key](value), uuid.UUID(project_id))
+        except (ValueError, TypeError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    # One extra row tells whether there is a next page
+    keys, total = dao.get_page_keys(
         skip=skip, 
-        limit=page_size,
-        title=title,
-        sector_id=sector_id,
-        ministry_id=ministry_id,
-        concession_form_id=concession_form_id,
-        contract_type_id=contract_type_id,
-        year_from=year_from,
-        year_to=year_to
+        limit=page_size + 1,
+        after=after,
+        rank_title=rank_title,
+        sort=(sort_key, descending),
+        filters=filters
     )
-    total = dao.count()
-    
-    data = []
-    for row in results:
-        ministries = set()
-        if hasattr(row, 'party_ministry_names') and row.party_ministry_names:
-            ministries.update([m.strip() for m in row.party_ministry_names.split(',') if m.strip()])
-            
-        ministry_list = list(ministries)
-        
-        # Process Private Parties
-        private_parties = []
-        if getattr(row, "private_party_name", None):
-             private_parties = [p.strip() for p in row.private_party_name.split(",") if p.strip()]
-
-        data.append({
-            "id": str(row.id),
-            "title": row.title,
-            "ministry": ministry_list,
-            "public_authority": row.agency_name, 
-            "private_parties": private_parties,
-            "sector": row.sector_names,
-            "concession": row.concession_names,
-            "start_date": row.start_date,
-        })
-    
-    return {
-        "data": data,
-        "pagination": {
-            "page": page,
-            "pageSize": page_size,
-            "total": total,
-            "totalPages": (total + page_size - 1) // page_size
-        }
+    has_more = len(keys) > page_size
+    keys = keys[:page_size]
+    next_cursor = None
+    if has_more and not rank_title:
+        last_id, last_value = keys[-1]
+        next_cursor = encode_cursor(sort_key, "desc" if descending else "asc", last_value, last_id)
+
+    # The rows arrive as JSON text built by PostgreSQL and are passed through untouched
+    data = dao.get_listing_json([project_id for project_id, _ in keys])
+    pagination = {
+        "page": page,
+        "pageSize": page_size,
+        "total": total,
+        "totalPages": (total + page_size - 1) // page_size,
+        "nextCursor": next_cursor
     }
+    return b'{"data":' + data.encode("utf-8") + b',"pagination":' + encode_json(pagination) + b"}"
+
+def get_project_facets(session: Session, filters: ProjectFilters = ProjectFilters()) -> Dict[str, Any]:
+    """Project counts per filter option under the same filters as get_all_projects"""
+    facet_index = facets.current_facet_index(session)
+    counts = facet_index.counts(filters) if facet_index else None
+    if counts is None:
+        counts = ProjectDAO(session).get_facet_counts(filters)
+
+    result: Dict[str, Any] = {"total": counts["total"].get(0, 0)}
+    for facet in ("sector", "ministry", "concessionForm", "contractType"):
+        result[facet] = [{"id": key, "count": count} for key, count in sorted(counts[facet].items())]
+    result["year"] = [{"year": year, "count": count} for year, count in sorted(counts["year"].items())]
+    return result
+
+def resolve_fields(fields: Optional[str] = None, exclude: Optional[str] = None) -> Optional[Set[str]]:
+    """Parse ?fields= / ?exclude= into a field set, rejecting unknown names with a 400"""
+    try:
+        return select_fields(fields, exclude)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-def get_project_by_id(session: Session, project_id: str) -> Optional[Dict[str, Any]]:
+def get_project_by_id(session: Session, project_id: str, fields: Optional[Set[str]] = None) -> Optional[Dict[str, Any]]:
     """Get a single project by ID and convert to frontline format"""
     dao = ProjectDAO(session)
-    project = dao.get_by_id(project_id)
+    document = dao.get_document(project_id)
+    if document is not None:
+        return prune_document(document, fields)
+
+    # Cache miss (not yet backfilled): build from the normalized tables,
+    # loading only the relationships behind the requested fields
+    project = dao.get_by_id(project_id, eager=True, fields=fields)
     if not project:
         return None
-    return project.to_oc4ids()
+    return project.to_oc4ids(fields)
 
-def get_projects_comparison(session: Session, project_ids: List[str]) -> List[Dict[str, Any]]:
+def get_project_etag(session: Session, project_id: str, fields: Optional[Set[str]] = None) -> Optional[str]:
+    """ETag of a project's detail representation, or None if the project does not exist"""
+    ids = _canonical_ids([project_id])
+    if not ids:
+        return None
+    version = ProjectDAO(session).get_version(ids[0])
+    if not version:
+        return None
+    updated_at, counter = version
+    return make_etag(ids[0], updated_at.isoformat(), counter, sorted(fields or []))
+
+def get_comparison_etag(session: Session, project_ids: List[str], fields: Optional[Set[str]] = None) -> str:
+    """ETag of a comparison; changes when any compared project changes, appears or disappears"""
+    ids = _canonical_ids(project_ids)
+    versions = ProjectDAO(session).get_versions(ids)
+    parts = []
+    for pid in ids:
+        if pid in versions:
+            updated_at, counter = versions[pid]
+            parts.append(f"{pid}:{updated_at.isoformat()}:{counter}")
+    return make_etag(*parts, sorted(fields or []))
+
+def get_projects_comparison(session: Session, project_ids: List[str], fields: Optional[Set[str]] = None) -> List[Dict[str, Any]]:
     """Compare multiple projects by fetching their full details"""
     dao = ProjectDAO(session)
-    projects = dao.get_by_ids(project_ids)
-    return [p.to_oc4ids() for p in projects]
+    project_ids = _canonical_ids(project_ids)
+    documents = {pid: prune_document(doc, fields) for pid, doc in dao.get_documents(project_ids).items()}
+    missing = [pid for pid in project_ids if pid not in documents]
+    if missing:
+        # One IN-batched query per relationship level for all missing projects together
+        for p in dao.get_by_ids(missing, eager=True, fields=fields):
+            documents[str(p.id)] = p.to_oc4ids(fields)
+    return [documents[pid] for pid in project_ids if pid in documents]
+
+EXPORT_BATCH_SIZE = 100
+OC4IDS_VERSION = "0.9"
+
+def stream_projects_export(
+    session: Session,
+    filters: ProjectFilters = ProjectFilters(),
+    package: bool = False,
+    batch_size: int = EXPORT_BATCH_SIZE
+) -> Iterator[bytes]:
+    """Yield every live project matching the filters as NDJSON lines, or as the body of an OC4IDS project package
+
+    Reads through a session of its own on the same engine: the request-scoped
+    one is closed before a streaming response starts sending.
+    """
+    with Session(session.get_bind()) as export_session:
+        documents = ProjectDAO(export_session).iter_documents(filters, batch_size)
+        if not package:
+            for document in documents:
+                yield encode_json(document) + b"\n"
+            return
+
+        published = datetime.utcnow().replace(microsecond=0).isoformat() + "Z"
+        yield b'{"version":' + encode_json(OC4IDS_VERSION) + b',"publishedDate":' + encode_json(published) + b',"projects":['
+        for i, document in enumerate(documents):
+            yield (b"," if i else b"") + encode_json(document)
+        yield b"]}"
 
 def add_metadata(project_data: Dict[str, Any]) -> Dict[str, Any]:
     """Wraps project data for validation"""
@@ -631,7 +735,7 @@ def add_metadata(project_data: Dict[str, Any]) -> Dict[str, Any]:
         "projects": [project_data]
     }
 
-def create_project_data(project_data: Dict[str, Any], session: Session) -> Dict[str, Any]:
+def create_project_data(project_data: Dict[str, Any], session: Session, version: int = 1) -> Dict[str, Any]:
     """Validates and stores project data"""
     input_id = project_data.get("id")
     pid = None
@@ -684,7 +788,7 @@ def create_project_data(project_data: Dict[str, Any], session: Session) -> Dict[
         logger.error(f"Validation failed for project {project_id_str}: {error_msg}")
         raise HTTPException(status_code=400, detail=error_msg)
 
-    model_data = {}
+    model_data = {"version": version}
     valid_columns = ["id", "title", "description", "status", "purpose"]
     for col in valid_columns:
         if col in project_data:
@@ -1106,10 +1210,17 @@ def create_project_data(project_data: Dict[str, Any], session: Session) -> Dict[
         _create_contracting_details(session, cp_obj.id, summary)
     #(end of REVIEW)
 
-    # Commit all changes
+    # Commit all changes (together with the rebuilt OC4IDS document and listing row)
     try:
+        session.flush()
+        ProjectDAO(session).refresh_document(db_project.id)
+        ProjectDAO(session).refresh_listings([db_project.id])
+        rollups.project_written(session, db_project.id)
         session.commit()
         logger.info(f"Successfully committed project {project_id_str}")
+        facets.project_written(session, db_project.id)
+        analytics.project_written(session, db_project.id)
+        summary_cache.data_changed()
     except Exception as e:
         logger.error(f"Error committing project {project_id_str}: {e}")
         session.rollback()
@@ -1129,9 +1240,18 @@ def update_project_data(project_id: str, project_data: Dict[str, Any], session:
         logger.error(f"Project {project_id} not found during update")
         raise HTTPException(status_code=404, detail=f"Project {project_id} not found")
 
+    next_version = existing_project.version + 1
+    existing_project_id = existing_project.id
+
     try:
         logger.info(f"Deleting existing project {project_id}")
+        dao.delete_document(project_id)
+        dao.delete_listing(project_id)
+        rollups.project_removed(session, existing_project_id)
         dao.delete(project_id, hard_delete=True)
+        facets.project_removed(existing_project_id)
+        analytics.project_removed(existing_project_id)
+        summary_cache.data_changed()
         logger.info(f"Deleted existing project {project_id} (Hard Delete)")
     except ValueError as e:
          logger.error(f"Error deleting project {project_id}: {e}")
@@ -1147,7 +1267,7 @@ def update_project_data(project_id: str, project_data: Dict[str, Any], session:
     
     logger.info(f"Re-creating project {project_id} with new data")
     try:
-        return create_project_data(project_data, session)
+        return create_project_data(project_data, session, version=next_version)
     except Exception as e:
         logger.error(f"Error re-creating project {project_id}: {e}")
         raise e
@@ -1159,7 +1279,13 @@ def delete_project_data(project_id: str, session: Session) -> Dict[str, Any]:
     if not db_project:
         raise HTTPException(status_code=404, detail="Project not found")
 
+    dao.delete_document(project_id)
+    dao.delete_listing(project_id)
+    rollups.project_removed(session, db_project.id)
     dao.delete(project_id)
+    facets.project_removed(db_project.id)
+    analytics.project_removed(db_project.id)
+    summary_cache.data_changed()
     return {"message": "Project deleted successfully"}
 
 def get_reference_info(session: Session) -> Dict[str, List[Dict[str, Any]]]:
@@ -1196,74 +1322,59 @@ def get_reference_info(session: Session) -> Dict[str, List[Dict[str, Any]]]:
         ]
     }
 
-def get_dashboard_summary(
-    session: Session, 
-    sector_id: Optional[List[int]] = None,
-    ministry_id: Optional[List[int]] = None,
-    agency_id: Optional[List[int]] = None,
-    concession_form_id: Optional[List[int]] = None,
-    contract_type_id: Optional[List[int]] = None,
-    year_from: Optional[int] = None,
-    year_to: Optional[int] = None,
-    search: Optional[str] = None
-) -> Dict[str, Any]:
-    """Get dashboard summary statistics and latest projects matching filters"""
-    dao = ProjectDAO(session)
-    # 1. Get Aggregated Stats (DB-side)
-    stats = dao.get_dashboard_stats(
-        title=search,
-        sector_id=sector_id,
-        ministry_id=ministry_id,
-        agency_id=agency_id,
-        concession_form_id=concession_form_id,
-        contract_type_id=contract_type_id,
-        year_from=year_from,
-        year_to=year_to
-    )
-    
-    # 2. Get Latest Projects (Small limit)
-    latest_projects_results = dao.get_summaries(
-        limit=5, 
-        title=search,
-        sector_id=sector_id,
-        ministry_id=ministry_id,
-        agency_id=agency_id,
-        concession_form_id=concession_form_id,
-        contract_type_id=contract_type_id,
-        year_from=year_from,
-        year_to=year_to
-    )
+def get_dashboard_summary(session: Session, filters: ProjectFilters = ProjectFilters()) -> Dict[str, Any]:
+    """Get dashboard summary statistics and latest projects matching filters
+
+    With the in-memory dashboard snapshot enabled, statistics for filters
+    other than a title search are computed from it. Otherwise filters on at
+    most one sector, ministry, concession form and contract type are read
+    from the rollup cube. "freshness" tells which source answered and as of
+    when. Results are cached per normalized filter set until the next project
+    write, from any process, or the cache TTL.
+    """
+    filters = replace(filters, title=summary_cache.normalize_search(filters.title))
+    cache = summary_cache.get_summary_cache()
+    cache_key = cache.key(session.get_bind(), filters)
+    cached = cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    scope = rollups.rollup_scope(filters)
+
+    def database_stats(db: Session) -> Tuple[Dict[str, Any], str]:
+        # The cube is updated in the write transactions, so it is as current as the tables
+        if scope is not None and rollups.rollups_enabled(db):
+            stats = ProjectDAO(db).get_dashboard_cube(**scope)
+            if stats is not None:
+                return stats, "rollup"
+        return ProjectDAO(db).get_dashboard_stats(filters), "live"
+
+    def latest_projects(db: Session) -> Sequence[Any]:
+        return ProjectDAO(db).get_latest_projects(filters, limit=5)
+
+    # 1. Aggregated stats and 2. latest projects (small limit); the two
+    # queries run concurrently in DASHBOARD_PARALLEL mode
+    snapshot = analytics.current_dashboard_snapshot(session)
+    stats = snapshot.stats(filters) if snapshot is not None else None
+    if snapshot is not None and stats is not None:
+        freshness = {"source": "snapshot", "asOf": snapshot.updated_at.isoformat()}
+        latest_projects_results = latest_projects(session)
+    else:
+        (stats, source), latest_projects_results = parallel.run_in_snapshot(session, database_stats, latest_projects)
+        freshness = {"source": source, "asOf": datetime.now(timezone.utc).isoformat()}
 
     # Map Latest Projects
     latest_projects_data = []
     for p in latest_projects_results:
-         # Helper to extract ministry names
-         p_ministries = []
-         pm_names = getattr(p, "party_ministry_names", None)
-         if pm_names:
-            if isinstance(pm_names, list):
-                p_ministries.extend([m.strip() for m in pm_names if m.strip()])
-            elif isinstance(pm_names, str):
-                p_ministries.extend([m.strip() for m in pm_names.split(',') if m.strip()])
-
-         am_names = getattr(p, "agency_ministry_names", None)
-         if am_names:
-            if isinstance(am_names, list):
-                p_ministries.extend([m.strip() for m in am_names if m.strip()])
-            elif isinstance(am_names, str):
-                p_ministries.extend([m.strip() for m in am_names.split(',') if m.strip()])
-         
-         p_ministries = list(set(p_ministries))
-
          latest_projects_data.append({
              "id": str(p.id),
              "title": p.title,
-             "ministry": p_ministries,
+             "ministry": sorted({m.strip() for m in p.ministry_names or [] if m and m.strip()}),
              "public_authority": p.agency_name,
-             "budget": {"amount": getattr(p, "budget_amount", 0) or 0}, 
-             "status": "implementation",  
-             "type": "PPP", 
-             "updated": datetime.utcnow().isoformat()
+             "budget": {"amount": p.budget_amount or 0},
+             "status": p.status,
+             "type": p.project_type,
+             "updated": p.updated_at.isoformat() if p.updated_at else None
          })
     
     # Map stats to return structure
@@ -1332,7 +1443,7 @@ def get_dashboard_summary(
     ]
     investment_by_year_list.sort(key=lambda x: x["year"])
 
-    return {
+    result = {
         "summary": {
             "totalProjects": total_projects,
             "uniqueContractors": unique_contractors,
@@ -1347,5 +1458,8 @@ def get_dashboard_summary(
         "projectScales": project_scales,
         "investmentByYear": investment_by_year_list,
         "businessGroupStats": business_group_stats,
-        "sectorCounts": {k: v["total"]["count"] for k,v in sector_stats.items()}
+        "sectorCounts": {k: v["total"]["count"] for k,v in sector_stats.items()},
+        "freshness": freshness
     }
+    cache.put(cache_key, result)
+    return result
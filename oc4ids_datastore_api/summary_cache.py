@@ -0,0 +1,149 @@
+"""
+In-process result cache for GET /summary.
+
+Entries are keyed by the normalized filter set and the data version, the
+projects table fingerprint of analytics.data_version(), so a project create,
+update or delete from any process makes every older entry unreachable. The
+fingerprint is read again at most every SUMMARY_CACHE_CHECK_INTERVAL seconds,
+and right after each write through this process.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from sqlmodel import Session
+
+from oc4ids_datastore_api.analytics import data_version
+from oc4ids_datastore_api.filters import ProjectFilters
+
+SUMMARY_CACHE_SIZE = int(os.environ.get("SUMMARY_CACHE_SIZE", "256"))
+SUMMARY_CACHE_TTL = float(os.environ.get("SUMMARY_CACHE_TTL", "60"))
+SUMMARY_CACHE_CHECK_INTERVAL = float(os.environ.get("SUMMARY_CACHE_CHECK_INTERVAL", "5"))
+
+FilterKey = Tuple[Tuple[str, Any], ...]
+# (data version, database, filter key)
+CacheKey = Tuple[Tuple[Any, ...], Any, FilterKey]
+
+
+def normalize_search(search: Optional[str]) -> Optional[str]:
+    """Search string as matched: trimmed and lower-cased (the match is case-insensitive), None if blank"""
+    if search is None:
+        return None
+    return search.strip().lower() or None
+
+
+def filter_key(filters: ProjectFilters) -> FilterKey:
+    """Hashable key of a filter set; id lists are sorted and de-duplicated, empty filters dropped"""
+    items = []
+    for name, value in filters.items():
+        if value is None or value == [] or value == "":
+            continue
+        if isinstance(value, list):
+            value = tuple(sorted(set(value)))
+        items.append((name, value))
+    return tuple(items)
+
+
+class SummaryCache:
+    """Size-bounded LRU cache whose entries also expire after a TTL"""
+
+    def __init__(self, max_size: int = SUMMARY_CACHE_SIZE, ttl: float = SUMMARY_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries: "OrderedDict[CacheKey, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        # Per database: data_version() as last read, and when
+        self.versions: Dict[Any, Tuple[Tuple[Any, ...], float]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def key(self, bind: Any, filters: ProjectFilters) -> CacheKey:
+        """Cache key of a filter set on a database, at its current data version"""
+        return (self.data_version(bind), bind, filter_key(filters))
+
+    def data_version(self, bind: Any) -> Tuple[Any, ...]:
+        """data_version() of a database, read on a session of its own unless read recently"""
+        with self.lock:
+            known = self.versions.get(bind)
+            invalidations = self.invalidations
+        if known is not None and time.monotonic() < known[1] + SUMMARY_CACHE_CHECK_INTERVAL:
+            return known[0]
+        with Session(bind) as session:
+            version = data_version(session)
+        with self.lock:
+            # Read before a write that has since invalidated the cache: not kept
+            if self.invalidations != invalidations:
+                return version
+            if known is not None and known[0] != version:
+                self._drop_entries()
+            self.versions[bind] = (version, time.monotonic())
+        return version
+
+    def get(self, key: CacheKey) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                del self.entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: CacheKey, value: Dict[str, Any]) -> None:
+        if self.max_size <= 0:
+            return
+        with self.lock:
+            # Computed before a write that has since changed the version
+            known = self.versions.get(key[1])
+            if known is None or key[0] != known[0]:
+                return
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self) -> None:
+        """Drop every entry, and read the data versions again on the next lookup"""
+        with self.lock:
+            self.versions.clear()
+            self._drop_entries()
+
+    def _drop_entries(self) -> None:
+        """Call with the lock held"""
+        self.entries.clear()
+        self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self.entries),
+                "maxSize": self.max_size,
+                "ttlSeconds": self.ttl,
+                "checkIntervalSeconds": SUMMARY_CACHE_CHECK_INTERVAL,
+                "invalidations": self.invalidations,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hitRatio": self.hits / lookups if lookups else 0.0,
+            }
+
+
+_cache = SummaryCache()
+
+
+def get_summary_cache() -> SummaryCache:
+    return _cache
+
+
+def data_changed() -> None:
+    """Hook for project writes, after the commit: invalidate every cached summary"""
+    _cache.invalidate()
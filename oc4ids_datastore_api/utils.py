@@ -1,3 +1,9 @@
+import base64
+import hashlib
+import json
+from typing import Any, List, Optional
+
+
 def format_thai_amount(amount: float) -> str:
     if amount is None:
         return ""
@@ -23,3 +29,34 @@ def format_thai_amount(amount: float) -> str:
     result = f"{formatted} {unit_suffix}"
     return f"-{result}" if is_negative else result
 
+
+def make_etag(*parts: Any) -> str:
+    """Build a strong ETag from the values that identify a representation"""
+    digest = hashlib.sha1("|".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+    return f'"{digest}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Check an If-None-Match header value against the current ETag"""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+def encode_cursor(*values: Any) -> str:
+    """Pack the sort key of the last row of a page into an opaque pagination cursor"""
+    raw = json.dumps([None if v is None else str(v) for v in values], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> List[Optional[str]]:
+    """Unpack a cursor made by encode_cursor; raises ValueError if it is malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, list) or not all(v is None or isinstance(v, str) for v in values):
+        raise ValueError("Invalid cursor")
+    return values
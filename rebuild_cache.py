@@ -0,0 +1,49 @@
+import logging
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except ImportError:
+    pass
+
+from sqlmodel import Session, select, delete
+from oc4ids_datastore_api.database import engine
+from oc4ids_datastore_api.daos import ProjectDAO
+from oc4ids_datastore_api.migrations import run_migrations
+from oc4ids_datastore_api.models import Project, ProjectDocumentCache, ProjectListing
+from oc4ids_datastore_api.rollups import rebuild_cube
+
+# Setup basic logging
+logging.basicConfig(level=logging.INFO)
+
+BATCH_SIZE = 100
+
+def rebuild_documents(batch_size: int = BATCH_SIZE):
+    """Backfill project_documents_cache and project_listing for every live project"""
+    with Session(engine) as session:
+        # Remove rows of projects that were soft-deleted outside the API
+        deleted_ids = select(Project.id).where(Project.deleted_at.is_not(None))
+        session.exec(delete(ProjectDocumentCache).where(ProjectDocumentCache.project_id.in_(deleted_ids)))
+        session.exec(delete(ProjectListing).where(ProjectListing.project_id.in_(deleted_ids)))
+        session.commit()
+
+        project_ids = session.exec(select(Project.id).where(Project.deleted_at.is_(None))).all()
+        print(f"Rebuilding OC4IDS documents for {len(project_ids)} projects...")
+
+        dao = ProjectDAO(session)
+        for start in range(0, len(project_ids), batch_size):
+            batch = project_ids[start:start + batch_size]
+            for project in dao.get_by_ids(batch, eager=True):
+                dao.save_document(project)
+            dao.refresh_listings(batch)
+            session.commit()
+            # Keep memory flat across batches
+            session.expunge_all()
+            print(f"Rebuilt {min(start + batch_size, len(project_ids))}/{len(project_ids)}")
+
+    print("Document cache rebuild complete.")
+
+if __name__ == "__main__":
+    run_migrations(engine)
+    rebuild_documents()
+    # Data loaded by other means may not change the cube's grand total
+    rebuild_cube(engine, force=True)
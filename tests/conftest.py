@@ -1,25 +1,34 @@
+import os
 import pytest
+from sqlalchemy import make_url, text
 from sqlmodel import Session, SQLModel, create_engine
-from sqlmodel.pool import StaticPool
 from fastapi.testclient import TestClient
 from typing import Generator
 
-from oc4ids_datastore_api.main import app
-from oc4ids_datastore_api.database import get_session
+# The schema is PostgreSQL only (JSONB, arrays, generated columns, pg_trgm), so the
+# tests run against TEST_DATABASE_URL (see pyproject.toml), whose public schema is
+# dropped and recreated for every test. The app's DATABASE_URL is never used: it
+# is replaced before the app is imported, and the database must be named *_test
+DATABASE_URL = os.environ["TEST_DATABASE_URL"]
+if not (make_url(DATABASE_URL).database or "").endswith("_test"):
+    raise pytest.UsageError(f"TEST_DATABASE_URL must name a database ending in _test, not {make_url(DATABASE_URL)!r}")
+os.environ["DATABASE_URL"] = DATABASE_URL
 
-# Use SQLite in-memory for tests
-DATABASE_URL = "sqlite:///:memory:"
+from oc4ids_datastore_api.main import app  # noqa: E402
+from oc4ids_datastore_api.database import get_session  # noqa: E402
+from oc4ids_datastore_api.migrations import run_migrations  # noqa: E402
 
 @pytest.fixture(name="session")
 def session_fixture() -> Generator[Session, None, None]:
-    engine = create_engine(
-        DATABASE_URL, 
-        connect_args={"check_same_thread": False}, 
-        poolclass=StaticPool
-    )
+    engine = create_engine(DATABASE_URL)
+    with engine.begin() as conn:
+        conn.execute(text("DROP SCHEMA public CASCADE"))
+        conn.execute(text("CREATE SCHEMA public"))
     SQLModel.metadata.create_all(engine)
+    run_migrations(engine)
     with Session(engine) as session:
         yield session
+    engine.dispose()
 
 @pytest.fixture(name="client")
 def client_fixture(session: Session) -> Generator[TestClient, None, None]:
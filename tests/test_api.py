@@ -1,8 +1,12 @@
+import json
+from typing import Any, Dict, List
+
+import pytest
 from fastapi.testclient import TestClient
 from sqlmodel import Session
 from oc4ids_datastore_api.models import Project
 
-def test_create_project_api(client: TestClient):
+def test_create_project_api(client: TestClient) -> None:
     payload = {
         "title": "API Project",
         "description": "Created via API",
@@ -20,7 +24,7 @@ def test_create_project_api(client: TestClient):
     # Logic in services.py adds default values, check if id is there
     assert "id" in data["project"]
 
-def test_read_projects_api(client: TestClient, session: Session):
+def test_read_projects_api(client: TestClient, session: Session) -> None:
     # Pre-seed
     client.post("/api/v1/datasets", json={"title": "P1"})
     client.post("/api/v1/datasets", json={"title": "P2"})
@@ -33,7 +37,7 @@ def test_read_projects_api(client: TestClient, session: Session):
     assert isinstance(data["data"], list)
     assert len(data["data"]) >= 2
 
-def test_read_single_project_api(client: TestClient):
+def test_read_single_project_api(client: TestClient) -> None:
     # Create first
     create_res = client.post("/api/v1/datasets", json={"title": "Single"})
     project_id = create_res.json()["project"]["id"]
@@ -44,7 +48,7 @@ def test_read_single_project_api(client: TestClient):
     assert data["title"] == "Single"
     assert data["id"] == project_id
 
-def test_update_project_api(client: TestClient):
+def test_update_project_api(client: TestClient) -> None:
     create_res = client.post("/api/v1/datasets", json={"title": "To Update"})
     project_id = create_res.json()["project"]["id"]
     
@@ -55,7 +59,7 @@ def test_update_project_api(client: TestClient):
     data = response.json()
     assert data["project"]["title"] == "Updated API"
 
-def test_delete_project_api(client: TestClient):
+def test_delete_project_api(client: TestClient) -> None:
     create_res = client.post("/api/v1/datasets", json={"title": "To Delete"})
     project_id = create_res.json()["project"]["id"]
     
@@ -66,3 +70,213 @@ def test_delete_project_api(client: TestClient):
     # Verify 404
     get_res = client.get(f"/api/v1/datasets/{project_id}")
     assert get_res.status_code == 404
+
+def _project_payload(title: str) -> Dict[str, Any]:
+    return {
+        "title": title,
+        "type": "construction",
+        "period": {"startDate": "2020-01-01", "endDate": "2030-12-31"},
+        "publicAuthority": {"name": "Test Authority"},
+        "parties": [{"id": "party-1", "name": "Test Party", "identifier": {"legalName": "Test Company"}}],
+    }
+
+def test_read_project_etag_not_modified(client: TestClient) -> None:
+    create_res = client.post("/api/v1/projects", json=_project_payload("Cached Project"))
+    project_id = create_res.json()["project"]["id"]
+
+    response = client.get(f"/api/v1/projects/{project_id}")
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+
+    not_modified = client.get(f"/api/v1/projects/{project_id}", headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304
+    assert not_modified.headers["ETag"] == etag
+
+    compare = client.get("/api/v1/compare", params={"ids": [project_id]})
+    assert compare.status_code == 200
+    compare_again = client.get("/api/v1/compare", params={"ids": [project_id]}, headers={"If-None-Match": compare.headers["ETag"]})
+    assert compare_again.status_code == 304
+
+def test_read_project_sparse_fields(client: TestClient) -> None:
+    create_res = client.post("/api/v1/projects", json=_project_payload("Sparse Project"))
+    project_id = create_res.json()["project"]["id"]
+
+    response = client.get(f"/api/v1/projects/{project_id}", params={"fields": "title,period"})
+    assert response.status_code == 200
+    assert set(response.json()) == {"id", "title", "period"}
+
+    response = client.get(f"/api/v1/projects/{project_id}", params={"exclude": "parties"})
+    assert "parties" not in response.json()
+    assert response.json()["title"] == "Sparse Project"
+
+    response = client.get(f"/api/v1/projects/{project_id}", params={"fields": "nope"})
+    assert response.status_code == 400
+
+def test_export_projects_streams_ndjson_and_package(client: TestClient) -> None:
+    for title in ("Export A", "Export B"):
+        client.post("/api/v1/projects", json=_project_payload(title))
+
+    response = client.get("/api/v1/projects/export")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert {"Export A", "Export B"} <= {project["title"] for project in lines}
+
+    package = client.get("/api/v1/projects/export", params={"format": "package"}).json()
+    assert package["projects"] == lines
+
+    filtered = client.get("/api/v1/projects/export", params={"title": "Export B", "year_from": 2025})
+    assert [json.loads(line)["title"] for line in filtered.text.splitlines()] == ["Export B"]
+
+def test_read_projects_cursor_pagination(client: TestClient) -> None:
+    for i in range(5):
+        client.post("/api/v1/projects", json=_project_payload(f"Paged {i}"))
+
+    first = client.get("/api/v1/projects", params={"page_size": 2}).json()
+    seen = [p["id"] for p in first["data"]]
+    cursor = first["pagination"]["nextCursor"]
+    while cursor:
+        page = client.get("/api/v1/projects", params={"page_size": 2, "cursor": cursor}).json()
+        seen += [p["id"] for p in page["data"]]
+        cursor = page["pagination"]["nextCursor"]
+
+    assert len(seen) == len(set(seen)) == 5
+    assert client.get("/api/v1/projects", params={"cursor": "not-a-cursor"}).status_code == 400
+
+def test_read_projects_sorted_by_budget(client: TestClient) -> None:
+    for title, amount in (("Small", 10), ("Large", 300), ("Unbudgeted", None), ("Medium", 200)):
+        payload = _project_payload(title)
+        if amount is not None:
+            payload["budget"] = {"amount": {"amount": amount, "currency": "THB"}}
+        client.post("/api/v1/projects", json=payload)
+
+    def walk(params: Dict[str, str]) -> List[str]:
+        titles: List[str] = []
+        cursor = None
+        while True:
+            page = client.get("/api/v1/projects", params={**params, "page_size": 1, **({"cursor": cursor} if cursor else {})}).json()
+            titles += [p["title"] for p in page["data"]]
+            cursor = page["pagination"]["nextCursor"]
+            if not cursor:
+                return titles
+
+    # Projects without a budget come last in either direction
+    assert walk({"sort": "budget"}) == ["Large", "Medium", "Small", "Unbudgeted"]
+    assert walk({"sort": "budget", "order": "asc"}) == ["Small", "Medium", "Large", "Unbudgeted"]
+    assert walk({"sort": "title"}) == ["Large", "Medium", "Small", "Unbudgeted"]
+
+    first = client.get("/api/v1/projects", params={"sort": "budget", "page_size": 1}).json()
+    stale = client.get("/api/v1/projects", params={"sort": "title", "cursor": first["pagination"]["nextCursor"]})
+    assert stale.status_code == 400
+
+def test_read_project_facets_match_listing(client: TestClient) -> None:
+    for title, start, end in (("Canal", "2020-01-01", "2022-12-31"), ("Canal Lock", "2022-01-01", "2024-12-31"), ("Airport", "2021-01-01", "2021-12-31")):
+        payload = _project_payload(title)
+        payload["period"] = {"startDate": start, "endDate": end}
+        client.post("/api/v1/projects", json=payload)
+
+    facets = client.get("/api/v1/projects/facets", params={"title": "Canal"}).json()
+    assert facets["total"] == 2
+    assert facets["year"] == [{"year": y, "count": c} for y, c in ((2020, 1), (2021, 1), (2022, 2), (2023, 1), (2024, 1))]
+
+    # The year facet is counted without the year filter, so other years stay visible
+    narrowed = client.get("/api/v1/projects/facets", params={"year_from": 2021, "year_to": 2021}).json()
+    assert narrowed["total"] == 2
+    assert {"year": 2024, "count": 1} in narrowed["year"]
+    listed = client.get("/api/v1/projects", params={"year_from": 2024, "year_to": 2024}).json()
+    assert listed["pagination"]["total"] == 1
+
+def test_summary_counts_filtered_projects(client: TestClient) -> None:
+    for title in ("Summary Port", "Summary Port East", "Summary Rail"):
+        client.post("/api/v1/projects", json=_project_payload(title))
+
+    response = client.get("/api/v1/summary", params={"search": "Port"})
+    assert response.status_code == 200
+    assert response.json()["summary"]["totalProjects"] == 2
+
+def test_summary_cache_hits_and_write_invalidation(client: TestClient) -> None:
+    from oc4ids_datastore_api.summary_cache import get_summary_cache
+
+    client.post("/api/v1/projects", json=_project_payload("Cached Port"))
+    stats = get_summary_cache().stats()
+    first = client.get("/api/v1/summary", params={"search": "Cached", "sector": "2,1"}).json()
+    # Same filters, differently spelled: served from the cache
+    again = client.get("/api/v1/summary", params={"search": " cached ", "sector": "1,2"}).json()
+    assert again == first
+    assert get_summary_cache().stats()["hits"] == stats["hits"] + 1
+
+    client.post("/api/v1/projects", json=_project_payload("Cached Rail"))
+    assert get_summary_cache().stats()["invalidations"] > stats["invalidations"]
+    summary = client.get("/api/v1/summary", params={"search": "cached"}).json()
+    assert summary["summary"]["totalProjects"] == 2
+
+def test_summary_cache_follows_writes_elsewhere(client: TestClient, session: Session, monkeypatch: pytest.MonkeyPatch) -> None:
+    from oc4ids_datastore_api import summary_cache
+
+    monkeypatch.setattr(summary_cache, "SUMMARY_CACHE_CHECK_INTERVAL", 0)
+    client.post("/api/v1/projects", json=_project_payload("Shared Port"))
+    assert client.get("/api/v1/summary", params={"search": "shared"}).json()["summary"]["totalProjects"] == 1
+
+    # Another worker writes, so this process's hooks never see it
+    with Session(session.get_bind()) as other:
+        other.add(Project(title="Shared Rail"))
+        other.commit()
+    assert client.get("/api/v1/summary", params={"search": "shared"}).json()["summary"]["totalProjects"] == 2
+
+def test_read_projects_budget_status_and_period_filters(client: TestClient) -> None:
+    for title, amount, status in (("Filter Small", 100, "active"), ("Filter Large", 900, "active"), ("Filter Done", 500, "completed")):
+        payload = _project_payload(title)
+        payload["status"] = status
+        payload["budget"] = {"amount": {"amount": amount, "currency": "THB"}}
+        if title == "Filter Done":
+            payload["period"] = {"startDate": "2010-01-01", "endDate": "2012-06-30"}
+        client.post("/api/v1/projects", json=payload)
+
+    def titles(params: Dict[str, Any]) -> List[str]:
+        return sorted(p["title"] for p in client.get("/api/v1/projects", params=params).json()["data"])
+
+    assert titles({"budget_min": 400}) == ["Filter Done", "Filter Large"]
+    assert titles({"budget_min": 400, "budget_max": 600}) == ["Filter Done"]
+    assert titles({"status": ["active"]}) == ["Filter Large", "Filter Small"]
+    assert titles({"period_from": "2011-01-01", "period_to": "2011-12-31"}) == ["Filter Done"]
+
+    summary = client.get("/api/v1/summary", params={"budgetMax": 600, "status": "active,completed"}).json()
+    assert summary["summary"]["totalProjects"] == 2
+
+def test_read_projects_total_reflects_filters(client: TestClient) -> None:
+    for title in ("Harbour One", "Harbour Two", "Railway"):
+        client.post("/api/v1/projects", json=_project_payload(title))
+
+    pagination = client.get("/api/v1/projects", params={"title": "Harbour", "page_size": 1}).json()["pagination"]
+    assert pagination["total"] == 2
+    assert pagination["totalPages"] == 2
+
+    beyond = client.get("/api/v1/projects", params={"title": "Harbour", "page": 5}).json()
+    assert beyond["data"] == []
+    assert beyond["pagination"]["total"] == 2
+
+def test_read_projects_title_search_is_literal_and_rankable(client: TestClient, monkeypatch: pytest.MonkeyPatch) -> None:
+    for title in ("Ring Road 50% Phase", "Ring Road 500 Phase", "Ring Road"):
+        client.post("/api/v1/projects", json=_project_payload(title))
+
+    literal = client.get("/api/v1/projects", params={"title": "50%"}).json()
+    assert [p["title"] for p in literal["data"]] == ["Ring Road 50% Phase"]
+
+    ranked = client.get("/api/v1/projects", params={"title": "Ring Road", "sort": "relevance"}).json()
+    assert ranked["data"][0]["title"] == "Ring Road"
+    assert ranked["pagination"]["total"] == 3
+
+    # Without pg_trgm relevance falls back to the default order (newest first)
+    monkeypatch.setattr("oc4ids_datastore_api.services.trigram_installed", lambda engine: False)
+    unranked = client.get("/api/v1/projects", params={"title": "Ring Road", "sort": "relevance"}).json()
+    assert [p["title"] for p in unranked["data"]] == ["Ring Road", "Ring Road 500 Phase", "Ring Road 50% Phase"]
+    assert unranked["pagination"]["nextCursor"] is None
+
+def test_read_projects_keeps_commas_in_names(client: TestClient) -> None:
+    payload = _project_payload("Comma Project")
+    payload["parties"][0]["identifier"]["legalName"] = "Build, Operate & Co."
+    client.post("/api/v1/projects", json=payload)
+
+    response = client.get("/api/v1/projects", params={"title": "Comma Project"})
+    assert response.status_code == 200
+    assert response.json()["data"][0]["private_parties"] == ["Build, Operate & Co."]
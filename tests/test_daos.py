@@ -1,8 +1,13 @@
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+import pytest
 from sqlmodel import Session
 from oc4ids_datastore_api.daos import ProjectDAO
-from oc4ids_datastore_api.models import Project
+from oc4ids_datastore_api.filters import ProjectFilters
+from oc4ids_datastore_api.models import Project, ProjectListing
 
-def test_create_project(session: Session):
+def test_create_project(session: Session) -> None:
     dao = ProjectDAO(session)
     project_data = Project(title="Test Project", status="active")
     
@@ -12,7 +17,7 @@ def test_create_project(session: Session):
     assert created_project.title == "Test Project"
     assert created_project.status == "active"
 
-def test_get_project_by_id(session: Session):
+def test_get_project_by_id(session: Session) -> None:
     dao = ProjectDAO(session)
     project = Project(title="Find Me")
     dao.create(project)
@@ -22,7 +27,7 @@ def test_get_project_by_id(session: Session):
     assert found_project is not None
     assert found_project.title == "Find Me"
 
-def test_update_project(session: Session):
+def test_update_project(session: Session) -> None:
     dao = ProjectDAO(session)
     project = Project(title="Old Title")
     created = dao.create(project)
@@ -33,7 +38,7 @@ def test_update_project(session: Session):
     assert updated.title == "New Title"
     assert updated.updated_at is not None
 
-def test_delete_project(session: Session):
+def test_delete_project(session: Session) -> None:
     dao = ProjectDAO(session)
     project = Project(title="To Delete")
     created = dao.create(project)
@@ -46,10 +51,465 @@ def test_delete_project(session: Session):
     # Verify it is gone
     assert dao.get_by_id(str(created.id)) is None
 
-def test_get_all_projects(session: Session):
+def test_get_all_projects(session: Session) -> None:
     dao = ProjectDAO(session)
     dao.create(Project(title="P1"))
     dao.create(Project(title="P2"))
     
     all_projects = dao.get_all()
     assert len(all_projects) == 2
+
+def _create_project_with_parties(session: Session, title: str, party_count: int) -> uuid.UUID:
+    from oc4ids_datastore_api.models import PartyRole, PeriodType, ProjectParty, ProjectPeriod
+
+    dao = ProjectDAO(session)
+    project = dao.create(Project(title=title))
+    session.merge(PeriodType(code="duration", name_en="Duration Period"))
+    session.add(ProjectPeriod(project_id=project.id, period_type="duration"))
+    for i in range(party_count):
+        party = ProjectParty(project_id=project.id, local_id=f"party-{i}", name=f"Party {i}")
+        session.add(party)
+        session.flush()
+        session.add(PartyRole(party_id=party.id, role="buyer"))
+        session.add(PartyRole(party_id=party.id, role="payer"))
+    session.commit()
+    project_id = project.id
+    session.expunge_all()
+    return project_id
+
+def _count_queries(session: Session, fn: Callable[[], Any]) -> int:
+    from sqlalchemy import event
+
+    statements: List[str] = []
+
+    def before_cursor_execute(conn: Any, cursor: Any, statement: str, parameters: Any, context: Any, executemany: bool) -> None:
+        statements.append(statement)
+
+    engine = session.get_bind()
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        fn()
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+    return len(statements)
+
+def _serialize_by_id(dao: ProjectDAO, project_id: uuid.UUID, fields: Optional[Set[str]] = None) -> Dict[str, Any]:
+    project = dao.get_by_id(str(project_id), eager=True, fields=fields)
+    assert project is not None
+    return project.to_oc4ids(fields)
+
+def test_get_by_id_eager_query_count_is_fixed(session: Session) -> None:
+    from oc4ids_datastore_api.serializers import project_load_options
+
+    small_id = _create_project_with_parties(session, "Small", party_count=1)
+    large_id = _create_project_with_parties(session, "Large", party_count=5)
+    dao = ProjectDAO(session)
+
+    small_queries = _count_queries(session, lambda: _serialize_by_id(dao, small_id))
+    session.expunge_all()
+    large_queries = _count_queries(session, lambda: _serialize_by_id(dao, large_id))
+
+    assert small_queries == large_queries
+    assert large_queries <= 1 + len(project_load_options()) * 2
+
+def test_get_by_id_sparse_fields_skip_unused_relationships(session: Session) -> None:
+    project_id = _create_project_with_parties(session, "Sparse", party_count=3)
+    dao = ProjectDAO(session)
+
+    full_queries = _count_queries(session, lambda: _serialize_by_id(dao, project_id))
+    session.expunge_all()
+    fields = {"id", "title", "period"}
+    sparse: Dict[str, Any] = {}
+    sparse_queries = _count_queries(session, lambda: sparse.update(_serialize_by_id(dao, project_id, fields)))
+
+    assert set(sparse) == fields
+    assert sparse_queries < full_queries
+
+def test_document_cache_roundtrip(session: Session) -> None:
+    dao = ProjectDAO(session)
+    project = dao.create(Project(title="Cached"))
+    project_id = str(project.id)
+
+    assert dao.get_document(project_id) is None
+
+    dao.refresh_document(project.id)
+    session.commit()
+    document = dao.get_document(project_id)
+    assert document is not None and document["title"] == "Cached"
+    assert list(dao.get_documents([project_id])) == [project_id]
+
+    dao.delete_document(project_id)
+    session.commit()
+    assert dao.get_document(project_id) is None
+
+def test_get_by_ids_eager_batches_across_projects(session: Session) -> None:
+    project_ids = [_create_project_with_parties(session, f"Project {i}", party_count=i + 1) for i in range(4)]
+    dao = ProjectDAO(session)
+
+    def serialize(ids: List[uuid.UUID]) -> List[Dict[str, Any]]:
+        return [p.to_oc4ids() for p in dao.get_by_ids([str(i) for i in ids], eager=True)]
+
+    one_queries = _count_queries(session, lambda: serialize(project_ids[:1]))
+    session.expunge_all()
+    all_queries = _count_queries(session, lambda: serialize(project_ids))
+
+    assert one_queries == all_queries
+
+def test_listing_row_refresh_and_delete(session: Session) -> None:
+    project_id = _create_project_with_parties(session, "Listed", party_count=2)
+    dao = ProjectDAO(session)
+
+    # The listing row holds what the normalized tables aggregate to
+    aggregated = session.execute(dao._listing_aggregate_query([project_id])).one()
+    dao.refresh_listings([project_id])
+    session.commit()
+    stored = dao.get_projects(filters=ProjectFilters(title="Listed"))
+
+    assert [row.title for row in stored] == ["Listed"]
+    assert stored[0]._mapping == aggregated._mapping
+
+    dao.delete_listing(str(project_id))
+    session.commit()
+    assert session.get(ProjectListing, project_id) is None
+
+def test_listing_sorts_include_projects_without_listing_row(session: Session) -> None:
+    from datetime import date
+    from oc4ids_datastore_api.models import PeriodType, ProjectBudget, ProjectPeriod
+
+    dao = ProjectDAO(session)
+    session.merge(PeriodType(code="duration", name_en="Duration Period"))
+    listed = dao.create(Project(title="Listed")).id
+    unlisted = dao.create(Project(title="Unlisted")).id
+    for project_id in (listed, unlisted):
+        session.add(ProjectBudget(project_id=project_id, total_amount=1e9))
+        session.add(ProjectPeriod(project_id=project_id, period_type="duration", start_date=date(2020, 1, 1)))
+    session.flush()
+    dao.refresh_listings([listed])
+    session.commit()
+
+    for sort in (("budget", True), ("start_date", False)):
+        keys, total = dao.get_page_keys(limit=10, sort=sort)
+        assert total == 2
+        assert [project_id for project_id, _ in keys] == [listed, unlisted]
+        after = dao.get_page_keys(limit=10, after=keys[0][::-1], sort=sort)[0]
+        assert [project_id for project_id, _ in after] == [unlisted]
+
+def test_period_years_are_generated(session: Session) -> None:
+    from datetime import date
+    from oc4ids_datastore_api.models import PeriodType, ProjectPeriod
+
+    session.merge(PeriodType(code="duration", name_en="Duration Period"))
+    project = ProjectDAO(session).create(Project(title="Dated"))
+    period = ProjectPeriod(project_id=project.id, period_type="duration", start_date=date(2019, 3, 1), end_date=None)
+    session.add(period)
+    session.commit()
+    session.refresh(period)
+
+    assert (period.start_year, period.end_year) == (2019, None)
+
+def test_facet_index_matches_sql_filters(session: Session) -> None:
+    pytest.importorskip("pyroaring")
+    from datetime import date
+    from oc4ids_datastore_api.facets import FacetIndex
+    from oc4ids_datastore_api.models import PeriodType, ProjectPeriod, ProjectSectorLink, Sector
+
+    session.merge(PeriodType(code="duration", name_en="Duration Period"))
+    session.add(Sector(id=1, code="transport", name_th="Transport", category="sector"))
+    session.add(Sector(id=2, code="water", name_th="Water", category="sector"))
+    dao = ProjectDAO(session)
+    spans = {"Road": (1, 2015, 2020), "Dam": (2, 2019, 2030), "Bridge": (1, 2025, 2028)}
+    ids = {}
+    for title, (sector_id, start, end) in spans.items():
+        project = dao.create(Project(title=title))
+        ids[title] = project.id
+        session.add(ProjectSectorLink(project_id=project.id, sector_id=sector_id))
+        session.add(ProjectPeriod(project_id=project.id, period_type="duration", start_date=date(start, 1, 1), end_date=date(end, 1, 1)))
+    session.commit()
+
+    index = FacetIndex.build(session)
+    for filters in (
+        ProjectFilters(sector_id=[1]), ProjectFilters(sector_id=[1, 2], year_to=2018),
+        ProjectFilters(year_from=2021), ProjectFilters(year_from=2021, year_to=2024),
+    ):
+        matched = index.match(filters)
+        assert matched is not None
+        assert set(matched) == set(session.execute(dao._filtered_id_query(filters)).scalars().all())
+    assert index.count(ProjectFilters(sector_id=[1])) == 2
+    for filters in (ProjectFilters(), ProjectFilters(sector_id=[2]), ProjectFilters(year_from=2026)):
+        assert index.counts(filters) == dao.get_facet_counts(filters)
+    # Title search is left to SQL
+    assert index.match(ProjectFilters(title="Road", sector_id=[1])) is None
+
+    session.add(ProjectSectorLink(project_id=ids["Dam"], sector_id=1))
+    session.commit()
+    index.refresh(session, [ids["Dam"]])
+    index.remove(ids["Road"])
+    assert set(index.match(ProjectFilters(sector_id=[1])) or []) == {ids["Dam"], ids["Bridge"]}
+
+    # Refreshed and re-added projects reuse the period slots they free
+    periods = len(index.period_owners)
+    for _ in range(3):
+        index.refresh(session, [ids["Dam"], ids["Bridge"]])
+    index.refresh(session, [ids["Road"]])
+    assert len(index.period_owners) == periods
+    assert index.snapshot() == FacetIndex.build(session).snapshot()
+
+
+def test_facet_index_rebuilds_after_writes_elsewhere(session: Session, monkeypatch: pytest.MonkeyPatch) -> None:
+    pytest.importorskip("pyroaring")
+    from oc4ids_datastore_api import facets
+    from oc4ids_datastore_api.models import ProjectSectorLink, Sector
+
+    session.add(Sector(id=1, code="transport", name_th="Transport", category="sector"))
+    dao = ProjectDAO(session)
+    road = dao.create(Project(title="Road"))
+    session.add(ProjectSectorLink(project_id=road.id, sector_id=1))
+    session.commit()
+    index = facets.FacetIndex.build(session)
+    monkeypatch.setattr(facets, "_facet_index", index)
+    monkeypatch.setattr(facets, "FACET_INDEX_TTL", 0)
+    assert facets.current_facet_index(session) is index
+
+    # Another worker writes, so this process's hooks never see it
+    with Session(session.get_bind()) as other:
+        dam = Project(title="Dam")
+        other.add(dam)
+        other.flush()
+        other.add(ProjectSectorLink(project_id=dam.id, sector_id=1))
+        other.commit()
+    keys, total = dao.get_page_keys(filters=ProjectFilters(sector_id=[1]))
+    assert total == 2 and len(keys) == 2
+    assert facets.get_facet_index() is not index
+
+
+def test_dashboard_cube_matches_live_stats(session: Session) -> None:
+    from datetime import date
+    from oc4ids_datastore_api import rollups
+    from oc4ids_datastore_api.models import (
+        CONCESSION_FORM_SCHEME, CONTRACT_TYPE_SCHEME, AdditionalClassification, Ministry, PartyAdditionalIdentifier,
+        PeriodType, ProjectAdditionalClassificationLink, ProjectBudget, ProjectParty, ProjectPeriod, ProjectSectorLink, Sector,
+    )
+
+    session.merge(PeriodType(code="duration", name_en="Duration Period"))
+    session.add(Sector(id=1, code="transport", name_th="Transport", name_en="Transport", category="sector"))
+    session.add(Sector(id=2, code="water", name_th="Water", name_en="Water", category="sector"))
+    session.add(Ministry(id=1, name_th="Transport", name_en="Ministry of Transport"))
+    session.add(AdditionalClassification(id=1, scheme=CONCESSION_FORM_SCHEME, code="BTO"))
+    session.add(AdditionalClassification(id=2, scheme=CONTRACT_TYPE_SCHEME, code="NetCost"))
+    dao = ProjectDAO(session)
+    ids = {}
+    for title, sectors, amount, start in (
+        ("Road", [1], 5e8, 2015), ("Rail", [1, 2], 7e9, 2019), ("Dam", [2], 2e9, 2019), ("Port", [1], None, None)
+    ):
+        project = dao.create(Project(title=title))
+        ids[title] = project.id
+        for sector_id in sectors:
+            session.add(ProjectSectorLink(project_id=project.id, sector_id=sector_id))
+        session.add(ProjectBudget(project_id=project.id, total_amount=amount))
+        if start:
+            session.add(ProjectPeriod(project_id=project.id, period_type="duration", start_date=date(start, 1, 1), end_date=date(start + 5, 1, 1)))
+        if title != "Dam":
+            session.add(ProjectAdditionalClassificationLink(project_id=project.id, classification_id=1))
+            party = ProjectParty(project_id=project.id, local_id=f"{title}-party", name="Ministry")
+            session.add(party)
+            session.flush()
+            session.add(PartyAdditionalIdentifier(party_id=party.id, legal_name_id=1))
+        session.flush()
+        rollups.project_written(session, project.id)
+    session.commit()
+
+    assert rollups.rollup_scope(ProjectFilters(sector_id=[1], title=None)) == {
+        "sector_id": 1, "ministry_id": 0, "concession_form_id": 0, "contract_type_id": 0,
+    }
+    assert rollups.rollup_scope(ProjectFilters(sector_id=[1, 2])) is None
+    assert rollups.rollup_scope(ProjectFilters(title="Road")) is None
+    filter_sets = (
+        ProjectFilters(), ProjectFilters(sector_id=[1]), ProjectFilters(sector_id=[2]), ProjectFilters(ministry_id=[1]),
+        ProjectFilters(sector_id=[2], ministry_id=[1]), ProjectFilters(concession_form_id=[1]),
+        ProjectFilters(concession_form_id=[1], sector_id=[2]), ProjectFilters(contract_type_id=[2]),
+    )
+
+    def assert_matches() -> None:
+        for filters in filter_sets:
+            scope = rollups.rollup_scope(filters)
+            assert scope is not None
+            assert dao.get_dashboard_cube(**scope) == dao.get_dashboard_stats(filters)
+
+    assert_matches()
+    # A contract type id given as the concession form is left to SQL
+    assert dao.get_dashboard_cube(concession_form_id=2) is None
+
+    # Deleting the project with the largest budget
+    rollups.project_removed(session, ids["Rail"])
+    dao.delete(str(ids["Rail"]))
+    assert_matches()
+
+    # Writes through the API keep the cube current, so startup leaves it as is
+    assert rollups.cube_is_current(session)
+    # A project loaded without the hooks is picked up by the next rebuild
+    session.add(Project(title="Loaded elsewhere"))
+    session.commit()
+    assert not rollups.cube_is_current(session)
+    rollups.rebuild_cube(session.get_bind().engine)
+    assert rollups.cube_is_current(session)
+    assert_matches()
+
+
+def test_dashboard_snapshot_matches_sql_stats(session: Session) -> None:
+    from datetime import date
+    from oc4ids_datastore_api.analytics import DashboardSnapshot
+    from oc4ids_datastore_api.models import (
+        Ministry, PartyAdditionalIdentifier, PeriodType, ProjectBudget, ProjectParty, ProjectPeriod, ProjectSectorLink, Sector,
+    )
+
+    session.merge(PeriodType(code="duration", name_en="Duration Period"))
+    session.add(Sector(id=1, code="transport", name_th="Transport", name_en="Transport", category="sector"))
+    session.add(Sector(id=2, code="water", name_th="Water", name_en="Water", category="sector"))
+    session.add(Ministry(id=1, name_th="Transport", name_en="Ministry of Transport"))
+    dao = ProjectDAO(session)
+    ids = {}
+    for title, sectors, amount, start in (
+        ("Road", [1], 5e8, 2015), ("Rail", [1, 2], 7e9, 2019), ("Dam", [2], 2e9, 2019), ("Port", [1], None, None)
+    ):
+        project = dao.create(Project(title=title, status="active" if amount else "planning"))
+        ids[title] = project.id
+        for sector_id in sectors:
+            session.add(ProjectSectorLink(project_id=project.id, sector_id=sector_id))
+        session.add(ProjectBudget(project_id=project.id, total_amount=amount))
+        if start:
+            session.add(ProjectPeriod(project_id=project.id, period_type="duration", start_date=date(start, 1, 1), end_date=date(start + 5, 1, 1)))
+        party = ProjectParty(project_id=project.id, local_id=f"{title}-party", name="Ministry")
+        session.add(party)
+        session.flush()
+        session.add(PartyAdditionalIdentifier(party_id=party.id, legal_name_id=1))
+    session.commit()
+
+    snapshot = DashboardSnapshot.build(session)
+    filter_sets = (
+        ProjectFilters(), ProjectFilters(sector_id=[1]), ProjectFilters(sector_id=[2, 9]), ProjectFilters(ministry_id=[1]),
+        ProjectFilters(year_from=2021), ProjectFilters(year_to=2016), ProjectFilters(budget_min=1e9),
+        ProjectFilters(status=["planning"]), ProjectFilters(period_from=date(2023, 1, 1), period_to=date(2023, 12, 31)),
+    )
+    for filters in filter_sets:
+        assert snapshot.stats(filters) == dao.get_dashboard_stats(filters)
+    # Title search is left to SQL
+    assert snapshot.stats(ProjectFilters(title="Road")) is None
+
+    dao.delete(str(ids["Road"]))
+    snapshot.refresh(session, [ids["Road"]])
+    session.add(ProjectSectorLink(project_id=ids["Dam"], sector_id=1))
+    session.commit()
+    snapshot.refresh(session, [ids["Dam"]])
+    for filters in filter_sets:
+        assert snapshot.stats(filters) == dao.get_dashboard_stats(filters)
+
+
+def test_dashboard_snapshot_reloads_after_writes_elsewhere(session: Session, monkeypatch: pytest.MonkeyPatch) -> None:
+    from oc4ids_datastore_api import analytics
+
+    dao = ProjectDAO(session)
+    dao.create(Project(title="Road"))
+    snapshot = analytics.DashboardSnapshot.build(session)
+    monkeypatch.setattr(analytics, "_snapshot", snapshot)
+    monkeypatch.setattr(analytics, "DASHBOARD_SNAPSHOT_TTL", 0)
+    assert analytics.current_dashboard_snapshot(session) is snapshot
+
+    # Another worker writes, so this process's hooks never see it
+    with Session(session.get_bind()) as other:
+        other.add(Project(title="Written elsewhere"))
+        other.commit()
+    reloaded = analytics.current_dashboard_snapshot(session)
+    assert reloaded is not None and reloaded is not snapshot and len(reloaded) == 2
+    assert reloaded.stats(ProjectFilters()) == dao.get_dashboard_stats()
+
+
+def test_parallel_calls_read_one_snapshot(session: Session, monkeypatch: pytest.MonkeyPatch) -> None:
+    import threading
+    from oc4ids_datastore_api.parallel import run_in_snapshot
+
+    monkeypatch.setenv("DASHBOARD_PARALLEL", "1")
+    with Session(session.get_bind()) as other:
+        before = ProjectDAO(other).count()
+    inserted = threading.Event()
+
+    def insert_then_count(db: Session) -> Tuple[int, threading.Thread]:
+        with Session(db.get_bind()) as other:
+            other.add(Project(title="Committed after the snapshot"))
+            other.commit()
+        inserted.set()
+        return ProjectDAO(db).count(), threading.current_thread()
+
+    def count_after_insert(db: Session) -> Tuple[int, threading.Thread]:
+        inserted.wait(5)
+        return ProjectDAO(db).count(), threading.current_thread()
+
+    (first, first_thread), (second, second_thread) = run_in_snapshot(session, insert_then_count, count_after_insert)
+    assert first == second == before
+    assert first_thread is not second_thread
+
+
+def test_parallel_calls_left_waiting_run_on_the_request_session(session: Session, monkeypatch: pytest.MonkeyPatch) -> None:
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+    from oc4ids_datastore_api import parallel
+
+    monkeypatch.setenv("DASHBOARD_PARALLEL", "1")
+    monkeypatch.setattr(parallel, "PARALLEL_TIMEOUT", 0.2)
+    executor = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(parallel, "_executor", executor)
+    released = threading.Event()
+    request_thread = threading.current_thread()
+
+    def count(db: Session) -> Tuple[int, threading.Thread]:
+        return ProjectDAO(db).count(), threading.current_thread()
+
+    # The only worker is busy until the request has given up on its call
+    executor.submit(released.wait, 5)
+    try:
+        (_, first_thread), (_, second_thread) = parallel.run_in_snapshot(session, count, count)
+    finally:
+        released.set()
+        executor.shutdown()
+    assert first_thread is second_thread is request_thread
+    assert parallel.worker_engine(session.get_bind().engine) is not session.get_bind().engine
+
+
+def test_parallel_calls_running_past_the_timeout_are_waited_for(session: Session, monkeypatch: pytest.MonkeyPatch) -> None:
+    import threading
+    import time
+    from oc4ids_datastore_api import parallel
+
+    monkeypatch.setenv("DASHBOARD_PARALLEL", "1")
+    monkeypatch.setattr(parallel, "PARALLEL_TIMEOUT", 0.2)
+    request_thread = threading.current_thread()
+    threads = []
+
+    def slow_count(db: Session) -> int:
+        threads.append(threading.current_thread())
+        if threading.current_thread() is not request_thread:
+            time.sleep(0.5)
+        return ProjectDAO(db).count()
+
+    assert parallel.run_in_snapshot(session, slow_count, slow_count) == [0, 0]
+    # The worker's call is not run again on the request session
+    assert len(threads) == 2 and threads.count(request_thread) == 1
+
+
+def test_latest_projects_newest_first_with_real_values(session: Session) -> None:
+    from datetime import datetime, timedelta
+    from oc4ids_datastore_api.models import ProjectType
+
+    session.add(ProjectType(id=1, code="expressway", name_en="Expressway"))
+    dao = ProjectDAO(session)
+    now = datetime(2024, 6, 1)
+    for i, status in enumerate(["planning", "active", "completed"]):
+        dao.create(Project(title=f"Project {i}", status=status, project_type_id=1, updated_at=now + timedelta(days=i)))
+    dao.delete(str(dao.create(Project(title="Deleted", updated_at=now + timedelta(days=9))).id))
+
+    latest = dao.get_latest_projects(limit=2)
+    assert [row.title for row in latest] == ["Project 2", "Project 1"]
+    assert [(row.status, row.project_type, row.updated_at) for row in latest] == [
+        ("completed", "expressway", now + timedelta(days=2)),
+        ("active", "expressway", now + timedelta(days=1)),
+    ]
+    assert [row.title for row in dao.get_latest_projects(ProjectFilters(status=["planning"]), limit=5)] == ["Project 0"]